@@ -0,0 +1,502 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import io
+import os
+import re
+import struct
+import tarfile
+import threading
+import zipfile
+from collections.abc import Generator, Iterator
+from contextlib import contextmanager
+from functools import cache, partial
+from pathlib import Path, PurePosixPath
+from typing import IO, TYPE_CHECKING, Any, NamedTuple, Optional, Union
+
+from forensicsim.leveldb import DATA_FILE
+from forensicsim.stats import Stats
+
+if TYPE_CHECKING:
+    from forensicsim.hashing import SourceHashes
+    from forensicsim.prefetch import Prefetcher
+
+# Fixed part of a zip local file header. The member data follows it after
+# the file name and extra field, whose lengths are its last two fields.
+_LOCAL_FILE_HEADER = struct.Struct("<4s2B4HL2L2H")
+_LOCAL_FILE_HEADER_SIGNATURE = b"PK\x03\x04"
+
+_MANIFEST = re.compile(r"^MANIFEST-([0-9]+)$")
+
+# Attributes of ccl_leveldb.RawLevelDb that SourceLevelDb sets up itself
+_RAW_LEVELDB_ATTRIBUTES = {"_in_dir", "_files", "manifest"}
+# Held while ccl_leveldb.RawLevelDb stands in for a SourceFolder
+_READER_LOCK = threading.Lock()
+
+
+class MemberStat(NamedTuple):
+    st_size: int
+
+
+def archive_path(path: Path) -> Optional[tuple[Path, str]]:
+    """Split a path into a zip or tar archive and the folder within it.
+
+    ``evidence.zip/AppData/Roaming`` gives ``evidence.zip`` and
+    ``AppData/Roaming``. Returns None if the path exists on disk or none of
+    its parents is an archive.
+    """
+    if path.exists():
+        return None
+    for parent in path.parents:
+        if parent.is_file():
+            if zipfile.is_zipfile(parent) or tarfile.is_tarfile(parent):
+                return parent, path.relative_to(parent).as_posix()
+            return None
+    return None
+
+
+@contextmanager
+def open_folder(
+    path: Union[Path, "SourceFolder"],
+    hashes: Optional["SourceHashes"] = None,
+    prefetch: Optional[int] = None,
+    stats: Optional[Stats] = None,
+) -> Generator[Union[Path, "SourceFolder"], None, None]:
+    # Folders on disk are passed through unchanged unless their files are
+    # hashed or prefetched while they are read. prefetch is the number of
+    # data files read ahead of the parser. The files nobody read are hashed
+    # once the folder is done with, before it is closed together with the
+    # files opened from it. A SourceFolder is read as it is, whoever opened
+    # it closes it.
+    if isinstance(path, SourceFolder):
+        folder = path
+        if hashes is not None:
+            folder.hashes = hashes
+    else:
+        split = archive_path(path)
+        if split is None and hashes is None and prefetch is None:
+            yield path
+            return
+        folder = (
+            DiskFolder(path, hashes)
+            if split is None
+            else ArchiveFolder(path, *split, hashes)
+        )
+    if prefetch and folder.parallel_reads:
+        from forensicsim.prefetch import Prefetcher
+
+        folder.prefetcher = Prefetcher(folder, prefetch, stats)
+    try:
+        yield folder
+        if hashes is not None:
+            hashes.complete(folder)
+    finally:
+        if folder.prefetcher is not None:
+            folder.prefetcher.close()
+            folder.prefetcher = None
+        if folder is not path:
+            folder.close()
+
+
+class SourceFolder:
+    """A folder whose files are opened through forensicsim.
+
+    Offers the part of the :class:`pathlib.Path` interface that
+    ccl_chromium_reader uses on a LevelDB folder. With ``hashes`` every
+    file is hashed while it is read, a ``prefetcher`` is told when the
+    parser starts reading a data file.
+    """
+
+    # Whether files may be read from several threads at once
+    parallel_reads = True
+
+    def __init__(self, path: Path, hashes: Optional["SourceHashes"] = None) -> None:
+        self.path = path
+        self.hashes = hashes
+        self.prefetcher: Optional[Prefetcher] = None
+        self._members: dict[str, Any] = {}
+        self._open_files: list[IO[bytes]] = []
+
+    @property
+    def name(self) -> str:
+        return self.path.name
+
+    def is_dir(self) -> bool:
+        return True
+
+    def is_file(self) -> bool:
+        return False
+
+    def exists(self) -> bool:
+        return True
+
+    def names(self) -> list[str]:
+        return sorted(self._members)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._members
+
+    def iterdir(self) -> Iterator["SourceFile"]:
+        for name in self.names():
+            yield SourceFile(self, name)
+
+    def __truediv__(self, name: str) -> "SourceFile":
+        return SourceFile(self, name)
+
+    def __fspath__(self) -> str:
+        return str(self.path)
+
+    def __str__(self) -> str:
+        return str(self.path)
+
+    def size(self, name: str) -> int:
+        raise NotImplementedError
+
+    def open(self, name: str) -> IO[bytes]:
+        f = self.open_raw(name)
+        if self.prefetcher is not None:
+            f = self.prefetcher.reader(name, f)
+        if self.hashes is not None:
+            f = self.hashes.reader(str(self / name), f)
+        self._open_files.append(f)
+        return f
+
+    def open_raw(self, name: str) -> IO[bytes]:
+        # Opens a file without hashing or prefetching, the caller closes it
+        raise NotImplementedError
+
+    def close(self) -> None:
+        for f in self._open_files:
+            f.close()
+        self._open_files.clear()
+
+    def current_manifest(self) -> Optional["SourceFile"]:
+        # The MANIFEST named in CURRENT, else the newest one in the folder
+        if "CURRENT" in self._members:
+            with self.open("CURRENT") as f:
+                name = f.read().decode("ascii", errors="replace").strip()
+            if name in self._members:
+                return SourceFile(self, name)
+        manifests = [
+            (int(match.group(1)), name)
+            for name in self._members
+            if (match := _MANIFEST.match(name))
+        ]
+        return SourceFile(self, max(manifests)[1]) if manifests else None
+
+    def read_order(self) -> list[str]:
+        # The data files in the order ccl_chromium_reader reads them, by
+        # their file number
+        data_files = {
+            name: int(match.group(1))
+            for name in self._members
+            if (match := DATA_FILE.match(name))
+        }
+        return sorted(data_files, key=lambda name: (data_files[name], name))
+
+    def _member(self, name: str) -> Any:
+        try:
+            return self._members[name]
+        except KeyError:
+            raise FileNotFoundError(f"No {name} in {self.path}") from None
+
+
+class DiskFolder(SourceFolder):
+    """A folder on disk, listed once when it is opened."""
+
+    def __init__(self, path: Path, hashes: Optional["SourceHashes"] = None) -> None:
+        super().__init__(path, hashes)
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    self._members[entry.name] = entry.stat().st_size
+
+    def size(self, name: str) -> int:
+        return int(self._member(name))
+
+    def open_raw(self, name: str) -> IO[bytes]:
+        self._member(name)
+        return open(self.path / name, "rb")
+
+
+class ArchiveFolder(SourceFolder):
+    """A folder within a zip or tar archive, read without extracting it.
+
+    Uncompressed members are read in place by seeking within the archive,
+    compressed ones are decompressed while they are read.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        archive: Path,
+        folder: str,
+        hashes: Optional["SourceHashes"] = None,
+    ) -> None:
+        super().__init__(path, hashes)
+        self.archive = archive
+        self.folder = _member_name(folder)
+        self.compressed = False
+        self._zip: Optional[zipfile.ZipFile] = None
+        self._tar: Optional[tarfile.TarFile] = None
+
+        infos: list[tuple[str, Any]]
+        if zipfile.is_zipfile(archive):
+            self._zip = zipfile.ZipFile(archive)
+            infos = [
+                (info.filename, info)
+                for info in self._zip.infolist()
+                if not info.is_dir()
+            ]
+        else:
+            try:
+                self._tar = tarfile.TarFile(archive)
+            except tarfile.ReadError:
+                # Members of a compressed tar can only be streamed, from a
+                # single thread as they share the decompressor
+                self._tar = tarfile.TarFile.open(archive)
+                self.compressed = True
+                self.parallel_reads = False
+            infos = [(info.name, info) for info in self._tar if info.isfile()]
+        for name, info in infos:
+            parent, _, child = _member_name(name).rpartition("/")
+            if parent == self.folder:
+                self._members[child] = info
+        if not self._members:
+            self.close()
+            raise FileNotFoundError(f"No files in {self.folder} of {archive}")
+
+    def size(self, name: str) -> int:
+        info = self._member(name)
+        return int(info.file_size if self._zip is not None else info.size)
+
+    def open_raw(self, name: str) -> IO[bytes]:
+        info = self._member(name)
+        f: Optional[IO[bytes]]
+        if self._zip is not None:
+            if info.compress_type == zipfile.ZIP_STORED and not info.flag_bits & 1:
+                f = _open_range(
+                    self.archive, self._zip_data_offset(info), info.file_size
+                )
+            else:
+                f = self._zip.open(info)
+        elif self._tar is not None and not self.compressed and not info.issparse():
+            f = _open_range(self.archive, info.offset_data, info.size)
+        elif self._tar is not None:
+            f = self._tar.extractfile(info)
+        else:
+            raise ValueError(f"{self.archive} is closed")
+        if f is None:
+            raise FileNotFoundError(f"{name} in {self.archive} is no regular file")
+        return f
+
+    def close(self) -> None:
+        super().close()
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+        if self._tar is not None:
+            self._tar.close()
+            self._tar = None
+
+    def _zip_data_offset(self, info: zipfile.ZipInfo) -> int:
+        # The central directory does not record where the data of a member
+        # starts, its local header has to be read for that
+        with open(self.archive, "rb") as f:
+            f.seek(info.header_offset)
+            header = _LOCAL_FILE_HEADER.unpack(f.read(_LOCAL_FILE_HEADER.size))
+        if header[0] != _LOCAL_FILE_HEADER_SIGNATURE:
+            raise zipfile.BadZipFile(f"Bad local header of {info.filename}")
+        return info.header_offset + _LOCAL_FILE_HEADER.size + header[10] + header[11]
+
+
+class SourceFile:
+    """A file of a :class:`SourceFolder`, standing in for a Path."""
+
+    def __init__(self, folder: SourceFolder, name: str) -> None:
+        self.folder = folder
+        self.name = name
+
+    @property
+    def suffix(self) -> str:
+        return PurePosixPath(self.name).suffix
+
+    @property
+    def stem(self) -> str:
+        return PurePosixPath(self.name).stem
+
+    @property
+    def parent(self) -> SourceFolder:
+        return self.folder
+
+    def is_file(self) -> bool:
+        return self.name in self.folder
+
+    def is_dir(self) -> bool:
+        return False
+
+    def exists(self) -> bool:
+        return self.is_file()
+
+    def stat(self) -> MemberStat:
+        return MemberStat(self.folder.size(self.name))
+
+    def open(self, mode: str = "rb") -> IO[bytes]:
+        if mode != "rb":
+            raise ValueError(f"Source files can only be opened as 'rb': {mode!r}")
+        return self.folder.open(self.name)
+
+    def read_bytes(self) -> bytes:
+        with self.open() as f:
+            return f.read()
+
+    def __fspath__(self) -> str:
+        return str(self)
+
+    def __str__(self) -> str:
+        return str(self.folder.path / self.name)
+
+    def __repr__(self) -> str:
+        return f"SourceFile({str(self)!r})"
+
+
+class _Range(io.RawIOBase):
+    # A seekable window onto the bytes of an uncompressed member
+
+    def __init__(self, f: IO[bytes], start: int, size: int) -> None:
+        self._f = f
+        self._start = start
+        self._size = size
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._size
+        if offset < 0:
+            raise ValueError(f"Negative seek position {offset}")
+        self._position = offset
+        return offset
+
+    def readinto(self, buffer: Any) -> int:
+        size = min(len(buffer), self._size - self._position)
+        if size <= 0:
+            return 0
+        self._f.seek(self._start + self._position)
+        read = self._f.readinto(memoryview(buffer)[:size])  # type: ignore[attr-defined]
+        self._position += read
+        return int(read)
+
+    def close(self) -> None:
+        self._f.close()
+        super().close()
+
+
+def _open_range(archive: Path, start: int, size: int) -> IO[bytes]:
+    # Every member gets its own unbuffered handle on the archive, so that
+    # members read alternately do not move each other's position
+    return io.BufferedReader(_Range(open(archive, "rb", buffering=0), start, size))
+
+
+def _member_name(name: str) -> str:
+    # Tar members are often stored as ./folder/file
+    name = name.replace("\\", "/")
+    while name.startswith("./"):
+        name = name[2:]
+    return name.strip("/")
+
+
+@contextmanager
+def leveldb_reader(
+    folder: Union[Path, "SourceFolder"],
+) -> Generator[None, None, None]:
+    # ccl_chromium_reader creates its RawLevelDb within the constructors of
+    # its IndexedDB, localStorage and sessionStorage readers, and turns the
+    # folder into a pathlib.Path before that. While such a reader is
+    # constructed for a SourceFolder, and only then, the RawLevelDb it
+    # creates is a SourceLevelDb reading from that folder. Plain folders
+    # are read by the stock class.
+    if not isinstance(folder, SourceFolder):
+        yield
+        return
+    from ccl_chromium_reader import ccl_leveldb
+
+    source_leveldb = _source_leveldb_class()
+    with _READER_LOCK:
+        stock = ccl_leveldb.RawLevelDb
+        ccl_leveldb.RawLevelDb = partial(source_leveldb, folder)
+        try:
+            yield
+        finally:
+            ccl_leveldb.RawLevelDb = stock
+
+
+@cache
+def _source_leveldb_class() -> type:
+    from ccl_chromium_reader import ccl_leveldb
+
+    stock = ccl_leveldb.RawLevelDb
+    # The stock constructor is bypassed, so its attributes have to be known
+    missing = _RAW_LEVELDB_ATTRIBUTES - set(stock.__init__.__code__.co_names)
+    if missing:
+        raise RuntimeError(
+            "This version of ccl_chromium_reader is not supported for archives, "
+            f"hashing or prefetching, RawLevelDb lacks {', '.join(sorted(missing))}."
+        )
+
+    class SourceLevelDb(stock):  # type: ignore[misc, valid-type]
+        """A RawLevelDb over the tables, logs and MANIFEST of a SourceFolder.
+
+        Anything but the folder, or its path, is opened by the stock class.
+        """
+
+        def __init__(
+            self, folder: SourceFolder, in_dir: Any, *args: Any, **kwargs: Any
+        ) -> None:
+            if in_dir is not folder and os.fspath(in_dir) != os.fspath(folder):
+                super().__init__(in_dir, *args, **kwargs)
+                return
+            self._in_dir = folder
+            self._files = []
+            for name in folder.read_order():
+                if name.endswith(".log"):
+                    self._files.append(ccl_leveldb.LogFile(folder / name))
+                else:
+                    self._files.append(ccl_leveldb.LdbFile(folder / name))
+            manifest = folder.current_manifest()
+            self.manifest = (
+                ccl_leveldb.ManifestFile(manifest) if manifest is not None else None
+            )
+
+    return SourceLevelDb
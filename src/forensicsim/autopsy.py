@@ -0,0 +1,507 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import fnmatch
+import re
+import sys
+import time
+import types
+from collections import UserList
+from collections.abc import Generator
+from contextlib import contextmanager
+from typing import Any, Optional
+
+# Stand-ins for the Java and Autopsy classes the Jython ingest module in
+# tools/Forensicsim_Parser.py imports, so that it can be run and measured
+# under CPython. Calls into the case database are counted by a Recorder,
+# which can also add a simulated latency per call.
+
+
+class Recorder:
+    """Counts calls into the Autopsy API, their time and created artifacts.
+
+    ``latency`` maps call names such as ``Blackboard.postArtifacts`` to
+    seconds each call is delayed by, to model the cost of the case database.
+    """
+
+    def __init__(self, latency: Optional[dict[str, float]] = None) -> None:
+        self.latency = latency if latency is not None else {}
+        self.calls: dict[str, int] = {}
+        self.seconds: dict[str, float] = {}
+        self.artifacts = 0
+        self.posted = 0
+
+    def record(self, name: str) -> None:
+        delay = self.latency.get(name)
+        if delay:
+            start = time.perf_counter()
+            time.sleep(delay)
+            self.seconds[name] = self.seconds.get(name, 0.0) + (
+                time.perf_counter() - start
+            )
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    @property
+    def api_seconds(self) -> float:
+        return sum(self.seconds.values())
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            name: {"calls": calls, "seconds": round(self.seconds.get(name, 0.0), 6)}
+            for name, calls in sorted(self.calls.items())
+        }
+
+
+class _Enum:
+    # Any attribute is a constant named after its path, e.g. TskData.X.Y
+    def __init__(self, name: str) -> None:
+        self._name = name
+
+    def __getattr__(self, name: str) -> "_Enum":
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return _Enum(f"{self._name}.{name}")
+
+    def __repr__(self) -> str:
+        return self._name
+
+
+class _Placeholder:
+    # Classes the ingest module imports but only uses inside Autopsy
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+
+class ArrayList(UserList[Any]):
+    def add(self, item: Any) -> bool:
+        self.append(item)
+        return True
+
+    def get(self, index: int) -> Any:
+        return self[index]
+
+    def isEmpty(self) -> bool:
+        return not self
+
+    def size(self) -> int:
+        return len(self)
+
+
+class Logger:
+    @staticmethod
+    def getLogger(name: str) -> "Logger":
+        return Logger()
+
+    def log(self, *args: Any) -> None:
+        pass
+
+    def logp(self, *args: Any) -> None:
+        pass
+
+
+class IngestModuleException(Exception):
+    pass
+
+
+class NoCurrentCaseException(Exception):
+    pass
+
+
+class TskCoreException(Exception):
+    pass
+
+
+class BlackboardException(Exception):
+    pass
+
+
+class PlatformUtil:
+    @staticmethod
+    def isWindowsOS() -> bool:
+        return True
+
+
+class BlackboardAttribute:
+    ATTRIBUTE_TYPE = _Enum("ATTRIBUTE_TYPE")
+    TSK_BLACKBOARD_ATTRIBUTE_VALUE_TYPE = _Enum("TSK_BLACKBOARD_ATTRIBUTE_VALUE_TYPE")
+
+    def __init__(self, attribute_type: Any, source: str, value: Any) -> None:
+        self.attribute_type = attribute_type
+        self.source = source
+        self.value = value
+
+
+class BlackboardArtifact:
+    ARTIFACT_TYPE = _Enum("ARTIFACT_TYPE")
+
+    def __init__(self, recorder: Recorder, artifact_type: Any) -> None:
+        self._recorder = recorder
+        self.artifact_type = artifact_type
+        self.attributes: list[BlackboardAttribute] = []
+        recorder.artifacts += 1
+
+    def addAttribute(self, attribute: BlackboardAttribute) -> None:
+        self._recorder.record("BlackboardArtifact.addAttribute")
+        self.attributes.append(attribute)
+
+
+class _ArtifactType:
+    def __init__(self, type_id: int) -> None:
+        self._type_id = type_id
+
+    def getTypeID(self) -> int:
+        return self._type_id
+
+
+class Blackboard:
+    # org.sleuthkit.datamodel.Blackboard, the blackboard of the case database
+
+    def __init__(self, recorder: Recorder) -> None:
+        self._recorder = recorder
+        self._types: dict[str, Any] = {}
+
+    def getOrAddArtifactType(self, name: str, description: str) -> _ArtifactType:
+        self._recorder.record("Blackboard.getOrAddArtifactType")
+        return self._types.setdefault(name, _ArtifactType(len(self._types) + 1))
+
+    def getOrAddAttributeType(
+        self, name: str, value_type: Any, description: str
+    ) -> Any:
+        self._recorder.record("Blackboard.getOrAddAttributeType")
+        return self._types.setdefault(name, _Enum(name))
+
+    def postArtifacts(self, artifacts: list[Any], module_name: str) -> None:
+        self._recorder.record("Blackboard.postArtifacts")
+        self._recorder.posted += len(artifacts)
+
+
+class _ServicesBlackboard:
+    # The deprecated blackboard of the case services, which adds types to the
+    # blackboard of the case database and indexes single artifacts. It can
+    # not post artifacts.
+
+    def __init__(self, blackboard: Blackboard) -> None:
+        self._blackboard = blackboard
+
+    def getOrAddArtifactType(self, name: str, description: str) -> _ArtifactType:
+        return self._blackboard.getOrAddArtifactType(name, description)
+
+    def getOrAddAttributeType(
+        self, name: str, value_type: Any, description: str
+    ) -> Any:
+        return self._blackboard.getOrAddAttributeType(name, value_type, description)
+
+    def indexArtifact(self, artifact: Any) -> None:
+        self._blackboard._recorder.record("Blackboard.indexArtifact")
+
+
+class AbstractFile:
+    def __init__(
+        self,
+        recorder: Recorder,
+        name: str,
+        parent_path: str,
+        is_dir: bool = False,
+        data_source: Optional["AbstractFile"] = None,
+    ) -> None:
+        self._recorder = recorder
+        self._name = name
+        self._parent_path = parent_path
+        self._is_dir = is_dir
+        self._data_source = data_source
+
+    def getName(self) -> str:
+        return self._name
+
+    def getParentPath(self) -> str:
+        return self._parent_path
+
+    def getDataSource(self) -> Optional["AbstractFile"]:
+        return self._data_source
+
+    def getId(self) -> int:
+        return id(self)
+
+    def isDir(self) -> bool:
+        return self._is_dir
+
+    def isFile(self) -> bool:
+        return not self._is_dir
+
+    def newArtifact(self, artifact_type: Any) -> BlackboardArtifact:
+        self._recorder.record("AbstractFile.newArtifact")
+        return BlackboardArtifact(self._recorder, artifact_type)
+
+
+class FileManager:
+    def __init__(self, recorder: Recorder, files: list[AbstractFile]) -> None:
+        self._recorder = recorder
+        self._files = files
+
+    def findFiles(
+        self, data_source: Any, name: str, parent: Optional[str] = None
+    ) -> ArrayList:
+        # Names are matched like SQL LIKE, the parent path as a substring
+        self._recorder.record("FileManager.findFiles")
+        pattern = re.compile(
+            fnmatch.translate(name.replace("%", "*").replace("_", "?")), re.IGNORECASE
+        )
+        return ArrayList(
+            f
+            for f in self._files
+            if pattern.match(f.getName())
+            and (parent is None or parent.lower() in f.getParentPath().lower())
+        )
+
+
+class CommunicationArtifactsHelper:
+    def __init__(self, sleuthkit_case: "SleuthkitCase", *args: Any) -> None:
+        self._recorder = sleuthkit_case.recorder
+
+    def _artifact(self, name: str, artifact_type: str) -> BlackboardArtifact:
+        self._recorder.record(f"CommunicationArtifactsHelper.{name}")
+        return BlackboardArtifact(self._recorder, artifact_type)
+
+    def addContact(self, *args: Any) -> BlackboardArtifact:
+        return self._artifact("addContact", "TSK_CONTACT")
+
+    def addCalllog(self, *args: Any) -> BlackboardArtifact:
+        return self._artifact("addCalllog", "TSK_CALLLOG")
+
+    def addMessage(self, *args: Any) -> BlackboardArtifact:
+        return self._artifact("addMessage", "TSK_MESSAGE")
+
+    def addAttachments(self, artifact: BlackboardArtifact, attachments: Any) -> None:
+        self._recorder.record("CommunicationArtifactsHelper.addAttachments")
+
+
+class CommunicationsManager:
+    @staticmethod
+    def addAccountType(manager: Any, name: str, display_name: str) -> _Enum:
+        return _Enum(name)
+
+
+class SleuthkitCase:
+    def __init__(self, recorder: Recorder, blackboard: Blackboard) -> None:
+        self.recorder = recorder
+        self._blackboard = blackboard
+
+    def getBlackboard(self) -> Blackboard:
+        return self._blackboard
+
+    def getCommunicationsManager(self) -> _Placeholder:
+        return _Placeholder()
+
+
+class _Services:
+    def __init__(self, file_manager: FileManager, blackboard: Blackboard) -> None:
+        self._file_manager = file_manager
+        self._blackboard = blackboard
+
+    def getFileManager(self) -> FileManager:
+        return self._file_manager
+
+    def getBlackboard(self) -> _ServicesBlackboard:
+        return _ServicesBlackboard(self._blackboard)
+
+    def getArtifactsBlackboard(self) -> Blackboard:
+        return self._blackboard
+
+
+class Case:
+    """Case with a file manager over ``files`` and a recording blackboard."""
+
+    current: Optional["Case"] = None
+
+    def __init__(
+        self, recorder: Recorder, files: list[AbstractFile], temp_directory: str
+    ) -> None:
+        self.recorder = recorder
+        blackboard = Blackboard(recorder)
+        self._services = _Services(FileManager(recorder, files), blackboard)
+        self._sleuthkit_case = SleuthkitCase(recorder, blackboard)
+        self._temp_directory = temp_directory
+
+    @staticmethod
+    def getCurrentCase() -> "Case":
+        if Case.current is None:
+            raise NoCurrentCaseException("No case is open.")
+        return Case.current
+
+    @staticmethod
+    def getCurrentCaseThrows() -> "Case":
+        return Case.getCurrentCase()
+
+    def getServices(self) -> _Services:
+        return self._services
+
+    def getSleuthkitCase(self) -> SleuthkitCase:
+        return self._sleuthkit_case
+
+    def getTempDirectory(self) -> str:
+        return self._temp_directory
+
+
+class IngestJobContext:
+    def isJobCancelled(self) -> bool:
+        return False
+
+
+class ProgressBar:
+    def __init__(self) -> None:
+        self.units = 0
+
+    def progress(self, *args: Any) -> None:
+        self.units = args[-1]
+
+    def switchToDeterminate(self, units: int) -> None:
+        pass
+
+    def switchToIndeterminate(self) -> None:
+        pass
+
+
+def _modules() -> dict[str, dict[str, Any]]:
+    # Names the ingest module imports from each Java package
+    enums = {
+        name: _Enum(name)
+        for name in (
+            "CallMediaType",
+            "CommunicationDirection",
+            "MessageReadStatus",
+            "TimeUnit",
+            "TskData",
+            "Level",
+        )
+    }
+    placeholders = dict.fromkeys(
+        (
+            "BoxLayout",
+            "BufferedInputStream",
+            "BufferedOutputStream",
+            "BufferedReader",
+            "ContentUtils",
+            "DataInputStream",
+            "DataOutputStream",
+            "DataSourceIngestModule",
+            "DataSourceIngestModuleProcessTerminator",
+            "ExecUtil",
+            "File",
+            "IngestMessage",
+            "IngestModule",
+            "IngestModuleFactoryAdapter",
+            "IngestModuleIngestJobSettings",
+            "IngestModuleIngestJobSettingsPanel",
+            "IngestServices",
+            "InputStreamReader",
+            "JCheckBox",
+            "MessageAttachments",
+            "ProcessBuilder",
+            "String",
+            "Thread",
+            "URLAttachment",
+        ),
+        _Placeholder,
+    )
+    names = {**enums, **placeholders, **globals()}
+    packages = {
+        "jarray": [],
+        "java": [],
+        "java.io": [
+            "BufferedInputStream",
+            "BufferedOutputStream",
+            "BufferedReader",
+            "DataInputStream",
+            "DataOutputStream",
+            "File",
+            "InputStreamReader",
+        ],
+        "java.lang": ["ProcessBuilder", "String", "Thread"],
+        "java.util": ["ArrayList"],
+        "java.util.concurrent": ["TimeUnit"],
+        "java.util.logging": ["Level"],
+        "javax": [],
+        "javax.swing": ["BoxLayout", "JCheckBox"],
+        "org": [],
+        "org.sleuthkit": [],
+        "org.sleuthkit.autopsy": [],
+        "org.sleuthkit.autopsy.casemodule": ["Case", "NoCurrentCaseException"],
+        "org.sleuthkit.autopsy.coreutils": ["ExecUtil", "Logger", "PlatformUtil"],
+        "org.sleuthkit.autopsy.datamodel": ["ContentUtils"],
+        "org.sleuthkit.autopsy.ingest": [
+            "DataSourceIngestModule",
+            "DataSourceIngestModuleProcessTerminator",
+            "IngestMessage",
+            "IngestModule",
+            "IngestModuleFactoryAdapter",
+            "IngestModuleIngestJobSettings",
+            "IngestModuleIngestJobSettingsPanel",
+            "IngestServices",
+        ],
+        "org.sleuthkit.autopsy.ingest.IngestModule": ["IngestModuleException"],
+        "org.sleuthkit.datamodel": [
+            "BlackboardArtifact",
+            "BlackboardAttribute",
+            "CommunicationsManager",
+            "TskCoreException",
+            "TskData",
+        ],
+        "org.sleuthkit.datamodel.Blackboard": ["BlackboardException"],
+        "org.sleuthkit.datamodel.blackboardutils": ["CommunicationArtifactsHelper"],
+        "org.sleuthkit.datamodel.blackboardutils.CommunicationArtifactsHelper": [
+            "CallMediaType",
+            "CommunicationDirection",
+            "MessageReadStatus",
+        ],
+        "org.sleuthkit.datamodel.blackboardutils.attributes": ["MessageAttachments"],
+        "org.sleuthkit.datamodel.blackboardutils.attributes.MessageAttachments": [
+            "URLAttachment"
+        ],
+    }
+    return {
+        package: {name: names[name] for name in members}
+        for package, members in packages.items()
+    }
+
+
+@contextmanager
+def autopsy_modules(case: Case) -> Generator[None, None, None]:
+    """Make the stand-ins importable as the Java packages and open ``case``."""
+    saved = {name: sys.modules.get(name) for name in _modules()}
+    for package, members in _modules().items():
+        module = types.ModuleType(package)
+        module.__dict__.update(members)
+        # Every package is its own parent, so nested imports resolve
+        module.__path__ = []
+        sys.modules[package] = module
+    Case.current = case
+    try:
+        yield
+    finally:
+        Case.current = None
+        for name, saved_module in saved.items():
+            if saved_module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = saved_module
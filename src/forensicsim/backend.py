@@ -22,107 +22,1172 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import bisect
+import heapq
+import itertools
 import json
+import pickle
+import shutil
+import sys
+import tempfile
+from collections import deque
+from collections.abc import Iterable, Iterator
+from functools import partial
 from pathlib import Path
-from typing import Any, Optional
+from typing import TYPE_CHECKING, Any, BinaryIO, Callable, Optional, Union
 
-from ccl_chromium_reader import (
-    ccl_chromium_indexeddb,
-    ccl_chromium_localstorage,
-    ccl_chromium_sessionstorage,
-)
+from forensicsim import __version__
+from forensicsim.jsonstream import RawJSON, extract_paths, raw_json
+from forensicsim.progress import Progress, estimate_records
+from forensicsim.stats import Stats
+
+if TYPE_CHECKING:
+    from forensicsim.archive import SourceFolder
+    from forensicsim.hashing import SourceHashes
 
 TEAMS_DB_OBJECT_STORES = ["replychains", "conversations", "people", "buddylist"]
 
 ENCODING = "iso-8859-1"
 
+SHARD_MANIFEST = "manifest.json"
+SHARD_BUFFER_SIZE = 8 * 1024 * 1024
+# Rows inserted per SQLite transaction and written per Parquet row group
+SINK_BATCH_SIZE = 10_000
+# Characters of formatted records per compressed frame, frames waiting for
+# the compression thread, and the file the frames are listed in
+COMPRESSED_FRAME_SIZE = 1024 * 1024
+COMPRESSION_QUEUE_SIZE = 4
+FRAME_INDEX_SUFFIX = ".index.json"
+COMPRESSIONS = ("gzip", "zstd")
+# localStorage values of this many characters or more are decoded in worker
+# processes, smaller ones cost more to send to a worker than to decode
+PARALLEL_DECODE_SIZE = 64 * 1024
+# Values pending per worker before the oldest one is waited for
+PARALLEL_DECODE_WINDOW = 4
+# Default size in characters from which localStorage values are scanned for
+# JSON paths instead of being decoded as a whole
+LARGE_VALUE_SIZE = 1024 * 1024
+
+
+class MemoryBudget:
+    """Byte budget shared by all :class:`SpillBuffer` instances of a run.
+
+    Buffers charge the serialized size of every item they hold. Once the
+    total exceeds ``limit``, the largest buffer writes its in-memory batch
+    to a run file in a temporary directory, which is removed by ``close``.
+    """
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.used = 0
+        self.spills = 0
+        self.spilled_bytes = 0
+        self._buffers: list[SpillBuffer] = []
+        self._spill_dir: Optional[Path] = None
+
+    def register(self, buffer: "SpillBuffer") -> None:
+        self._buffers.append(buffer)
+
+    def charge(self, size: int) -> None:
+        self.used += size
+        if self.used > self.limit:
+            max(self._buffers, key=lambda b: b.in_memory_bytes).spill()
+
+    def new_run_path(self) -> Path:
+        if self._spill_dir is None:
+            self._spill_dir = Path(tempfile.mkdtemp(prefix="forensicsim-"))
+        self.spills += 1
+        return self._spill_dir / f"run-{self.spills:06d}.pickle"
+
+    def close(self) -> None:
+        if self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+
+
+class SpillBuffer:
+    """Append-only record buffer that spills to disk under a :class:`MemoryBudget`.
+
+    Items are kept pickled in memory and written out as a run file whenever
+    the budget asks for it. Iterating yields the runs followed by the
+    in-memory tail. With ``sort=True`` every run is sorted and deduplicated
+    before it is written, and iteration merges the runs, which gives the
+    same result as ``sorted(set(items))``.
+    """
+
+    def __init__(self, budget: MemoryBudget, sort: bool = False) -> None:
+        self._budget = budget
+        self._sort = sort
+        self._batch: list[bytes] = []
+        self._runs: list[Path] = []
+        self._length = 0
+        self.in_memory_bytes = 0
+        budget.register(self)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def append(self, item: Any) -> None:
+        data = pickle.dumps(item, pickle.HIGHEST_PROTOCOL)
+        self._batch.append(data)
+        self._length += 1
+        self.in_memory_bytes += len(data)
+        self._budget.charge(len(data))
+
+    def spill(self) -> None:
+        if not self._batch:
+            return
+        batch = self._batch
+        if self._sort:
+            items = _unique(sorted(pickle.loads(data) for data in batch))
+            batch = [pickle.dumps(item, pickle.HIGHEST_PROTOCOL) for item in items]
+        run = self._budget.new_run_path()
+        with open(run, "wb") as f:
+            f.writelines(batch)
+        self._runs.append(run)
+        self._budget.spilled_bytes += sum(len(data) for data in batch)
+        self._budget.used -= self.in_memory_bytes
+        self._batch = []
+        self.in_memory_bytes = 0
+
+    def __iter__(self) -> Iterator[Any]:
+        runs = [_read_run(run) for run in self._runs]
+        tail = (pickle.loads(data) for data in self._batch)
+        if self._sort:
+            return _unique(heapq.merge(*runs, sorted(tail)))
+        return itertools.chain(*runs, tail)
+
+    def close(self) -> None:
+        for run in self._runs:
+            run.unlink(missing_ok=True)
+        self._runs = []
+        self._budget.used -= self.in_memory_bytes
+        self._batch = []
+        self.in_memory_bytes = 0
+
+
+def _read_run(run: Path) -> Iterator[Any]:
+    with open(run, "rb") as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+def _unique(items: Iterable[Any]) -> Iterator[Any]:
+    # Drop neighbouring duplicates of a sorted stream, keeping the first one
+    previous: Any = _SENTINEL
+    for item in items:
+        if previous is _SENTINEL or item != previous:
+            yield item
+        previous = item
+
+
+_SENTINEL = object()
+
+
+def existing_source(ctx: Any, param: Any, value: Optional[Path]) -> Optional[Path]:
+    """Click callback that checks a folder exists, on disk or in an archive."""
+    if value is None or value.exists():
+        return value
+    # Only paths into archives need the archive modules
+    import tarfile
+    import zipfile
+
+    import click
+
+    from forensicsim.archive import ArchiveFolder, archive_path
+
+    split = archive_path(value)
+    if split is not None:
+        try:
+            ArchiveFolder(value, *split).close()
+            return value
+        except (OSError, tarfile.TarError, zipfile.BadZipFile):
+            pass
+    raise click.BadParameter(
+        f"Path '{value}' does not exist, nor within a .zip or .tar archive.",
+        ctx=ctx,
+        param=param,
+    )
+
 
 def parse_db(
-    filepath: Path,
+    filepath: Union[Path, "SourceFolder"],
     blobpath: Optional[Path] = None,
     filter_db_results: Optional[bool] = True,
-) -> list[dict[str, Any]]:
-    # Open raw access to a LevelDB and deserialize the records.
+    budget: Optional[MemoryBudget] = None,
+    stats: Optional[Stats] = None,
+    progress: Optional[Progress] = None,
+    hashes: Optional["SourceHashes"] = None,
+    prefetch: Optional[int] = None,
+) -> Union[list[dict[str, Any]], SpillBuffer]:
+    # Open raw access to a LevelDB and deserialize the records. Once
+    # cancellation is requested, the records extracted so far are returned.
+    extracted_values: Union[list[dict[str, Any]], SpillBuffer] = (
+        [] if budget is None else SpillBuffer(budget)
+    )
+    for record in iter_db(
+        filepath, blobpath, filter_db_results, stats, progress, hashes, prefetch
+    ):
+        extracted_values.append(record)
+    return extracted_values
 
-    wrapper = ccl_chromium_indexeddb.WrappedIndexDB(filepath, blobpath)
 
-    extracted_values = []
+def iter_db(
+    filepath: Union[Path, "SourceFolder"],
+    blobpath: Optional[Path] = None,
+    filter_db_results: Optional[bool] = True,
+    stats: Optional[Stats] = None,
+    progress: Optional[Progress] = None,
+    hashes: Optional["SourceHashes"] = None,
+    prefetch: Optional[int] = None,
+) -> Iterator[dict[str, Any]]:
+    # Like parse_db, but yields the records one at a time. The folder can be
+    # within a zip or tar archive. With hashes, its files are hashed as they
+    # are read, with prefetch that many files are read ahead of the parser.
+    from ccl_chromium_reader import ccl_chromium_indexeddb
+
+    from forensicsim.archive import SourceFolder, leveldb_reader, open_folder
 
-    for db_info in wrapper.database_ids:
-        # Skip databases without a valid dbid_no
-        if db_info.dbid_no is None:
-            continue
+    stats = stats if stats is not None else Stats(enabled=False)
+    progress = progress if progress is not None else Progress(enabled=False)
 
-        db = wrapper[db_info.dbid_no]
+    with (
+        open_folder(filepath, hashes, prefetch, stats) as folder,
+        stats.stage("extraction"),
+    ):
+        progress.start(
+            "extraction", total=estimate_records(folder, blobpath), estimated=True
+        )
+        # Files opened through a SourceFolder are closed together with it
+        wrapped = isinstance(folder, SourceFolder)
+        with leveldb_reader(folder):
+            wrapper = ccl_chromium_indexeddb.WrappedIndexDB(folder, blobpath)
 
-        for obj_store_name in db.object_store_names:
-            # Skip empty object stores
-            if obj_store_name is None:
+        for db_info in wrapper.database_ids:
+            # Skip databases without a valid dbid_no
+            if db_info.dbid_no is None:
                 continue
-            if obj_store_name in TEAMS_DB_OBJECT_STORES or filter_db_results is False:
-                obj_store = db[obj_store_name]
-                records_per_object_store = 0
-                for record in obj_store.iterate_records():
-                    # skip empty records
-                    if not hasattr(record, "value") or record.value is None:
-                        continue
-                    # skip records without file origin
-                    if not hasattr(record, "origin_file") or record.origin_file is None:
-                        continue
-                    records_per_object_store += 1
-                    # TODO: Fix None values
-                    state = None
-                    seq = None
-                    extracted_values.append({
-                        "key": record.key.raw_key,
-                        "value": record.value,
-                        "origin_file": record.origin_file,
-                        "store": obj_store_name,
-                        "state": state,
-                        "seq": seq,
-                    })
-                print(
-                    f"{obj_store_name} {db.name} (Records: {records_per_object_store})"
+
+            db = wrapper[db_info.dbid_no]
+
+            for obj_store_name in db.object_store_names:
+                # Skip empty object stores
+                if obj_store_name is None:
+                    continue
+                if (
+                    obj_store_name in TEAMS_DB_OBJECT_STORES
+                    or filter_db_results is False
+                ):
+                    with stats.stage("extraction", obj_store_name) as store_stats:
+                        obj_store = db[obj_store_name]
+                        records_per_object_store = 0
+                        try:
+                            for record in progress.track(
+                                obj_store.iterate_records(), obj_store_name
+                            ):
+                                # skip empty records
+                                if not hasattr(record, "value") or record.value is None:
+                                    continue
+                                # skip records without file origin
+                                if (
+                                    not hasattr(record, "origin_file")
+                                    or record.origin_file is None
+                                ):
+                                    continue
+                                records_per_object_store += 1
+                                # TODO: Fix None values
+                                state = None
+                                seq = None
+                                yield {
+                                    "key": record.key.raw_key,
+                                    "value": record.value,
+                                    "origin_file": str(record.origin_file)
+                                    if wrapped
+                                    else record.origin_file,
+                                    "store": obj_store_name,
+                                    "state": state,
+                                    "seq": seq,
+                                }
+                        finally:
+                            store_stats.records += records_per_object_store
+
+
+def parse_localstorage(
+    filepath: Path,
+    stats: Optional[Stats] = None,
+    origins: Optional[Iterable[str]] = None,
+    key_prefixes: Optional[Iterable[str]] = None,
+    workers: int = 1,
+    large_value_size: Optional[int] = None,
+    paths: Optional[Iterable[str]] = None,
+) -> Iterator[dict[str, Any]]:
+    # Yield the live localStorage records with their origin, key and LevelDB
+    # sequence number. Records of other origins or keys are skipped before
+    # their values are decoded. Values that are no JSON are kept as strings.
+    # With more than one worker, values of PARALLEL_DECODE_SIZE characters
+    # or more are decoded in a process pool, in the original order.
+    # Values of large_value_size characters or more are not decoded as a
+    # whole: only the JSON paths are extracted from them, or without paths
+    # they are passed through to the output unchanged. The folder can be
+    # within a zip or tar archive.
+    from ccl_chromium_reader import ccl_chromium_localstorage
+
+    from forensicsim.archive import leveldb_reader, open_folder
+
+    stats = stats if stats is not None else Stats(enabled=False)
+    origins = frozenset(origins) if origins else None
+    prefixes = tuple(key_prefixes) if key_prefixes else None
+    paths = tuple(paths) if paths else None
+    if paths and large_value_size is None:
+        large_value_size = LARGE_VALUE_SIZE
+    decode = partial(_decode_value, large_value_size=large_value_size, paths=paths)
+    with open_folder(filepath) as folder, stats.stage("extraction") as stage_stats:
+        with leveldb_reader(folder):
+            local_store = ccl_chromium_localstorage.LocalStoreDb(folder)
+        records = (
+            record
+            for record in local_store.iter_all_records()
+            if (origins is None or record.storage_key in origins)
+            and (prefixes is None or record.script_key.startswith(prefixes))
+        )
+        decoded = (
+            _decode_in_pool(records, decode, workers)
+            if workers > 1
+            else ((record, decode(record.value)) for record in records)
+        )
+        for record, (value, value_format) in decoded:
+            stage_stats.records += 1
+            stats.count(f"localstorage_{value_format}_values")
+            entry = {
+                "origin": record.storage_key,
+                "key": record.script_key,
+                "value": value,
+                "seq": record.leveldb_seq_number,
+            }
+            if value_format in ("raw", "paths"):
+                entry["value_format"] = value_format
+                entry["value_size"] = len(record.value)
+            yield entry
+
+
+def _decode_value(
+    value: str,
+    large_value_size: Optional[int] = None,
+    paths: Optional[tuple[str, ...]] = None,
+) -> tuple[Any, str]:
+    # Returns the value and its format: json, text, raw or paths
+    if large_value_size is not None and len(value) >= large_value_size:
+        try:
+            if paths:
+                return extract_paths(value, paths), "paths"
+            return raw_json(value), "raw"
+        except ValueError:
+            return value, "text"
+    try:
+        return json.loads(value, strict=False), "json"
+    except json.decoder.JSONDecodeError:
+        return value, "text"
+
+
+def _decode_in_pool(
+    records: Iterable[Any], decode: Callable[[str], tuple[Any, str]], workers: int
+) -> Iterator[tuple[Any, tuple[Any, str]]]:
+    # A bounded window of pending values keeps the output in record order
+    # without holding more than a few values per worker in memory
+    from concurrent.futures import Future, ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        window: deque[tuple[Any, Future[tuple[Any, str]]]] = deque()
+        for record in records:
+            if len(record.value) >= PARALLEL_DECODE_SIZE:
+                future = pool.submit(decode, record.value)
+            else:
+                future = Future()
+                future.set_result(decode(record.value))
+            window.append((record, future))
+            if len(window) > workers * PARALLEL_DECODE_WINDOW:
+                record, future = window.popleft()
+                yield record, future.result()
+        while window:
+            record, future = window.popleft()
+            yield record, future.result()
+
+
+def parse_sessionstorage(
+    filepath: Path,
+    stats: Optional[Stats] = None,
+    hosts: Optional[Iterable[str]] = None,
+    namespaces: Optional[Iterable[str]] = None,
+) -> Iterator[dict[str, Any]]:
+    # Yield the sessionStorage values host by host. Hosts that are not in
+    # hosts are skipped before their values are looked up, values of other
+    # namespaces (the guid of a session) before an entry is built for them.
+    # The folder can be within a zip or tar archive.
+    from ccl_chromium_reader import ccl_chromium_sessionstorage
+
+    from forensicsim.archive import leveldb_reader, open_folder
+
+    stats = stats if stats is not None else Stats(enabled=False)
+    hosts = frozenset(hosts) if hosts else None
+    namespaces = frozenset(namespaces) if namespaces else None
+    with open_folder(filepath) as folder, stats.stage("extraction"):
+        with leveldb_reader(folder):
+            session_storage = ccl_chromium_sessionstorage.SessionStoreDb(folder)
+        for host in session_storage:
+            if hosts is not None and host not in hosts:
+                stats.count("sessionstorage_skipped_hosts")
+                continue
+            with stats.stage("extraction", host) as host_stats:
+                records = 0
+                try:
+                    # Hosts can have multiple sessions associated with them
+                    for storage_key, values in session_storage.get_all_for_host(
+                        host
+                    ).items():
+                        for value in values:
+                            # value is of type SessionStoreValue
+                            if namespaces is not None and value.guid not in namespaces:
+                                continue
+                            records += 1
+                            yield {
+                                "key": host,
+                                "storage_key": storage_key,
+                                "value": value.value,
+                                "guid": value.guid,
+                                "leveldb_sequence_number": value.leveldb_sequence_number,
+                            }
+                finally:
+                    host_stats.records += records
+
+
+def write_results_to_json(
+    data: Iterable[dict[str, Any]],
+    outputpath: Path,
+    stats: Optional[Stats] = None,
+    compression: Optional[str] = None,
+) -> None:
+    # Dump messages into a json file. Records are written one at a time, so
+    # that spilled results never have to be held in memory as a whole. The
+    # output is identical to json.dump(data, f, indent=4), compressed with
+    # gzip or zstd if requested.
+    write_to_sinks(
+        data,
+        [
+            JsonSink(outputpath)
+            if compression is None
+            else CompressedSink(outputpath, compression)
+        ],
+        stats,
+    )
+
+
+def write_results_to_jsonl(
+    data: Iterable[dict[str, Any]],
+    outputpath: Path,
+    stats: Optional[Stats] = None,
+    compression: Optional[str] = None,
+) -> None:
+    # Dump messages as JSON Lines, one compact record per line, so that
+    # consumers can read them in batches instead of loading the whole file
+    write_to_sinks(
+        data,
+        [
+            JsonLinesSink(outputpath)
+            if compression is None
+            else CompressedSink(outputpath, compression, line_delimited=True)
+        ],
+        stats,
+    )
+
+
+def write_results_to_shards(
+    data: Iterable[dict[str, Any]],
+    outputpath: Path,
+    stats: Optional[Stats] = None,
+    line_delimited: bool = False,
+) -> None:
+    # Write one JSON array per origin_file and record_type into the folder
+    # outputpath, together with a manifest listing the shards
+    write_to_sinks(data, [ShardSink(outputpath, line_delimited)], stats)
+
+
+def write_results_to_chunks(
+    data: Iterable[dict[str, Any]],
+    outputpath: Path,
+    stats: Optional[Stats] = None,
+    max_records: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    line_delimited: bool = False,
+) -> None:
+    # Write numbered chunks of bounded size into the folder outputpath,
+    # together with a manifest listing what each chunk holds
+    write_to_sinks(
+        data, [ChunkSink(outputpath, max_records, max_bytes, line_delimited)], stats
+    )
+
+
+def write_to_sinks(
+    data: Iterable[dict[str, Any]],
+    sinks: Iterable["Sink"],
+    stats: Optional[Stats] = None,
+    progress: Optional[Progress] = None,
+) -> None:
+    # Stream every record to all sinks in a single pass. A sink that fails
+    # is reported and dropped, the others carry on.
+    stats = stats if stats is not None else Stats(enabled=False)
+    opened: list[Sink] = []
+    with stats.stage("write") as stage_stats:
+        records = 0
+        try:
+            for sink in sinks:
+                try:
+                    sink.open()
+                    opened.append(sink)
+                except sink.errors as e:
+                    _drop_sink(sink, e, stats, progress)
+            active = list(opened)
+            for records, record in enumerate(data, start=1):
+                for sink in active:
+                    try:
+                        sink.write(record)
+                    except sink.errors as e:
+                        _drop_sink(sink, e, stats, progress)
+                if any(sink.failed for sink in active):
+                    active = [sink for sink in active if not sink.failed]
+        finally:
+            # Also when the records stop early, so that no sink keeps its
+            # files open. Dropped sinks are closed without a second report.
+            for sink in opened:
+                try:
+                    sink.close()
+                except sink.errors as e:
+                    if not sink.failed:
+                        _drop_sink(sink, e, stats, progress)
+            stage_stats.records += records
+
+
+def _drop_sink(
+    sink: "Sink", error: Exception, stats: Stats, progress: Optional[Progress]
+) -> None:
+    # stderr carries nothing but JSON lines while progress is reported
+    sink.failed = True
+    stats.count("sink_errors")
+    if progress is not None and progress.enabled:
+        progress.emit({
+            "event": "sink_error",
+            "output": str(sink.outputpath),
+            "error": str(error),
+        })
+    else:
+        print(f"Dropped output {sink.outputpath}: {error}", file=sys.stderr)
+
+
+class Sink:
+    """Destination for normalized records, see :func:`write_to_sinks`.
+
+    A sink is opened before the first record, gets the records one at a
+    time and buffers and flushes them on its own. ``close`` writes out
+    whatever is left. Exceptions of the types in ``errors`` are reported
+    and drop the sink, anything else aborts the run.
+    """
+
+    errors: tuple[type[Exception], ...] = (OSError,)
+
+    def __init__(self, outputpath: Path) -> None:
+        self.outputpath = outputpath
+        self.records = 0
+        self.failed = False
+
+    def open(self) -> None:
+        pass
+
+    def write(self, record: dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class JsonSink(Sink):
+    """A JSON array laid out like ``json.dump(data, f, indent=4)``."""
+
+    def open(self) -> None:
+        self._file = self.outputpath.open("w", encoding="utf-8")
+        self._file.write("[")
+
+    def write(self, record: dict[str, Any]) -> None:
+        self._file.write(",\n    " if self.records else "\n    ")
+        self._file.write(_format_record(record))
+        self.records += 1
+
+    def close(self) -> None:
+        with self._file:
+            self._file.write("\n]" if self.records else "]")
+
+
+class JsonLinesSink(Sink):
+    """JSON Lines, one compact record per line."""
+
+    def open(self) -> None:
+        self._file = self.outputpath.open("w", encoding="utf-8")
+
+    def write(self, record: dict[str, Any]) -> None:
+        self._file.write(_format_line(record))
+        self.records += 1
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ShardSink(Sink):
+    """One JSON array per origin_file and record_type plus a manifest.
+
+    Formatted records are buffered per shard and appended to their files
+    once the buffers hold ``SHARD_BUFFER_SIZE`` characters in total. With
+    ``line_delimited`` the shards are JSON Lines files instead.
+    """
+
+    def __init__(self, outputpath: Path, line_delimited: bool = False) -> None:
+        super().__init__(outputpath)
+        self.line_delimited = line_delimited
+        self._suffix, self._start, self._end = (
+            (".jsonl", "", "") if line_delimited else (".json", "[", "\n]")
+        )
+        self._shards: dict[tuple[Optional[str], Optional[str]], dict[str, Any]] = {}
+        self._buffers: dict[tuple[Optional[str], Optional[str]], list[str]] = {}
+        self._buffered = 0
+
+    def open(self) -> None:
+        self.outputpath.mkdir(parents=True, exist_ok=True)
+
+    def write(self, record: dict[str, Any]) -> None:
+        key = (record.get("origin_file"), record.get("record_type"))
+        shard = self._shards.get(key)
+        if shard is None:
+            shard = self._shards[key] = {
+                "origin_file": key[0],
+                "record_type": key[1],
+                "file": f"shard-{len(self._shards):06d}{self._suffix}",
+                "records": 0,
+            }
+            # Replaces a shard left over from an earlier run
+            (self.outputpath / shard["file"]).write_text(self._start, encoding="utf-8")
+            self._buffers[key] = []
+        if self.line_delimited:
+            text = _format_line(record)
+        else:
+            text = ("\n    " if shard["records"] == 0 else ",\n    ") + (
+                _format_record(record)
+            )
+        self._buffers[key].append(text)
+        self._buffered += len(text)
+        shard["records"] += 1
+        self.records += 1
+        if self._buffered >= SHARD_BUFFER_SIZE:
+            self._flush()
+
+    def close(self) -> None:
+        for buffer in self._buffers.values():
+            buffer.append(self._end)
+        self._flush()
+        manifest = {
+            "version": __version__,
+            "records": self.records,
+            "shards": list(self._shards.values()),
+        }
+        with open(self.outputpath / SHARD_MANIFEST, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=4, ensure_ascii=False)
+
+    def _flush(self) -> None:
+        for key, buffer in self._buffers.items():
+            if buffer:
+                with open(
+                    self.outputpath / self._shards[key]["file"], "a", encoding="utf-8"
+                ) as f:
+                    f.write("".join(buffer))
+                buffer.clear()
+        self._buffered = 0
+
+
+class ChunkSink(Sink):
+    """Numbered chunk files of at most ``max_records`` records or
+    ``max_bytes`` bytes each, plus a manifest.
+
+    A chunk only exceeds ``max_bytes`` if a single record does. For every
+    chunk the manifest lists its record types, origin files and the range
+    of the createdTime of its records, so that consumers can load chunks
+    concurrently or skip them. With ``line_delimited`` the chunks are JSON
+    Lines files instead.
+    """
+
+    def __init__(
+        self,
+        outputpath: Path,
+        max_records: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        line_delimited: bool = False,
+    ) -> None:
+        super().__init__(outputpath)
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.line_delimited = line_delimited
+        self._suffix, self._start, self._end = (
+            (".jsonl", b"", b"") if line_delimited else (".json", b"[", b"\n]")
+        )
+        self._chunks: list[dict[str, Any]] = []
+        self._file: Optional[BinaryIO] = None
+        self._record_types: set[str] = set()
+        self._origin_files: set[str] = set()
+
+    def open(self) -> None:
+        self.outputpath.mkdir(parents=True, exist_ok=True)
+
+    def write(self, record: dict[str, Any]) -> None:
+        if self.line_delimited:
+            data = _format_line(record).encode("utf-8")
+        else:
+            data = ("\n    " + _format_record(record)).encode("utf-8")
+        if self._file is not None:
+            chunk = self._chunks[-1]
+            separator = b"" if self.line_delimited else b","
+            if (
+                self.max_records is not None and chunk["records"] >= self.max_records
+            ) or (
+                self.max_bytes is not None
+                and chunk["bytes"] + len(separator + data + self._end) > self.max_bytes
+            ):
+                self._finish_chunk(self._file)
+            else:
+                data = separator + data
+        if self._file is None:
+            self._file = self._start_chunk()
+        chunk = self._chunks[-1]
+        self._file.write(data)
+        chunk["records"] += 1
+        chunk["bytes"] += len(data)
+        self.records += 1
+        if record.get("record_type") is not None:
+            self._record_types.add(str(record["record_type"]))
+        if record.get("origin_file") is not None:
+            self._origin_files.add(str(record["origin_file"]))
+        created = record.get("createdTime")
+        if isinstance(created, str):
+            if chunk["first_created"] is None or created < chunk["first_created"]:
+                chunk["first_created"] = created
+            if chunk["last_created"] is None or created > chunk["last_created"]:
+                chunk["last_created"] = created
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._finish_chunk(self._file)
+        manifest = {
+            "version": __version__,
+            "records": self.records,
+            "chunks": self._chunks,
+        }
+        with open(self.outputpath / SHARD_MANIFEST, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=4, ensure_ascii=False)
+
+    def _start_chunk(self) -> BinaryIO:
+        chunk: dict[str, Any] = {
+            "file": f"chunk-{len(self._chunks):06d}{self._suffix}",
+            "records": 0,
+            "bytes": len(self._start),
+            "record_types": [],
+            "origin_files": [],
+            "first_created": None,
+            "last_created": None,
+        }
+        self._chunks.append(chunk)
+        # Replaces a chunk left over from an earlier run
+        f = (self.outputpath / chunk["file"]).open("wb")
+        f.write(self._start)
+        return f
+
+    def _finish_chunk(self, f: BinaryIO) -> None:
+        chunk = self._chunks[-1]
+        with f:
+            f.write(self._end)
+        self._file = None
+        chunk["bytes"] += len(self._end)
+        chunk["record_types"] = sorted(self._record_types)
+        chunk["origin_files"] = sorted(self._origin_files)
+        self._record_types = set()
+        self._origin_files = set()
+
+
+class CompressedSink(Sink):
+    """A JSON array or JSON Lines file compressed in independent frames.
+
+    Formatted records are collected into frames of about
+    ``COMPRESSED_FRAME_SIZE`` characters that end on record boundaries.
+    The frames are compressed and written on a background thread, each as
+    a gzip member or zstd frame of its own, so that the file still
+    decompresses as a whole. An index next to it lists the offset and the
+    records of every frame, see :func:`read_compressed_record`.
+    """
+
+    def __init__(
+        self,
+        outputpath: Path,
+        compression: str = "gzip",
+        line_delimited: bool = False,
+    ) -> None:
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression: {compression}")
+        if compression == "zstd":
+            import importlib.util
+
+            # Fail before parsing rather than once the records are written
+            if importlib.util.find_spec("zstandard") is None:
+                raise ImportError(
+                    "zstd compression needs zstandard, install forensicsim[zstd]."
                 )
-    return extracted_values
+        super().__init__(outputpath)
+        self.compression = compression
+        self.line_delimited = line_delimited
+        self._end = "" if line_delimited else "\n]"
+        self._frame: list[str] = [] if line_delimited else ["["]
+        self._frame_size = 0
+        self._frame_records = 0
+        self._frames: list[dict[str, Any]] = []
+        self._error: Optional[BaseException] = None
+
+    def open(self) -> None:
+        import queue
+        import threading
+
+        self._file = self.outputpath.open("wb")
+        self._queue: queue.Queue[Optional[tuple[str, int, int]]] = queue.Queue(
+            maxsize=COMPRESSION_QUEUE_SIZE
+        )
+        self._thread = threading.Thread(
+            target=self._compress_frames, name="compression", daemon=True
+        )
+        self._thread.start()
+
+    def write(self, record: dict[str, Any]) -> None:
+        if self._frame_size >= COMPRESSED_FRAME_SIZE:
+            self._submit()
+        if self.line_delimited:
+            text = _format_line(record)
+        else:
+            text = (",\n    " if self.records else "\n    ") + _format_record(record)
+        self._frame.append(text)
+        self._frame_size += len(text)
+        self._frame_records += 1
+        self.records += 1
+
+    def close(self) -> None:
+        self._frame.append(self._end if self.records else self._end.lstrip())
+        self._submit()
+        self._stop()
+        if self._error is not None:
+            raise self._error
+        index = {
+            "version": __version__,
+            "compression": self.compression,
+            "format": "jsonl" if self.line_delimited else "json",
+            "records": self.records,
+            "frames": self._frames,
+        }
+        with open(frame_index_path(self.outputpath), "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=4)
+
+    def _submit(self) -> None:
+        if self._error is not None:
+            self._stop()
+            raise self._error
+        self._queue.put((
+            "".join(self._frame),
+            self.records - self._frame_records,
+            self._frame_records,
+        ))
+        self._frame = []
+        self._frame_size = 0
+        self._frame_records = 0
+
+    def _stop(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+
+    def _compress_frames(self) -> None:
+        # Runs on the compression thread, zlib and zstd release the GIL
+        compress = _compressor(self.compression)
+        offset = 0
+        uncompressed_offset = 0
+        while (frame := self._queue.get()) is not None:
+            if self._error is not None:
+                continue
+            text, first_record, records = frame
+            try:
+                data = text.encode("utf-8")
+                compressed = compress(data)
+                self._file.write(compressed)
+            except Exception as e:
+                # Raised again on the writing thread
+                self._error = e
+                continue
+            self._frames.append({
+                "offset": offset,
+                "size": len(compressed),
+                "uncompressed_offset": uncompressed_offset,
+                "uncompressed_size": len(data),
+                "first_record": first_record,
+                "records": records,
+            })
+            offset += len(compressed)
+            uncompressed_offset += len(data)
+
+
+def frame_index_path(outputpath: Path) -> Path:
+    return outputpath.with_name(outputpath.name + FRAME_INDEX_SUFFIX)
+
+
+def read_compressed_record(outputpath: Path, number: int) -> dict[str, Any]:
+    """Read record ``number``, counted from 0, of a compressed output.
+
+    Only the frame holding the record is read and decompressed.
+    """
+    with open(frame_index_path(outputpath), encoding="utf-8") as f:
+        index = json.load(f)
+    frames = index["frames"]
+    position = bisect.bisect_right([frame["first_record"] for frame in frames], number)
+    frame = frames[position - 1] if position else None
+    if frame is None or number >= frame["first_record"] + frame["records"]:
+        raise IndexError(f"No record {number} in {outputpath}")
+    with open(outputpath, "rb") as f:
+        f.seek(frame["offset"])
+        text = _decompressor(index["compression"])(f.read(frame["size"])).decode(
+            "utf-8"
+        )
+    if index["format"] == "jsonl":
+        records = [json.loads(line) for line in text.split("\n") if line]
+    else:
+        # A frame holds whole records along with their separators, the first
+        # and last frame also the brackets of the array
+        text = text.removeprefix("[").removeprefix(",").rstrip()
+        records = json.loads("[" + text.removesuffix("]") + "]")
+    return records[number - frame["first_record"]]
+
+
+def _compressor(compression: str) -> Callable[[bytes], bytes]:
+    if compression == "zstd":
+        import zstandard
+
+        return zstandard.ZstdCompressor().compress
+    import gzip
 
+    return partial(gzip.compress, compresslevel=6, mtime=0)
 
-def parse_localstorage(filepath: Path) -> list[dict[str, Any]]:
-    local_store = ccl_chromium_localstorage.LocalStoreDb(filepath)
-    extracted_values = []
-    for record in local_store.iter_all_records():
+
+def _decompressor(compression: str) -> Callable[[bytes], bytes]:
+    if compression == "zstd":
+        import zstandard
+
+        return zstandard.ZstdDecompressor().decompress
+    import gzip
+
+    return gzip.decompress
+
+
+class SqliteSink(Sink):
+    """A SQLite database with one table per record_type.
+
+    Columns are added as new keys turn up. Nested values are stored as JSON
+    text. Rows are inserted in transactions of ``SINK_BATCH_SIZE`` rows.
+    """
+
+    def __init__(self, outputpath: Path) -> None:
+        import sqlite3
+
+        super().__init__(outputpath)
+        self.errors = (OSError, sqlite3.Error)
+        self._rows: dict[str, list[dict[str, Any]]] = {}
+        self._columns: dict[str, list[str]] = {}
+        self._buffered = 0
+
+    def open(self) -> None:
+        import sqlite3
+
+        # Replaces a database left over from an earlier run
+        self.outputpath.unlink(missing_ok=True)
+        self._connection = sqlite3.connect(self.outputpath)
+
+    def write(self, record: dict[str, Any]) -> None:
+        table = str(record.get("record_type") or "record")
+        self._rows.setdefault(table, []).append({
+            key: _sql_value(value) for key, value in record.items()
+        })
+        self.records += 1
+        self._buffered += 1
+        if self._buffered >= SINK_BATCH_SIZE:
+            self._flush()
+
+    def close(self) -> None:
         try:
-            extracted_values.append(json.loads(record.value, strict=False))
-        except json.decoder.JSONDecodeError:
-            continue
-    return extracted_values
+            self._flush()
+        finally:
+            self._connection.close()
 
+    def _flush(self) -> None:
+        with self._connection:
+            for table, rows in self._rows.items():
+                if not rows:
+                    continue
+                columns = self._columns.get(table)
+                keys = list(dict.fromkeys(key for row in rows for key in row))
+                if columns is None:
+                    columns = self._columns[table] = keys
+                    self._connection.execute(
+                        f"CREATE TABLE {_sql_name(table)} "
+                        f"({', '.join(_sql_name(c) for c in columns)})"
+                    )
+                for key in keys:
+                    if key not in columns:
+                        self._connection.execute(
+                            f"ALTER TABLE {_sql_name(table)} "
+                            f"ADD COLUMN {_sql_name(key)}"
+                        )
+                        columns.append(key)
+                self._connection.executemany(
+                    f"INSERT INTO {_sql_name(table)} "
+                    f"({', '.join(_sql_name(c) for c in columns)}) "
+                    f"VALUES ({', '.join('?' for _ in columns)})",
+                    ([row.get(c) for c in columns] for row in rows),
+                )
+                rows.clear()
+        self._buffered = 0
 
-def parse_sessionstorage(filepath: Path) -> list[dict[str, Any]]:
-    session_storage = ccl_chromium_sessionstorage.SessionStoreDb(filepath)
-    extracted_values = []
-    for host in session_storage:
-        print(host)
-        # Hosts can have multiple sessions associated with them
-        for session_store_values in session_storage.get_all_for_host(host).values():
-            for session_store_value in session_store_values:
-                # response is of type SessionStoreValue
-
-                # Make a nice dictionary out of it
-                entry = {
-                    "key": host,
-                    "value": session_store_value.value,
-                    "guid": session_store_value.guid,
-                    "leveldb_sequence_number": session_store_value.leveldb_sequence_number,
-                }
-                extracted_values.append(entry)
-    return extracted_values
 
+class ParquetSink(Sink):
+    """A folder with one Parquet file per record_type, needs pyarrow.
 
-def write_results_to_json(data: list[dict[str, Any]], outputpath: Path) -> None:
-    # Dump messages into a json file
-    try:
-        with open(outputpath, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=4, default=str, ensure_ascii=False)
-    except OSError as e:
-        print(e)
+    All columns are strings, nested values are stored as JSON text. The
+    columns of a file are those of the first ``SINK_BATCH_SIZE`` records of
+    its type, which all share the fields of their model, plus ``extra``:
+    keys of later records that are no column are stored there as a JSON
+    object. Every batch is written as a row group of its own.
+    """
+
+    def __init__(self, outputpath: Path) -> None:
+        import importlib.util
+
+        # Fail before parsing rather than once the records are written
+        if importlib.util.find_spec("pyarrow") is None:
+            raise ImportError(
+                "Parquet output needs pyarrow, install forensicsim[parquet]."
+            )
+        super().__init__(outputpath)
+        self._rows: dict[str, list[dict[str, Any]]] = {}
+        self._writers: dict[str, Any] = {}
+        self._columns: dict[str, set[str]] = {}
+        self._buffered = 0
+
+    def open(self) -> None:
+        self.outputpath.mkdir(parents=True, exist_ok=True)
+
+    def write(self, record: dict[str, Any]) -> None:
+        table = str(record.get("record_type") or "record")
+        self._rows.setdefault(table, []).append({
+            key: _text_value(value) for key, value in record.items()
+        })
+        self.records += 1
+        self._buffered += 1
+        if self._buffered >= SINK_BATCH_SIZE:
+            self._flush()
+
+    def close(self) -> None:
+        try:
+            self._flush()
+        finally:
+            for writer in self._writers.values():
+                writer.close()
+
+    def _flush(self) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        for table, rows in self._rows.items():
+            if not rows:
+                continue
+            writer = self._writers.get(table)
+            if writer is None:
+                names = list(dict.fromkeys(key for row in rows for key in row))
+                names += [] if "extra" in names else ["extra"]
+                self._columns[table] = set(names)
+                schema = pa.schema([(name, pa.string()) for name in names])
+                writer = self._writers[table] = pq.ParquetWriter(
+                    str(self.outputpath / f"{table}.parquet"), schema
+                )
+            columns = self._columns[table]
+            for row in rows:
+                extra = {key: row.pop(key) for key in list(row) if key not in columns}
+                if extra:
+                    row["extra"] = json.dumps(extra, ensure_ascii=False)
+            writer.write_table(pa.Table.from_pylist(rows, schema=writer.schema))
+            rows.clear()
+        self._buffered = 0
+
+
+def _sql_name(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _sql_value(value: Any) -> Any:
+    if value is None or isinstance(value, (str, int, float, bytes)):
+        return value
+    return _text_value(value)
+
+
+def _text_value(value: Any) -> Optional[str]:
+    # Scalars as text, RawJSON as is and anything nested as JSON
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, RawJSON):
+        return value.text
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str, ensure_ascii=False)
+    return json.dumps(value) if isinstance(value, (bool, int, float)) else str(value)
+
+
+def _format_record(record: dict[str, Any]) -> str:
+    # A record as json.dump(..., indent=4) lays it out within a list
+    record, raw = _split_raw(record)
+    return _embed_raw(
+        json.dumps(record, indent=4, default=str, ensure_ascii=False).replace(
+            "\n", "\n    "
+        ),
+        raw,
+    )
+
+
+def _format_line(record: dict[str, Any]) -> str:
+    record, raw = _split_raw(record)
+    return _embed_raw(json.dumps(record, default=str, ensure_ascii=False), raw) + "\n"
+
+
+# Stands in for RawJSON values while the rest of a record is serialized
+_RAW_PLACEHOLDER = "\x00forensicsim-raw-json\x00"
+
+
+def _split_raw(record: dict[str, Any]) -> tuple[dict[str, Any], list[str]]:
+    raw = [value.text for value in record.values() if isinstance(value, RawJSON)]
+    if not raw:
+        return record, raw
+    return {
+        key: _RAW_PLACEHOLDER if isinstance(value, RawJSON) else value
+        for key, value in record.items()
+    }, raw
+
+
+def _embed_raw(text: str, raw: list[str]) -> str:
+    # Values are embedded after indenting, so that their text stays unchanged
+    placeholder = json.dumps(_RAW_PLACEHOLDER)
+    for value in raw:
+        text = text.replace(placeholder, value, 1)
+    return text
@@ -0,0 +1,618 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import copy
+import importlib.util
+import io
+import json
+import math
+import multiprocessing
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+from pathlib import Path, PureWindowsPath
+from types import ModuleType
+from typing import IO, TYPE_CHECKING, Any, Callable, Optional
+
+from forensicsim import __version__
+from forensicsim.autopsy import (
+    AbstractFile,
+    Case,
+    IngestJobContext,
+    ProgressBar,
+    Recorder,
+    autopsy_modules,
+)
+from forensicsim.backend import (
+    SHARD_MANIFEST,
+    write_results_to_json,
+    write_results_to_shards,
+)
+from forensicsim.fixtures import write_indexeddb_fixture
+from forensicsim.parser import decode_dict, parse_records, process_db, strip_html_tags
+from forensicsim.stats import Stats, peak_rss
+from forensicsim.synthetic import generate_records
+
+if TYPE_CHECKING:
+    from forensicsim.archive import SourceFolder
+
+
+def run_benchmarks(
+    script: list[dict[str, Any]],
+    messages: int,
+    version: str = "v2",
+    seed: int = 0,
+) -> dict[str, Any]:
+    """Time the parser stages on a synthetic corpus of ``messages`` messages.
+
+    The corpus is generated up front, so generation never counts towards a
+    timing. ``dedup`` and ``sort`` are taken from the stage statistics of
+    the ``parse_records`` run.
+    """
+    records = list(generate_records(script, messages, version, seed=seed))
+    contents = [m["content"] for m in _iter_messages(records)]
+    # decode_dict expands the nested JSON strings in place, so work on copies
+    properties = [copy.deepcopy(m["properties"]) for m in _iter_messages(records)]
+
+    results = {
+        "strip_html_tags": _measure(
+            lambda: [strip_html_tags(c) for c in contents], len(contents)
+        ),
+        "decode_dict": _measure(
+            lambda: [decode_dict(p) for p in properties], len(properties)
+        ),
+    }
+
+    stats = Stats()
+    parsed: list[dict[str, Any]] = []
+    results["parse_records"] = _measure(
+        lambda: parsed.extend(parse_records(records, stats=stats)), len(contents)
+    )
+    for stage in ("dedup", "sort"):
+        results[stage] = _result(stats.stages[stage].wall_time, len(contents))
+
+    with tempfile.TemporaryDirectory(prefix="forensicsim-") as tmp:
+        results["write_results_to_json"] = _measure(
+            lambda: write_results_to_json(parsed, Path(tmp) / "teams.json"),
+            len(parsed),
+        )
+
+    return {
+        "messages": messages,
+        "teams_version": version,
+        "records": len(records),
+        "benchmarks": results,
+    }
+
+
+def run_end_to_end(
+    script: list[dict[str, Any]],
+    messages: int,
+    version: str = "v2",
+    seed: int = 0,
+    levels: int = 2,
+) -> dict[str, Any]:
+    """Time ``process_db`` on a synthetic IndexedDB LevelDB folder on disk.
+
+    The folder is written with :func:`write_indexeddb_fixture` before the
+    clock starts. Besides the total, the per-stage wall times of the run
+    are reported, so ``extraction`` covers ``parse_db``.
+    """
+    records = list(generate_records(script, messages, version, seed=seed))
+    with tempfile.TemporaryDirectory(prefix="forensicsim-") as tmp:
+        leveldb = Path(tmp) / "https_teams.microsoft.com_0.indexeddb.leveldb"
+        fixture = write_indexeddb_fixture(leveldb, records, levels=levels, seed=seed)
+        stats = Stats()
+        results = {
+            "process_db": _measure(
+                lambda: process_db(leveldb, Path(tmp) / "teams.json", stats=stats),
+                len(records),
+            )
+        }
+    for name, stage in stats.stages.items():
+        results[name] = _result(stage.wall_time, stage.records)
+
+    return {
+        "messages": messages,
+        "teams_version": version,
+        "records": len(records),
+        "fixture": {
+            "levels": levels,
+            "tables": len(fixture["tables"]),
+            "bytes": sum(t["size"] for t in fixture["tables"]),
+            "log_records": fixture["log_records"],
+            "deleted": fixture["deleted"],
+        },
+        "benchmarks": results,
+    }
+
+
+def run_prefetch(
+    script: list[dict[str, Any]],
+    messages: int,
+    version: str = "v2",
+    seed: int = 0,
+    levels: int = 2,
+    latency: float = 0.002,
+    windows: Iterable[int] = (0, 4, 16),
+) -> dict[str, Any]:
+    """Time ``process_db`` on a synthetic LevelDB folder on slow storage.
+
+    Reads are slowed down artificially: the first read of every block of
+    ``SLOW_BLOCK_SIZE`` bytes waits ``latency`` seconds, later reads of it
+    are served at once, like from the page cache in front of a network
+    share. Every prefetch window gets a cold cache, 0 runs without
+    prefetching.
+    """
+    records = list(generate_records(script, messages, version, seed=seed))
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="forensicsim-") as tmp:
+        leveldb = Path(tmp) / "https_teams.microsoft.com_0.indexeddb.leveldb"
+        fixture = write_indexeddb_fixture(leveldb, records, levels=levels, seed=seed)
+        for window in windows:
+            stats = Stats()
+            storage = _SlowStorage(latency)
+            folder = _slow_folder(leveldb, storage)
+            try:
+                result = _measure(
+                    partial(
+                        process_db,
+                        folder,
+                        Path(tmp) / "teams.json",
+                        stats=stats,
+                        prefetch=window,
+                    ),
+                    len(records),
+                )
+            finally:
+                folder.close()
+            result["extraction_seconds"] = round(
+                stats.stages["extraction"].wall_time, 6
+            )
+            result["slow_reads"] = storage.slow_reads
+            result["prefetched_bytes"] = stats.counters.get("prefetched_bytes", 0)
+            results[f"prefetch_{window}"] = result
+
+    return {
+        "messages": messages,
+        "teams_version": version,
+        "records": len(records),
+        "latency": latency,
+        "fixture": {
+            "levels": levels,
+            "tables": len(fixture["tables"]),
+            "bytes": sum(t["size"] for t in fixture["tables"]),
+        },
+        "benchmarks": results,
+    }
+
+
+# Granularity of the simulated cache of run_prefetch
+SLOW_BLOCK_SIZE = 64 * 1024
+
+
+class _SlowStorage:
+    # Blocks read so far, shared by every file opened during a run
+
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.slow_reads = 0
+        self._cached: set[tuple[str, int]] = set()
+
+    def fetch(self, name: str, start: int, end: int) -> None:
+        for block in range(start // SLOW_BLOCK_SIZE, (end - 1) // SLOW_BLOCK_SIZE + 1):
+            if (name, block) not in self._cached:
+                # Sleeping releases the GIL, so prefetching threads overlap
+                time.sleep(self.latency)
+                self.slow_reads += 1
+                self._cached.add((name, block))
+
+
+class _SlowFile(io.RawIOBase):
+    def __init__(self, f: IO[bytes], storage: _SlowStorage, name: str) -> None:
+        self._f = f
+        self._storage = storage
+        self._name = name
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._f.tell()
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._f.seek(offset, whence)
+
+    def readinto(self, buffer: Any) -> int:
+        position = self._f.tell()
+        data = self._f.read(len(buffer))
+        if data:
+            self._storage.fetch(self._name, position, position + len(data))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def close(self) -> None:
+        self._f.close()
+        super().close()
+
+
+def _slow_folder(path: Path, storage: _SlowStorage) -> "SourceFolder":
+    # A LevelDB folder on disk, every file of which is read through a
+    # _SlowFile. forensicsim.archive is left out of the start of the CLI.
+    from forensicsim.archive import DiskFolder
+
+    class SlowFolder(DiskFolder):
+        def open_raw(self, name: str) -> IO[bytes]:
+            return io.BufferedReader(
+                _SlowFile(super().open_raw(name), storage, str(self / name))
+            )
+
+    return SlowFolder(path)
+
+
+def run_ingest(
+    records: list[dict[str, Any]],
+    module_path: Path,
+    latency: Optional[dict[str, float]] = None,
+) -> dict[str, Any]:
+    """Time the Autopsy ingest module on parsed records under CPython.
+
+    ``records`` are the objects of a ``teams.json`` file. They are written as
+    shards like the parser server does, before the clock starts. The module
+    at ``module_path`` then turns them into artifacts against the stand-ins
+    of :mod:`forensicsim.autopsy`, which add ``latency`` seconds per call.
+    With a latency, ``ingest_module`` is the time spent outside of it, the
+    overhead of the module itself.
+    """
+    recorder = Recorder(latency)
+    with tempfile.TemporaryDirectory(prefix="forensicsim-") as tmp:
+        shards = Path(tmp) / "teams"
+        write_results_to_shards(records, shards, line_delimited=True)
+        manifest = json.loads((shards / SHARD_MANIFEST).read_text(encoding="utf-8"))
+
+        data_source = AbstractFile(recorder, "image", "/", is_dir=True)
+        parent_path = "/Users/forensicsim/AppData/Roaming/Microsoft/Teams/IndexedDB/"
+        content = AbstractFile(
+            recorder,
+            "https_teams.microsoft.com_0.indexeddb.leveldb",
+            parent_path,
+            is_dir=True,
+            data_source=data_source,
+        )
+        origin_files = {s["origin_file"] for s in manifest["shards"]} - {None}
+        files = [content] + [
+            AbstractFile(
+                recorder,
+                PureWindowsPath(origin_file).name,
+                f"{parent_path}{content.getName()}/",
+                data_source=data_source,
+            )
+            for origin_file in sorted(origin_files)
+        ]
+        # startUp expects the parser executable next to the module
+        (Path(tmp) / "ms_teams_parser.exe").touch()
+
+        with autopsy_modules(Case(recorder, files, tmp)):
+            module = _load_ingest_module(module_path)
+            module.__file__ = str(Path(tmp) / module_path.name)
+            ingest = module.ForensicIMIngestModule(None)
+            ingest.startUp(IngestJobContext())
+            ingest.level_db_files = ingest._list_level_db_files(
+                Case.getCurrentCase().getServices().getFileManager(), data_source
+            )
+            api_seconds = recorder.api_seconds
+            start = time.perf_counter()
+            ingest._process_shards(manifest, str(shards), content, ProgressBar())
+            seconds = time.perf_counter() - start
+            module_seconds = seconds - (recorder.api_seconds - api_seconds)
+
+    benchmarks = {"ingest": _result(seconds, recorder.artifacts)}
+    # Without a latency both would be the same
+    if any(recorder.latency.values()):
+        benchmarks["ingest_module"] = _result(module_seconds, recorder.artifacts)
+    return {
+        "records": len(records),
+        "artifacts": recorder.artifacts,
+        "posted": recorder.posted,
+        "latency": recorder.latency,
+        "benchmarks": benchmarks,
+        "calls": recorder.to_dict(),
+    }
+
+
+def _load_ingest_module(module_path: Path) -> ModuleType:
+    # The Jython module is not a package member, so load it from its file
+    spec = importlib.util.spec_from_file_location(module_path.stem, module_path)
+    if spec is None or spec.loader is None:
+        raise ImportError(f"Can not load ingest module {module_path}")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _isolated_run(
+    script: list[dict[str, Any]],
+    messages: int,
+    version: str,
+    seed: int,
+    end_to_end: bool,
+) -> dict[str, Any]:
+    # Runs in a fresh worker process, so peak_rss belongs to this run alone
+    if end_to_end:
+        run = run_end_to_end(script, messages, version, seed)
+    else:
+        run = run_benchmarks(script, messages, version, seed)
+    run["peak_rss"] = peak_rss()
+    return run
+
+
+def repeat_benchmarks(
+    script: list[dict[str, Any]],
+    messages: int,
+    version: str = "v2",
+    seed: int = 0,
+    repeat: int = 5,
+    end_to_end: bool = True,
+) -> dict[str, Any]:
+    """Run the benchmarks ``repeat`` times and summarize every measurement.
+
+    Each repetition runs in its own process. The stage benchmarks are keyed
+    by name, the ``process_db`` run and its stages by ``end_to_end/<name>``.
+    Throughput and peak RSS are summarized as median and a distribution
+    free confidence interval of the median.
+    """
+    modes = [("stages", False)] + ([("end_to_end", True)] if end_to_end else [])
+    throughput: dict[str, list[float]] = {}
+    memory: dict[str, list[float]] = {}
+    context = multiprocessing.get_context("spawn")
+    for _ in range(repeat):
+        for mode, e2e in modes:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                run = pool.submit(
+                    _isolated_run, script, messages, version, seed, e2e
+                ).result()
+            for name, result in run["benchmarks"].items():
+                if result["items_per_second"] is None:
+                    continue
+                key = name if mode == "stages" else f"end_to_end/{name}"
+                throughput.setdefault(key, []).append(result["items_per_second"])
+            memory.setdefault(mode, []).append(run["peak_rss"])
+
+    return {
+        **_environment(),
+        "messages": messages,
+        "teams_version": version,
+        "seed": seed,
+        "repeat": repeat,
+        "benchmarks": {name: summarize(values) for name, values in throughput.items()},
+        "peak_rss": {mode: summarize(values) for mode, values in memory.items()},
+    }
+
+
+def summarize(values: list[float], confidence: float = 0.95) -> dict[str, Any]:
+    low, high = median_ci(values, confidence)
+    return {
+        "median": statistics.median(values),
+        "ci_low": low,
+        "ci_high": high,
+        "samples": values,
+    }
+
+
+def median_ci(values: list[float], confidence: float = 0.95) -> tuple[float, float]:
+    """Confidence interval of the median from the order statistics.
+
+    The number of samples below the median follows Binomial(n, 0.5), which
+    makes the interval free of any assumption about the distribution. With
+    too few samples for the requested confidence the full range is returned.
+    """
+    ordered = sorted(values)
+    n = len(ordered)
+    # [x(k), x(n - 1 - k)] misses the median with probability 2 * P(B <= k)
+    lower = 0
+    below = 0
+    for k in range(n // 2):
+        below += math.comb(n, k)
+        if 1 - 2 * below / 2**n < confidence:
+            break
+        lower = k
+    return ordered[lower], ordered[n - 1 - lower]
+
+
+def compare_reports(
+    baseline: dict[str, Any],
+    current: dict[str, Any],
+    max_throughput_drop: float = 0.1,
+    max_memory_growth: float = 0.1,
+) -> list[dict[str, Any]]:
+    """Diff the medians of two :func:`repeat_benchmarks` reports.
+
+    A benchmark regresses when its median throughput drops by more than
+    ``max_throughput_drop``, a mode when its median peak RSS grows by more
+    than ``max_memory_growth``, both given as fractions of the baseline.
+    Measurements missing from either report are skipped.
+    """
+    rows = []
+    for metric, section, limit, sign in (
+        ("items_per_second", "benchmarks", max_throughput_drop, -1),
+        ("peak_rss", "peak_rss", max_memory_growth, 1),
+    ):
+        for name, result in current[section].items():
+            if name not in baseline[section]:
+                continue
+            before = baseline[section][name]
+            change = (
+                result["median"] / before["median"] - 1 if before["median"] else 0.0
+            )
+            rows.append({
+                "name": name,
+                "metric": metric,
+                "baseline": before["median"],
+                "current": result["median"],
+                "ci_low": result["ci_low"],
+                "ci_high": result["ci_high"],
+                "change": round(change, 4),
+                "regression": sign * change > limit,
+            })
+    return rows
+
+
+# Modules that have to stay out of a plain start, they are only needed once
+# records are parsed
+LAZY_MODULES = (
+    "bs4",
+    "ccl_chromium_reader",
+    "dataclasses_json",
+    "forensicsim.models",
+    "marshmallow",
+)
+
+
+def startup_commands(tools: Path) -> dict[str, list[str]]:
+    return {
+        "forensicsim --help": ["-m", "forensicsim.cli", "--help"],
+        **{
+            f"{script} --help": [str(tools / script), "--help"]
+            for script in (
+                "main.py",
+                "dump_leveldb.py",
+                "dump_localstorage.py",
+                "dump_sessionstorage.py",
+            )
+        },
+    }
+
+
+def measure_startup(args: list[str], repeat: int = 5, top: int = 10) -> dict[str, Any]:
+    """Start ``python -X importtime <args>`` ``repeat`` times.
+
+    Reports the median wall time of the whole process, the median total
+    import time, the slowest top level imports of the last run and any
+    module of :data:`LAZY_MODULES` that was imported.
+    """
+    wall_times = []
+    import_times = []
+    imports: list[tuple[int, str, int]] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", *args],
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+        wall_times.append(time.perf_counter() - start)
+        if completed.returncode != 0:
+            raise RuntimeError(
+                f"{' '.join(args)} exited with {completed.returncode}: "
+                f"{completed.stderr[-500:]}"
+            )
+        imports = parse_importtime(completed.stderr)
+        # Nested imports are included in the cumulative time of their parents
+        import_times.append(sum(c for depth, _, c in imports if depth == 0) / 1e6)
+
+    top_level = sorted(
+        ((c, name) for depth, name, c in imports if depth == 0), reverse=True
+    )
+    return {
+        "wall_time": round(statistics.median(wall_times), 6),
+        "import_time": round(statistics.median(import_times), 6),
+        "slowest_imports": {name: c for c, name in top_level[:top]},
+        "lazy_modules_imported": sorted(
+            name
+            for _, name, _ in imports
+            if any(name == m or name.startswith(m + ".") for m in LAZY_MODULES)
+        ),
+    }
+
+
+def parse_importtime(output: str) -> list[tuple[int, str, int]]:
+    # Nesting depth, module name and cumulative microseconds per import
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        stripped = name.lstrip(" ")
+        depth = (len(name) - len(stripped) - 1) // 2
+        imports.append((depth, stripped.rstrip(), int(cumulative)))
+    return imports
+
+
+def startup_report(results: dict[str, Any], budget: float) -> dict[str, Any]:
+    return {**_environment(), "budget": budget, "startup": results}
+
+
+def benchmark_report(runs: list[dict[str, Any]]) -> dict[str, Any]:
+    return {**_environment(), "peak_rss": peak_rss(), "runs": runs}
+
+
+def _environment() -> dict[str, Any]:
+    return {
+        "version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def write_benchmark_report(report: dict[str, Any], outputpath: Path) -> None:
+    try:
+        with open(outputpath, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+    except OSError as e:
+        print(e)
+
+
+def _iter_messages(records: list[dict[str, Any]]) -> Iterator[dict[str, Any]]:
+    for r in records:
+        if r["store"] == "replychains":
+            value = r["value"]
+            yield from value.get("messages", value.get("messageMap", {})).values()
+
+
+def _measure(fn: Callable[[], Any], items: int) -> dict[str, Any]:
+    start = time.perf_counter()
+    fn()
+    return _result(time.perf_counter() - start, items)
+
+
+def _result(seconds: float, items: int) -> dict[str, Any]:
+    return {
+        "seconds": round(seconds, 6),
+        "items": items,
+        "items_per_second": round(items / seconds, 2) if seconds else None,
+    }
@@ -0,0 +1,659 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+from pathlib import Path
+from typing import Optional, TextIO
+
+import click
+
+from forensicsim.benchmark import (
+    benchmark_report,
+    compare_reports,
+    measure_startup,
+    repeat_benchmarks,
+    run_benchmarks,
+    run_end_to_end,
+    run_ingest,
+    run_prefetch,
+    startup_commands,
+    startup_report,
+    write_benchmark_report,
+)
+from forensicsim.consts import UTIL_HEADER
+from forensicsim.discovery import (
+    DISCOVERY_MANIFEST,
+    discover,
+    process_locations,
+)
+from forensicsim.fixtures import write_indexeddb_fixture
+from forensicsim.leveldb import live_files
+from forensicsim.parser import parse_records
+from forensicsim.synthetic import generate_records, load_population
+
+
+@click.group()
+def cli() -> None:
+    """Forensics.im utilities."""
+
+
+@cli.group()
+def bench() -> None:
+    """Benchmarks on synthetic Microsoft Teams data."""
+
+
+@bench.command("run")
+@click.option(
+    "-p",
+    "--population",
+    type=click.Path(exists=True, file_okay=False, path_type=Path),
+    default=Path("populationdata"),
+    show_default=True,
+    help="Folder with the batch<n>.json population scripts.",
+)
+@click.option(
+    "-n",
+    "--messages",
+    type=click.IntRange(min=1),
+    multiple=True,
+    default=(10_000,),
+    show_default=True,
+    help="Number of synthetic messages. Repeat for a scaling series.",
+)
+@click.option(
+    "--teams-version",
+    type=click.Choice(["v1", "v2"]),
+    multiple=True,
+    default=("v1", "v2"),
+    show_default=True,
+    help="Reply chain layout to generate. Repeat for both.",
+)
+@click.option("--seed", type=int, default=0, show_default=True, help="Generator seed.")
+@click.option(
+    "--end-to-end",
+    is_flag=True,
+    help="Run process_db on a synthetic LevelDB folder instead of the single stages.",
+)
+@click.option(
+    "-o",
+    "--outputpath",
+    type=click.Path(writable=True, path_type=Path),
+    required=True,
+    help="File path to the JSON benchmark results.",
+)
+def run_cmd(
+    population: Path,
+    messages: tuple[int, ...],
+    teams_version: tuple[str, ...],
+    seed: int,
+    end_to_end: bool,
+    outputpath: Path,
+) -> None:
+    """Time the parser on synthetic Teams data of several sizes."""
+    click.echo(UTIL_HEADER)
+    script = load_population(population)
+    runs = []
+    for version in teams_version:
+        for n in messages:
+            if end_to_end:
+                run = run_end_to_end(script, n, version, seed)
+            else:
+                run = run_benchmarks(script, n, version, seed)
+            for name, result in run["benchmarks"].items():
+                click.echo(
+                    f"{version} {n:>10} {name:<22} {result['seconds']:>10.3f}s "
+                    f"{result['items_per_second'] or 0:>14.0f}/s"
+                )
+            runs.append(run)
+    write_benchmark_report(benchmark_report(runs), outputpath)
+
+
+@bench.command("compare")
+@click.option(
+    "-p",
+    "--population",
+    type=click.Path(exists=True, file_okay=False, path_type=Path),
+    default=Path("populationdata"),
+    show_default=True,
+    help="Folder with the batch<n>.json population scripts.",
+)
+@click.option(
+    "-n",
+    "--messages",
+    type=click.IntRange(min=1),
+    default=10_000,
+    show_default=True,
+    help="Number of synthetic messages.",
+)
+@click.option(
+    "--teams-version",
+    type=click.Choice(["v1", "v2"]),
+    default="v2",
+    show_default=True,
+    help="Reply chain layout to generate.",
+)
+@click.option("--seed", type=int, default=0, show_default=True, help="Generator seed.")
+@click.option(
+    "-r",
+    "--repeat",
+    type=click.IntRange(min=1),
+    default=5,
+    show_default=True,
+    help="Number of repetitions, each in a fresh process.",
+)
+@click.option(
+    "--end-to-end/--no-end-to-end",
+    default=True,
+    show_default=True,
+    help="Also run process_db on a synthetic LevelDB folder, covering parse_db.",
+)
+@click.option(
+    "-b",
+    "--baseline",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="Results of an earlier compare run to diff against.",
+)
+@click.option(
+    "--max-throughput-drop",
+    type=click.FloatRange(min=0),
+    default=10.0,
+    show_default=True,
+    help="Largest tolerated drop of the median throughput in percent.",
+)
+@click.option(
+    "--max-memory-growth",
+    type=click.FloatRange(min=0),
+    default=10.0,
+    show_default=True,
+    help="Largest tolerated growth of the median peak RSS in percent.",
+)
+@click.option(
+    "-o",
+    "--outputpath",
+    type=click.Path(writable=True, path_type=Path),
+    help="File path to the JSON results, usable as a later baseline.",
+)
+@click.pass_context
+def compare_cmd(
+    ctx: click.Context,
+    population: Path,
+    messages: int,
+    teams_version: str,
+    seed: int,
+    repeat: int,
+    end_to_end: bool,
+    baseline: Optional[Path],
+    max_throughput_drop: float,
+    max_memory_growth: float,
+    outputpath: Optional[Path],
+) -> None:
+    """Repeat the benchmarks and flag regressions against a baseline."""
+    click.echo(UTIL_HEADER)
+    report = repeat_benchmarks(
+        load_population(population),
+        messages,
+        teams_version,
+        seed,
+        repeat,
+        end_to_end,
+    )
+    if baseline is not None:
+        with open(baseline, encoding="utf-8") as f:
+            previous = json.load(f)
+        for key in ("messages", "teams_version", "seed"):
+            if previous.get(key) != report[key]:
+                raise click.UsageError(
+                    f"Baseline was measured with {key}={previous.get(key)!r}, "
+                    f"not {report[key]!r}."
+                )
+    if outputpath is not None:
+        write_benchmark_report(report, outputpath)
+
+    if baseline is None:
+        for name, result in report["benchmarks"].items():
+            click.echo(
+                f"{name:<32} {result['median']:>14.0f}/s "
+                f"[{result['ci_low']:.0f}, {result['ci_high']:.0f}]"
+            )
+        return
+
+    rows = compare_reports(
+        previous, report, max_throughput_drop / 100, max_memory_growth / 100
+    )
+    for row in rows:
+        click.echo(
+            f"{row['name']:<32} {row['metric']:<17} {row['baseline']:>14.0f} "
+            f"{row['current']:>14.0f} {row['change']:>+8.1%}"
+            + ("  REGRESSION" if row["regression"] else "")
+        )
+    if any(row["regression"] for row in rows):
+        ctx.exit(1)
+
+
+@bench.command("startup")
+@click.option(
+    "--tools",
+    type=click.Path(exists=True, file_okay=False, path_type=Path),
+    default=Path("tools"),
+    show_default=True,
+    help="Folder with main.py and the dump tools.",
+)
+@click.option(
+    "-r",
+    "--repeat",
+    type=click.IntRange(min=1),
+    default=5,
+    show_default=True,
+    help="Number of starts per command.",
+)
+@click.option(
+    "--budget",
+    type=click.FloatRange(min=0),
+    default=150.0,
+    show_default=True,
+    help="Largest tolerated median import time per command in milliseconds.",
+)
+@click.option(
+    "-o",
+    "--outputpath",
+    type=click.Path(writable=True, path_type=Path),
+    help="File path to the JSON results.",
+)
+@click.pass_context
+def startup_cmd(
+    ctx: click.Context,
+    tools: Path,
+    repeat: int,
+    budget: float,
+    outputpath: Optional[Path],
+) -> None:
+    """Measure the import time of --help with python -X importtime."""
+    click.echo(UTIL_HEADER)
+    results = {}
+    failed = False
+    for name, args in startup_commands(tools).items():
+        result = measure_startup(args, repeat)
+        results[name] = result
+        over_budget = result["import_time"] * 1000 > budget
+        click.echo(
+            f"{name:<32} {result['import_time'] * 1000:>8.1f} ms imports "
+            f"{result['wall_time'] * 1000:>8.1f} ms total"
+            + ("  OVER BUDGET" if over_budget else "")
+        )
+        if result["lazy_modules_imported"]:
+            click.echo(f"{'':<32} imports {', '.join(result['lazy_modules_imported'])}")
+        failed = failed or over_budget or bool(result["lazy_modules_imported"])
+    if outputpath is not None:
+        write_benchmark_report(startup_report(results, budget), outputpath)
+    if failed:
+        ctx.exit(1)
+
+
+@bench.command("ingest")
+@click.option(
+    "-i",
+    "--inputpath",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="teams.json file to ingest. Defaults to synthetic records.",
+)
+@click.option(
+    "-p",
+    "--population",
+    type=click.Path(exists=True, file_okay=False, path_type=Path),
+    default=Path("populationdata"),
+    show_default=True,
+    help="Folder with the batch<n>.json population scripts.",
+)
+@click.option(
+    "-n",
+    "--messages",
+    type=click.IntRange(min=1),
+    default=10_000,
+    show_default=True,
+    help="Number of synthetic messages.",
+)
+@click.option(
+    "--teams-version",
+    type=click.Choice(["v1", "v2"]),
+    default="v2",
+    show_default=True,
+    help="Reply chain layout to generate.",
+)
+@click.option("--seed", type=int, default=0, show_default=True, help="Generator seed.")
+@click.option(
+    "-m",
+    "--module",
+    "module_path",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    default=Path("tools/Forensicsim_Parser.py"),
+    show_default=True,
+    help="Autopsy ingest module to run.",
+)
+@click.option(
+    "--latency",
+    multiple=True,
+    metavar="CALL=SECONDS",
+    help="Delay every call, e.g. Blackboard.postArtifacts=0.01. Repeatable.",
+)
+@click.option(
+    "-o",
+    "--outputpath",
+    type=click.Path(writable=True, path_type=Path),
+    required=True,
+    help="File path to the JSON benchmark results.",
+)
+def ingest_cmd(
+    inputpath: Optional[Path],
+    population: Path,
+    messages: int,
+    teams_version: str,
+    seed: int,
+    module_path: Path,
+    latency: tuple[str, ...],
+    outputpath: Path,
+) -> None:
+    """Run the Autopsy ingest module against stand-ins of the Autopsy API."""
+    click.echo(UTIL_HEADER)
+    delays = {}
+    for value in latency:
+        call, _, seconds = value.partition("=")
+        try:
+            delays[call] = float(seconds)
+        except ValueError as e:
+            raise click.BadParameter(f"Expected CALL=SECONDS: {value}") from e
+    if inputpath is not None:
+        with open(inputpath, encoding="utf-8") as f:
+            records = json.load(f)
+    else:
+        records = list(
+            parse_records(
+                generate_records(
+                    load_population(population), messages, teams_version, seed=seed
+                )
+            )
+        )
+    run = run_ingest(records, module_path, delays)
+    for name, result in run["benchmarks"].items():
+        click.echo(
+            f"{name:<14} {result['items']:>10} artifacts {result['seconds']:>10.3f}s "
+            f"{result['items_per_second'] or 0:>14.0f}/s"
+        )
+    write_benchmark_report(benchmark_report([run]), outputpath)
+
+
+@bench.command("prefetch")
+@click.option(
+    "-p",
+    "--population",
+    type=click.Path(exists=True, file_okay=False, path_type=Path),
+    default=Path("populationdata"),
+    show_default=True,
+    help="Folder with the batch<n>.json population scripts.",
+)
+@click.option(
+    "-n",
+    "--messages",
+    type=click.IntRange(min=1),
+    default=10_000,
+    show_default=True,
+    help="Number of synthetic messages.",
+)
+@click.option(
+    "--teams-version",
+    type=click.Choice(["v1", "v2"]),
+    default="v2",
+    show_default=True,
+    help="Reply chain layout to generate.",
+)
+@click.option("--seed", type=int, default=0, show_default=True, help="Generator seed.")
+@click.option(
+    "--levels",
+    type=click.IntRange(min=1),
+    default=2,
+    show_default=True,
+    help="Number of table levels in the synthetic LevelDB folder.",
+)
+@click.option(
+    "--latency",
+    type=click.FloatRange(min=0),
+    default=0.002,
+    show_default=True,
+    help="Seconds the first read of every 64 KiB block of a file waits.",
+)
+@click.option(
+    "-w",
+    "--window",
+    "windows",
+    type=click.IntRange(min=0),
+    multiple=True,
+    default=(0, 4, 16),
+    show_default=True,
+    help="Number of files read ahead, 0 for none. Repeat for a series.",
+)
+@click.option(
+    "-o",
+    "--outputpath",
+    type=click.Path(writable=True, path_type=Path),
+    required=True,
+    help="File path to the JSON benchmark results.",
+)
+def prefetch_cmd(
+    population: Path,
+    messages: int,
+    teams_version: str,
+    seed: int,
+    levels: int,
+    latency: float,
+    windows: tuple[int, ...],
+    outputpath: Path,
+) -> None:
+    """Time process_db with read-ahead prefetching on artificially slow storage."""
+    click.echo(UTIL_HEADER)
+    run = run_prefetch(
+        load_population(population),
+        messages,
+        teams_version,
+        seed,
+        levels,
+        latency,
+        windows,
+    )
+    for name, result in run["benchmarks"].items():
+        click.echo(
+            f"{name:<12} {result['seconds']:>10.3f}s "
+            f"{result['items_per_second'] or 0:>14.0f}/s "
+            f"{result['slow_reads']:>8} slow reads"
+        )
+    write_benchmark_report(benchmark_report([run]), outputpath)
+
+
+@cli.command("fixture")
+@click.option(
+    "-p",
+    "--population",
+    type=click.Path(exists=True, file_okay=False, path_type=Path),
+    default=Path("populationdata"),
+    show_default=True,
+    help="Folder with the batch<n>.json population scripts.",
+)
+@click.option(
+    "-n",
+    "--messages",
+    type=click.IntRange(min=1),
+    default=10_000,
+    show_default=True,
+    help="Number of synthetic messages.",
+)
+@click.option(
+    "--teams-version",
+    type=click.Choice(["v1", "v2"]),
+    default="v2",
+    show_default=True,
+    help="Reply chain layout to generate.",
+)
+@click.option(
+    "--levels",
+    type=click.IntRange(min=1, max=7),
+    default=2,
+    show_default=True,
+    help="Number of LevelDB levels to spread the .ldb tables over.",
+)
+@click.option(
+    "--log-share",
+    type=click.FloatRange(min=0, max=1),
+    default=0.1,
+    show_default=True,
+    help="Share of the records left in the uncompacted .log file.",
+)
+@click.option(
+    "--deleted-share",
+    type=click.FloatRange(min=0, max=1),
+    default=0.01,
+    show_default=True,
+    help="Share of the records deleted again at the end of the .log file.",
+)
+@click.option("--seed", type=int, default=0, show_default=True, help="Generator seed.")
+@click.option(
+    "-o",
+    "--outputpath",
+    type=click.Path(file_okay=False, writable=True, path_type=Path),
+    required=True,
+    help="IndexedDB folder to write, e.g. https_teams.microsoft.com_0.indexeddb.leveldb.",
+)
+def fixture_cmd(
+    population: Path,
+    messages: int,
+    teams_version: str,
+    levels: int,
+    log_share: float,
+    deleted_share: float,
+    seed: int,
+    outputpath: Path,
+) -> None:
+    """Write a synthetic Teams IndexedDB LevelDB folder."""
+    click.echo(UTIL_HEADER)
+    if outputpath.exists() and any(outputpath.iterdir()):
+        raise click.UsageError(f"Output folder is not empty: {outputpath}")
+    records = generate_records(
+        load_population(population), messages, teams_version, seed=seed
+    )
+    summary = write_indexeddb_fixture(
+        outputpath,
+        records,
+        levels=levels,
+        log_share=log_share,
+        deleted_share=deleted_share,
+        seed=seed,
+    )
+    click.echo(
+        f"{summary['records']} records in {len(summary['tables'])} tables and "
+        f"{summary['log']} ({summary['log_records']} records, "
+        f"{summary['deleted']} deletions)"
+    )
+
+
+@cli.command("files")
+@click.option(
+    "-f",
+    "--filepath",
+    type=click.Path(exists=True, file_okay=False, path_type=Path),
+    required=True,
+    help="LevelDB folder with at least CURRENT and the MANIFEST.",
+)
+@click.option(
+    "-l",
+    "--listing",
+    type=click.File("r", encoding="utf-8"),
+    help="File names of the original folder, one per line. Defaults to the content of the folder.",
+)
+@click.option(
+    "--json",
+    "as_json",
+    is_flag=True,
+    default=False,
+    help="Print the whole result, including obsolete and missing files, as JSON.",
+)
+def files_cmd(filepath: Path, listing: Optional[TextIO], as_json: bool) -> None:
+    """List the files the current version of a LevelDB folder consists of.
+
+    Blobs of an IndexedDB are out of scope: the MANIFEST does not list them,
+    copy the sibling .blob folder as a whole.
+    """
+    names = [line.strip() for line in listing if line.strip()] if listing else None
+    try:
+        result = live_files(filepath, names)
+    except (OSError, ValueError) as e:
+        raise click.ClickException(str(e)) from e
+    if as_json:
+        click.echo(json.dumps(result, indent=4))
+    else:
+        for name in result["files"]:
+            click.echo(name)
+
+
+@cli.command("discover")
+@click.option(
+    "-r",
+    "--root",
+    type=click.Path(exists=True, file_okay=False, path_type=Path),
+    required=True,
+    help="Root of the mounted evidence, e.g. the drive of an image.",
+)
+@click.option(
+    "-w",
+    "--workers",
+    type=click.IntRange(min=1),
+    default=8,
+    show_default=True,
+    help="Number of threads listing folders in parallel.",
+)
+@click.option(
+    "-o",
+    "--outputpath",
+    type=click.Path(file_okay=False, writable=True, path_type=Path),
+    help="Parse every location into this folder. Without it, the locations are only listed.",
+)
+def discover_cmd(root: Path, workers: int, outputpath: Optional[Path]) -> None:
+    """Find the IndexedDB, Local and Session Storage of classic and new Teams."""
+    if outputpath is None:
+        click.echo(
+            json.dumps(
+                [location.to_dict() for location in discover(root, workers)], indent=4
+            )
+        )
+        return
+    click.echo(UTIL_HEADER)
+    # Sorted, so the numbered output files are the same on every run
+    results = process_locations(discover(root, workers), outputpath)
+    for result in results:
+        click.echo(
+            f"{result['kind']:<16} {result['path']} -> {result['output'] or result['error']}"
+        )
+    click.echo(
+        f"{len(results)} locations, manifest in {outputpath / DISCOVERY_MANIFEST}"
+    )
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,283 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import os
+import re
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from operator import attrgetter
+from pathlib import Path, PurePath
+from typing import Any, Optional
+
+from forensicsim import __version__
+from forensicsim.backend import (
+    parse_localstorage,
+    parse_sessionstorage,
+    write_results_to_json,
+)
+from forensicsim.parser import process_db
+
+# IndexedDB folders of the Teams web app, e.g. https_teams.microsoft.com_0
+# for business and https_teams.live.com_0 for personal accounts
+TEAMS_INDEXEDDB = re.compile(
+    r"^https_teams\.[a-z0-9.-]+_\d+\.indexeddb\.leveldb$", re.IGNORECASE
+)
+
+# Folder names that never hold Teams data on a Windows or macOS image. They
+# are compared in lower case and not descended into.
+PRUNED_DIRECTORIES = frozenset({
+    "$recycle.bin",
+    "$windows.~bt",
+    "$windows.~ws",
+    "blob_storage",
+    "cache",
+    "code cache",
+    "crashpad",
+    "dawncache",
+    "gpucache",
+    "msocache",
+    "node_modules",
+    "program files",
+    "program files (x86)",
+    "recovery",
+    "service worker",
+    "system volume information",
+    "windows",
+    "winsxs",
+})
+
+DISCOVERY_MANIFEST = "discovery.json"
+
+# Device and inode number of a folder
+_FolderKey = tuple[int, int]
+# Reparse tag of junctions, stat.IO_REPARSE_TAG_MOUNT_POINT
+_IO_REPARSE_TAG_MOUNT_POINT = 0xA0000003
+
+
+@dataclass(frozen=True)
+class Location:
+    # kind is indexeddb, local_storage or session_storage. profile is the
+    # classic Teams folder or the WebView2 profile of new Teams it belongs to.
+    kind: str
+    path: Path
+    variant: str
+    profile: Path
+    blobpath: Optional[Path] = None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "path": str(self.path),
+            "variant": self.variant,
+            "profile": str(self.profile),
+            "blobpath": str(self.blobpath) if self.blobpath else None,
+        }
+
+
+def teams_variant(directory: str) -> Optional[str]:
+    """Tell whether a folder is a Teams profile holding the web storage.
+
+    Classic Teams keeps it in ``Microsoft/Teams``, new Teams in the WebView2
+    profiles below ``MSTeams/EBWebView``, e.g. ``WV2Profile_tfw``.
+    """
+    parts = [part.lower() for part in PurePath(directory).parts]
+    if parts[-2:] == ["microsoft", "teams"]:
+        return "classic"
+    if len(parts) >= 2 and parts[-2] == "ebwebview" and "msteams" in parts:
+        return "new"
+    return None
+
+
+def iter_locations(
+    root: Path,
+    workers: int = 8,
+    prune: frozenset[str] = PRUNED_DIRECTORIES,
+) -> Iterator[Location]:
+    """Walk ``root`` with ``workers`` threads and yield Teams storage folders.
+
+    Every thread lists one folder with :func:`os.scandir` at a time, so
+    slow network shares and mounted images are read in parallel. Folders
+    named in ``prune``, symbolic links and junctions are skipped, storage
+    folders are not descended into. A folder reached twice, like through a
+    bind mount, is only walked once. Locations are yielded as soon as they
+    are found.
+    """
+    seen = {_folder_key(os.fspath(root))}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending: set[Future[tuple[list[tuple[str, _FolderKey]], list[Location]]]] = {
+            pool.submit(_scan, os.fspath(root), prune)
+        }
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                subdirectories, locations = future.result()
+                for directory, key in subdirectories:
+                    if key not in seen:
+                        seen.add(key)
+                        pending.add(pool.submit(_scan, directory, prune))
+                yield from locations
+
+
+def discover(
+    root: Path,
+    workers: int = 8,
+    prune: frozenset[str] = PRUNED_DIRECTORIES,
+) -> list[Location]:
+    # The order threads finish in varies, so sort for a stable result
+    return sorted(iter_locations(root, workers, prune), key=attrgetter("path"))
+
+
+def _scan(
+    directory: str, prune: frozenset[str]
+) -> tuple[list[tuple[str, _FolderKey]], list[Location]]:
+    subdirectories: list[tuple[str, _FolderKey]] = []
+    locations: list[Location] = []
+    try:
+        with os.scandir(directory) as entries:
+            folders = [e for e in entries if _is_folder(e)]
+    except OSError as e:
+        print(e)
+        return subdirectories, locations
+
+    variant = None
+    if any(
+        e.name in ("IndexedDB", "Local Storage", "Session Storage") for e in folders
+    ):
+        variant = teams_variant(directory)
+    for entry in folders:
+        if entry.name.lower() in prune:
+            continue
+        if variant is None:
+            _add_subdirectory(subdirectories, entry.path)
+        elif entry.name == "IndexedDB":
+            locations.extend(_indexeddb_locations(entry.path, variant, directory))
+        elif entry.name == "Local Storage":
+            leveldb = os.path.join(entry.path, "leveldb")
+            if os.path.isdir(leveldb):
+                locations.append(
+                    Location("local_storage", Path(leveldb), variant, Path(directory))
+                )
+        elif entry.name == "Session Storage":
+            locations.append(
+                Location("session_storage", Path(entry.path), variant, Path(directory))
+            )
+        else:
+            _add_subdirectory(subdirectories, entry.path)
+    return subdirectories, locations
+
+
+def _folder_key(directory: str) -> _FolderKey:
+    # DirEntry.stat() leaves both at zero on Windows, os.stat() fills them
+    st = os.stat(directory, follow_symlinks=False)
+    return st.st_dev, st.st_ino
+
+
+def _add_subdirectory(subdirectories: list[tuple[str, _FolderKey]], path: str) -> None:
+    try:
+        subdirectories.append((path, _folder_key(path)))
+    except OSError as e:
+        print(e)
+
+
+def _is_folder(entry: os.DirEntry[str]) -> bool:
+    # Junctions are no symbolic links, but lead elsewhere just as well.
+    # DirEntry.is_junction() is new in Python 3.12.
+    if not entry.is_dir(follow_symlinks=False):
+        return False
+    is_junction = getattr(entry, "is_junction", None)
+    if is_junction is not None:
+        return not is_junction()
+    if os.name != "nt":
+        return True
+    st = entry.stat(follow_symlinks=False)
+    return getattr(st, "st_reparse_tag", 0) != _IO_REPARSE_TAG_MOUNT_POINT
+
+
+def _indexeddb_locations(
+    directory: str, variant: str, profile: str
+) -> Iterator[Location]:
+    try:
+        with os.scandir(directory) as entries:
+            names = {e.name for e in entries if _is_folder(e)}
+    except OSError as e:
+        print(e)
+        return
+    for name in sorted(names):
+        if not TEAMS_INDEXEDDB.match(name):
+            continue
+        blob = name[: -len(".leveldb")] + ".blob"
+        yield Location(
+            "indexeddb",
+            Path(directory, name),
+            variant,
+            Path(profile),
+            Path(directory, blob) if blob in names else None,
+        )
+
+
+def process_locations(
+    locations: Iterable[Location], outputpath: Path
+) -> list[dict[str, Any]]:
+    """Parse every location into its own JSON file in ``outputpath``.
+
+    IndexedDB folders go through ``process_db``, Local and Session Storage
+    are dumped as they are. A location that fails to parse is recorded with
+    its error, the others are still parsed. A manifest of all locations and
+    their output files is written as ``discovery.json``.
+    """
+    outputpath.mkdir(parents=True, exist_ok=True)
+    results = []
+    for n, location in enumerate(locations):
+        output = (
+            f"{n:03d}-{location.variant}-{location.profile.name}-{location.kind}.json"
+        )
+        result = {**location.to_dict(), "output": output, "error": None}
+        try:
+            if location.kind == "indexeddb":
+                process_db(location.path, outputpath / output, location.blobpath)
+            elif location.kind == "local_storage":
+                write_results_to_json(
+                    parse_localstorage(location.path), outputpath / output
+                )
+            else:
+                write_results_to_json(
+                    parse_sessionstorage(location.path), outputpath / output
+                )
+        except Exception as e:
+            # One broken database must not stop the others from being parsed
+            print(e)
+            result["output"] = None
+            result["error"] = f"{type(e).__name__}: {e}"
+        results.append(result)
+
+    manifest = {"version": __version__, "locations": results}
+    try:
+        (outputpath / DISCOVERY_MANIFEST).write_text(
+            json.dumps(manifest, indent=4), encoding="utf-8"
+        )
+    except OSError as e:
+        print(e)
+    return results
@@ -0,0 +1,341 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import random
+import struct
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any, Optional
+
+from forensicsim.backend import TEAMS_DB_OBJECT_STORES
+from forensicsim.leveldb import (
+    LogWriter,
+    TableWriter,
+    encode_varint,
+    encode_version_edit,
+    encode_write_batch,
+    internal_key,
+    log_file_name,
+    manifest_file_name,
+    table_file_name,
+    write_current,
+)
+
+IDB_COMPARATOR = "idb_cmp1"
+IDB_SCHEMA_VERSION = 5
+
+# Global and database metadata key types, see Chromium's indexed_db_leveldb_coding
+GLOBAL_SCHEMA_VERSION = 0
+GLOBAL_MAX_DATABASE_ID = 1
+GLOBAL_DATABASE_NAME = 201
+DATABASE_MAX_OBJECT_STORE_ID = 3
+DATABASE_IDB_VERSION = 4
+OBJECT_STORE_META_DATA = 50
+OBJECT_STORE_NAME = 0
+OBJECT_STORE_DATA_INDEX_ID = 1
+
+IDB_KEY_STRING = 1
+
+# Blink wire format version written into the value envelope. Versions from 21
+# on add a trailer offset, which the fixtures have no use for.
+BLINK_VERSION = 16
+V8_VERSION = 15
+
+WRITE_BATCH_SIZE = 100
+
+
+def encode_int(value: int) -> bytes:
+    # Little endian with as few bytes as possible, but at least one
+    out = bytearray()
+    while True:
+        out.append(value & 0xFF)
+        value >>= 8
+        if not value:
+            return bytes(out)
+
+
+def encode_key_prefix(
+    database_id: int, object_store_id: int = 0, index_id: int = 0
+) -> bytes:
+    db = encode_int(database_id)
+    store = encode_int(object_store_id)
+    index = encode_int(index_id)
+    lengths = ((len(db) - 1) << 5) | ((len(store) - 1) << 2) | (len(index) - 1)
+    return bytes([lengths]) + db + store + index
+
+
+def encode_string_with_length(value: str) -> bytes:
+    encoded = value.encode("utf-16-be")
+    return encode_varint(len(encoded) // 2) + encoded
+
+
+def encode_idb_string_key(value: str) -> bytes:
+    return bytes([IDB_KEY_STRING]) + encode_string_with_length(value)
+
+
+def serialize_v8(value: Any) -> bytes:
+    """Serialize a JSON-like value in the V8 structured clone format."""
+    out = bytearray(b"\xff" + encode_varint(V8_VERSION))
+    _write_v8(out, value)
+    return bytes(out)
+
+
+def _write_v8(out: bytearray, value: Any) -> None:
+    if value is None:
+        out += b"0"
+    elif value is True:
+        out += b"T"
+    elif value is False:
+        out += b"F"
+    elif isinstance(value, int) and -(2**31) <= value < 2**31:
+        out += b"I" + encode_varint((value << 1) ^ (value >> 31))
+    elif isinstance(value, (int, float)):
+        out += b"N" + struct.pack("<d", float(value))
+    elif isinstance(value, str):
+        _write_v8_string(out, value)
+    elif isinstance(value, dict):
+        out += b"o"
+        for k, v in value.items():
+            _write_v8_string(out, str(k))
+            _write_v8(out, v)
+        out += b"{" + encode_varint(len(value))
+    elif isinstance(value, (list, tuple)):
+        out += b"A" + encode_varint(len(value))
+        for v in value:
+            _write_v8(out, v)
+        out += b"$" + encode_varint(0) + encode_varint(len(value))
+    else:
+        raise TypeError(f"Can not serialize {type(value).__name__} to V8")
+
+
+def _write_v8_string(out: bytearray, value: str) -> None:
+    try:
+        encoded = value.encode("latin-1")
+        out += b'"' + encode_varint(len(encoded)) + encoded
+    except UnicodeEncodeError:
+        encoded = value.encode("utf-16-le")
+        length = encode_varint(len(encoded))
+        # Two byte strings are aligned to an even offset with a padding tag
+        if (len(out) + 1 + len(length)) % 2:
+            out += b"\x00"
+        out += b"c" + length + encoded
+
+
+def encode_idb_value(value: Any, version: int = 1) -> bytes:
+    # Record version, then the Blink envelope around the V8 payload
+    return (
+        encode_varint(version)
+        + b"\xff"
+        + encode_varint(BLINK_VERSION)
+        + serialize_v8(value)
+    )
+
+
+def _decode_key_prefix(key: bytes) -> tuple[int, int, int, int]:
+    lengths = key[0]
+    db_len = (lengths >> 5) + 1
+    store_len = ((lengths >> 2) & 0x07) + 1
+    index_len = (lengths & 0x03) + 1
+    offset = 1
+    ids = []
+    for length in (db_len, store_len, index_len):
+        ids.append(int.from_bytes(key[offset : offset + length], "little"))
+        offset += length
+    return ids[0], ids[1], ids[2], offset
+
+
+def idb_key_order(user_key: bytes) -> tuple[int, int, int, bytes]:
+    """Sort key approximating Chromium's ``idb_cmp1`` for the keys written here.
+
+    Keys are ordered by their prefix ids first. Record keys then compare by
+    their string in UTF-16 code units, metadata keys bytewise.
+    """
+    db, store, index, offset = _decode_key_prefix(user_key)
+    rest = user_key[offset:]
+    if index == OBJECT_STORE_DATA_INDEX_ID and rest[:1] == bytes([IDB_KEY_STRING]):
+        # Skip the type and the varint length, the UTF-16BE code units then
+        # compare like the strings they encode
+        start = 1
+        while rest[start] & 0x80:
+            start += 1
+        rest = rest[start + 1 :]
+    return db, store, index, rest
+
+
+def write_indexeddb_fixture(
+    directory: Path,
+    records: Iterable[dict[str, Any]],
+    levels: int = 2,
+    table_entries: int = 5000,
+    log_share: float = 0.1,
+    deleted_share: float = 0.01,
+    origin: str = "https_teams.microsoft.com_0@1",
+    database: str = "Teams:forensicsim-fixture",
+    seed: int = 0,
+) -> dict[str, Any]:
+    """Write records as a Chromium IndexedDB LevelDB directory.
+
+    ``records`` are dictionaries with ``store``, ``key`` and ``value`` as
+    produced by ``parse_db`` or :func:`forensicsim.synthetic.generate_records`.
+    The oldest records and all metadata go to ``.ldb`` tables on the deepest
+    of ``levels`` levels, newer ones to shallower levels, and the newest
+    ``log_share`` stays in an uncompacted ``.log`` file. A ``deleted_share``
+    of the record keys is deleted again at the end of the log, so the old
+    values remain in the tables next to their tombstones. Returns a summary
+    of the written files.
+    """
+    if levels < 1:
+        raise ValueError("A fixture needs at least one level.")
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+
+    store_ids = {name: n for n, name in enumerate(TEAMS_DB_OBJECT_STORES, start=1)}
+    data: list[tuple[bytes, bytes]] = []
+    for r in records:
+        store_id = store_ids.setdefault(r["store"], len(store_ids) + 1)
+        record_key = r["key"]
+        if isinstance(record_key, bytes):
+            record_key = record_key.decode("utf-8")
+        data.append((
+            encode_key_prefix(1, store_id, OBJECT_STORE_DATA_INDEX_ID)
+            + encode_idb_string_key(str(record_key)),
+            encode_idb_value(r["value"]),
+        ))
+
+    metadata = _metadata(origin, database, store_ids)
+    log_count = int(len(data) * log_share)
+    table_data = metadata + data[: len(data) - log_count]
+    log_data = data[len(data) - log_count :]
+
+    # Oldest records end up on the deepest level
+    seq = 1
+    chunk = -(-len(table_data) // levels) if table_data else 0
+    level_entries: list[list[tuple[bytes, bytes]]] = []
+    for level in range(levels):
+        entries = []
+        for user_key, value in table_data[level * chunk : (level + 1) * chunk]:
+            entries.append((internal_key(user_key, seq), value))
+            seq += 1
+        level_entries.append(entries)
+
+    file_number = 2
+    new_files = []
+    tables = []
+    for level, entries in zip(range(levels - 1, -1, -1), level_entries):
+        entries.sort(key=lambda e: (idb_key_order(e[0][:-8]), -_sequence(e[0])))
+        for start in range(0, len(entries), table_entries):
+            name = table_file_name(file_number)
+            with open(directory / name, "wb") as f:
+                table = TableWriter(f)
+                for key, value in entries[start : start + table_entries]:
+                    table.add(key, value)
+                size = table.finish()
+            if table.smallest is None or table.largest is None:
+                raise ValueError(f"Table {name} of the fixture has no entries.")
+            new_files.append((level, file_number, size, table.smallest, table.largest))
+            tables.append({"file": name, "level": level, "size": size})
+            file_number += 1
+
+    deleted = rng.sample(
+        [user_key for user_key, _ in data], int(len(data) * deleted_share)
+    )
+    log_number = file_number
+    batches: list[list[tuple[bytes, Optional[bytes]]]] = [
+        list(log_data[n : n + WRITE_BATCH_SIZE])
+        for n in range(0, len(log_data), WRITE_BATCH_SIZE)
+    ]
+    batches += [
+        [(user_key, None) for user_key in deleted[n : n + WRITE_BATCH_SIZE]]
+        for n in range(0, len(deleted), WRITE_BATCH_SIZE)
+    ]
+    with open(directory / log_file_name(log_number), "wb") as f:
+        log = LogWriter(f)
+        for batch in batches:
+            log.add_record(encode_write_batch(seq, batch))
+            seq += len(batch)
+
+    manifest_number = 1
+    with open(directory / manifest_file_name(manifest_number), "wb") as f:
+        LogWriter(f).add_record(
+            encode_version_edit(
+                comparator=IDB_COMPARATOR,
+                log_number=log_number,
+                prev_log_number=0,
+                next_file_number=log_number + 1,
+                last_sequence=seq - 1,
+                new_files=new_files,
+            )
+        )
+    write_current(directory, manifest_number)
+    (directory / "LOCK").touch()
+
+    return {
+        "directory": str(directory),
+        "tables": tables,
+        "log": log_file_name(log_number),
+        "manifest": manifest_file_name(manifest_number),
+        "records": len(data),
+        "log_records": len(log_data),
+        "deleted": len(deleted),
+        "last_sequence": seq - 1,
+    }
+
+
+def _metadata(
+    origin: str, database: str, store_ids: dict[str, int]
+) -> list[tuple[bytes, bytes]]:
+    global_prefix = encode_key_prefix(0)
+    database_prefix = encode_key_prefix(1)
+    entries = [
+        (
+            global_prefix + bytes([GLOBAL_SCHEMA_VERSION]),
+            encode_int(IDB_SCHEMA_VERSION),
+        ),
+        (global_prefix + bytes([GLOBAL_MAX_DATABASE_ID]), encode_int(1)),
+        (
+            global_prefix
+            + bytes([GLOBAL_DATABASE_NAME])
+            + encode_string_with_length(origin)
+            + encode_string_with_length(database),
+            encode_varint(1),
+        ),
+        (
+            database_prefix + bytes([DATABASE_MAX_OBJECT_STORE_ID]),
+            encode_int(len(store_ids)),
+        ),
+        (database_prefix + bytes([DATABASE_IDB_VERSION]), encode_varint(1)),
+    ]
+    for name, store_id in store_ids.items():
+        entries.append((
+            database_prefix
+            + bytes([OBJECT_STORE_META_DATA])
+            + encode_varint(store_id)
+            + bytes([OBJECT_STORE_NAME]),
+            name.encode("utf-16-be"),
+        ))
+    return entries
+
+
+def _sequence(key: bytes) -> int:
+    return int(struct.unpack("<Q", key[-8:])[0]) >> 8
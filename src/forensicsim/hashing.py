@@ -0,0 +1,192 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import hashlib
+import io
+import json
+from collections.abc import Iterable
+from functools import partial
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Any, Optional
+
+from forensicsim import __version__
+from forensicsim.stats import Stats
+
+if TYPE_CHECKING:
+    from forensicsim.archive import SourceFolder
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class _Digest:
+    # SHA-256 of the bytes of a file up to the frontier, the first byte not
+    # hashed yet. Bytes are only hashed in order, so reads behind or ahead
+    # of the frontier leave the digest untouched.
+
+    def __init__(self) -> None:
+        self.sha256 = hashlib.sha256()
+        self.frontier = 0
+        self.while_parsing = 0
+
+    def update(self, position: int, data: Any) -> None:
+        end = position + len(data)
+        if position <= self.frontier < end:
+            self.sha256.update(data[self.frontier - position :])
+            self.while_parsing += end - self.frontier
+            self.frontier = end
+
+
+class _HashingReader(io.RawIOBase):
+    # Passes reads through and hashes the bytes that extend the frontier
+
+    def __init__(self, f: IO[bytes], digest: _Digest) -> None:
+        self._f = f
+        self._digest = digest
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._f.tell()
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._f.seek(offset, whence)
+
+    def readinto(self, buffer: Any) -> int:
+        position = self._f.tell()
+        data = self._f.read(len(buffer))
+        buffer[: len(data)] = data
+        self._digest.update(position, data)
+        return len(data)
+
+    def close(self) -> None:
+        self._f.close()
+        super().close()
+
+
+class SourceHashes:
+    """SHA-256 digests of the source files, taken while the parser reads them.
+
+    The bytes of a file are hashed as the parser reads them in order, like
+    the blocks of a log or the data blocks of a table. Whatever the parser
+    skipped, like the footer and index of a table or files it did not open
+    at all, is read afterwards, from several threads where possible.
+    """
+
+    def __init__(
+        self, stats: Optional[Stats] = None, workers: Optional[int] = None
+    ) -> None:
+        self.stats = stats if stats is not None else Stats(enabled=False)
+        self.workers = workers
+        self._digests: dict[str, _Digest] = {}
+        self._sizes: dict[str, int] = {}
+
+    def reader(self, key: str, f: IO[bytes]) -> IO[bytes]:
+        digest = self._digests.setdefault(key, _Digest())
+        return io.BufferedReader(_HashingReader(f, digest))
+
+    def complete(self, folder: "SourceFolder") -> None:
+        # Hash the rest of every file of the folder
+        with self.stats.stage("hashing") as stage_stats:
+            names = folder.names()
+            self._map(
+                partial(self._complete_file, folder), names, folder.parallel_reads
+            )
+            stage_stats.records += len(names)
+        self._count(str(folder / name) for name in names)
+
+    def hash_folder(self, path: Path) -> None:
+        # Hash every file below a folder on disk the parser reads by itself,
+        # like the .blob folder of an IndexedDB
+        with self.stats.stage("hashing") as stage_stats:
+            files = sorted(f for f in path.rglob("*") if f.is_file())
+            self._map(self._hash_file, files, True)
+            stage_stats.records += len(files)
+        self._count(str(f) for f in files)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "version": __version__,
+            "algorithm": "sha256",
+            "files": {
+                key: {
+                    "sha256": digest.sha256.hexdigest(),
+                    "size": self._sizes.get(key, digest.frontier),
+                    "hashed_while_parsing": digest.while_parsing,
+                }
+                for key, digest in sorted(self._digests.items())
+            },
+        }
+
+    def write(self, outputpath: Path) -> None:
+        try:
+            with open(outputpath, "w", encoding="utf-8") as f:
+                json.dump(self.to_dict(), f, indent=4)
+        except OSError as e:
+            print(e)
+
+    def _map(self, function: Any, items: Iterable[Any], parallel: bool) -> None:
+        if not parallel or self.workers == 1:
+            for item in items:
+                function(item)
+            return
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            # Consuming the results raises the first error of a worker
+            for _ in pool.map(function, items):
+                pass
+
+    def _complete_file(self, folder: "SourceFolder", name: str) -> None:
+        key = str(folder / name)
+        digest = self._digests.setdefault(key, _Digest())
+        self._sizes[key] = folder.size(name)
+        if digest.frontier < self._sizes[key]:
+            with folder.open_raw(name) as f:
+                self._read_rest(f, digest)
+
+    def _hash_file(self, path: Path) -> None:
+        key = str(path)
+        digest = self._digests.setdefault(key, _Digest())
+        with open(path, "rb") as f:
+            self._read_rest(f, digest)
+        self._sizes[key] = digest.frontier
+
+    def _read_rest(self, f: IO[bytes], digest: _Digest) -> None:
+        f.seek(digest.frontier)
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.sha256.update(chunk)
+            digest.frontier += len(chunk)
+
+    def _count(self, keys: Iterable[str]) -> None:
+        # Counted once the workers are done, Stats is not thread safe
+        for key in keys:
+            digest = self._digests[key]
+            self.stats.count("hashed_bytes_while_parsing", digest.while_parsing)
+            self.stats.count(
+                "hashed_bytes_after_parsing", digest.frontier - digest.while_parsing
+            )
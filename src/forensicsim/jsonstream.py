@@ -0,0 +1,214 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import re
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Any
+
+# Paths are dotted keys like ijson prefixes, with "item" standing for every
+# element of an array, e.g. "user.tenants.item.tenantId". The C decoder
+# builds an object tree of about five times the size of the text, so large
+# documents are scanned instead: only the values at the selected paths are
+# decoded, everything else is checked token by token and skipped.
+
+_DECODER = json.JSONDecoder(strict=False)
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# Strings may hold control characters, like with strict=False, numbers and
+# constants are those json accepts
+_STRING = r'"[^"\\]*(?:\\(?:["\\/bfnrt]|u[0-9a-fA-F]{4})[^"\\]*)*"'
+_SCALAR = (
+    r"-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?"
+    r"|true|false|null|NaN|-?Infinity"
+)
+_LEAF = rf"(?:{_STRING}|{_SCALAR})"
+# A token after optional whitespace
+_TOKEN = re.compile(
+    rf"[ \t\n\r]*(?:(?P<string>{_STRING})|(?P<punctuation>[\[\]{{}},:])"
+    rf"|(?P<scalar>{_SCALAR}))"
+)
+# Members and elements whose values are no containers are matched in runs,
+# which saves going through them token by token
+_MEMBER = re.compile(rf"[ \t\n\r]*{_STRING}[ \t\n\r]*:[ \t\n\r]*{_LEAF}")
+_MORE_MEMBERS = re.compile(
+    rf"(?:[ \t\n\r]*,[ \t\n\r]*{_STRING}[ \t\n\r]*:[ \t\n\r]*{_LEAF})*"
+)
+_MORE_ELEMENTS = re.compile(rf"(?:[ \t\n\r]*,[ \t\n\r]*{_LEAF})*")
+# What _skip expects next
+_VALUE, _VALUE_OR_END, _KEY, _KEY_OR_END, _COLON, _COMMA_OR_END = range(6)
+
+
+@dataclass(frozen=True)
+class RawJSON:
+    """JSON text that is written to the output as it is, without decoding."""
+
+    text: str
+
+
+def extract_paths(text: str, paths: Iterable[str]) -> dict[str, list[Any]]:
+    """Decode the values at ``paths`` of the JSON document ``text``.
+
+    Every path maps to the list of values found at it, which is empty if
+    the path does not exist. The document is scanned rather than decoded as
+    a whole. Raises ``ValueError`` if ``text`` is no JSON document.
+    """
+    wanted = set(paths)
+    prefixes = {""}
+    for path in wanted:
+        parts = path.split(".")
+        prefixes.update(".".join(parts[:n]) for n in range(1, len(parts)))
+    results: dict[str, list[Any]] = {path: [] for path in wanted}
+    end = _walk(text, _skip_whitespace(text, 0), "", wanted, prefixes, results)
+    if _skip_whitespace(text, end) != len(text):
+        raise ValueError(f"Extra data at {end}")
+    return results
+
+
+def raw_json(text: str) -> RawJSON:
+    """Check that ``text`` is a JSON document and wrap it for pass-through.
+
+    The document is scanned without being decoded, and the text is written
+    out unchanged instead of being encoded again. Raises ``ValueError`` if
+    ``text`` is no JSON document.
+    """
+    end = _skip(text, 0)
+    if _skip_whitespace(text, end) != len(text):
+        raise ValueError(f"Extra data at {end}")
+    return RawJSON(text)
+
+
+def _walk(
+    text: str,
+    index: int,
+    path: str,
+    wanted: set[str],
+    prefixes: set[str],
+    results: dict[str, list[Any]],
+) -> int:
+    # Returns the index behind the value starting at index
+    if path in wanted:
+        value, end = _DECODER.raw_decode(text, index)
+        results[path].append(value)
+        return end
+    if path not in prefixes:
+        return _skip(text, index)
+
+    char = text[index : index + 1]
+    if char == "{":
+        index = _skip_whitespace(text, index + 1)
+        if text.startswith("}", index):
+            return index + 1
+        while True:
+            key, index = _DECODER.raw_decode(text, index)
+            index = _skip_whitespace(text, index)
+            if not text.startswith(":", index):
+                raise ValueError(f"Expected ':' at {index}")
+            index = _skip_whitespace(text, index + 1)
+            child = f"{path}.{key}" if path else str(key)
+            index = _walk(text, index, child, wanted, prefixes, results)
+            index = _skip_whitespace(text, index)
+            if text.startswith(",", index):
+                index = _skip_whitespace(text, index + 1)
+            elif text.startswith("}", index):
+                return index + 1
+            else:
+                raise ValueError(f"Expected ',' or '}}' at {index}")
+    if char == "[":
+        index = _skip_whitespace(text, index + 1)
+        if text.startswith("]", index):
+            return index + 1
+        child = f"{path}.item" if path else "item"
+        while True:
+            index = _walk(text, index, child, wanted, prefixes, results)
+            index = _skip_whitespace(text, index)
+            if text.startswith(",", index):
+                index = _skip_whitespace(text, index + 1)
+            elif text.startswith("]", index):
+                return index + 1
+            else:
+                raise ValueError(f"Expected ',' or ']' at {index}")
+    return _skip(text, index)
+
+
+def _skip(text: str, index: int) -> int:
+    # Find the end of the value at index without decoding it, checking every
+    # token on the way. Nesting is tracked on a list, not by recursion.
+    containers: list[str] = []
+    expected = _VALUE
+    while True:
+        if expected in (_KEY, _KEY_OR_END):
+            member = _MEMBER.match(text, index)
+            if member is not None:
+                index = member.end()
+                expected = _COMMA_OR_END
+        if expected == _COMMA_OR_END:
+            more = _MORE_MEMBERS if containers[-1] == "{" else _MORE_ELEMENTS
+            run = more.match(text, index)
+            index = run.end() if run else index
+        match = _TOKEN.match(text, index)
+        if match is None:
+            raise ValueError(f"Invalid JSON at {_skip_whitespace(text, index)}")
+        kind = match.lastgroup or ""
+        token = match.group(kind)
+        index = match.end()
+        start = index - len(token)
+        if expected in (_VALUE, _VALUE_OR_END):
+            if kind == "punctuation" and token in ("{", "["):
+                containers.append(token)
+                expected = _KEY_OR_END if token == "{" else _VALUE_OR_END
+                continue
+            if kind == "punctuation":
+                if expected != _VALUE_OR_END or token != "]":
+                    raise ValueError(f"Expected a value at {start}")
+                containers.pop()
+        elif expected in (_KEY, _KEY_OR_END):
+            if kind == "string":
+                expected = _COLON
+                continue
+            if expected != _KEY_OR_END or token != "}":
+                raise ValueError(f"Expected a key at {start}")
+            containers.pop()
+        elif expected == _COLON:
+            if token != ":":
+                raise ValueError(f"Expected ':' at {start}")
+            expected = _VALUE
+            continue
+        else:
+            closing = "}" if containers[-1] == "{" else "]"
+            if token == ",":
+                expected = _KEY if closing == "}" else _VALUE
+                continue
+            if token != closing:
+                raise ValueError(f"Expected ',' or '{closing}' at {start}")
+            containers.pop()
+        # A value ended
+        if not containers:
+            return index
+        expected = _COMMA_OR_END
+
+
+def _skip_whitespace(text: str, index: int) -> int:
+    match = _WHITESPACE.match(text, index)
+    return match.end() if match else index
@@ -0,0 +1,468 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+import re
+import struct
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import IO, Any, BinaryIO, Optional
+
+# Log files are split into blocks of 32 KiB, every fragment has a 7 byte header
+LOG_BLOCK_SIZE = 32768
+LOG_HEADER_SIZE = 7
+LOG_FULL, LOG_FIRST, LOG_MIDDLE, LOG_LAST = 1, 2, 3, 4
+
+TABLE_MAGIC = 0xDB4775248B80FB57
+TABLE_FOOTER_SIZE = 48
+BLOCK_TRAILER_SIZE = 5
+RESTART_INTERVAL = 16
+
+# Value types stored in the low byte of an internal key's trailer
+TYPE_DELETION = 0
+TYPE_VALUE = 1
+
+# VersionEdit tags used in MANIFEST files
+TAG_COMPARATOR = 1
+TAG_LOG_NUMBER = 2
+TAG_NEXT_FILE_NUMBER = 3
+TAG_LAST_SEQUENCE = 4
+TAG_COMPACT_POINTER = 5
+TAG_DELETED_FILE = 6
+TAG_NEW_FILE = 7
+TAG_PREV_LOG_NUMBER = 9
+
+
+def _make_crc32c_table() -> list[int]:
+    table = []
+    for n in range(256):
+        crc = n
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x82F63B78 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+_CRC32C_TABLE = _make_crc32c_table()
+
+
+def crc32c(data: bytes, crc: int = 0) -> int:
+    crc ^= 0xFFFFFFFF
+    for b in data:
+        crc = _CRC32C_TABLE[(crc ^ b) & 0xFF] ^ (crc >> 8)
+    return crc ^ 0xFFFFFFFF
+
+
+def masked_crc32c(data: bytes) -> int:
+    # LevelDB stores checksums masked, so that CRCs of CRCs stay useful
+    crc = crc32c(data)
+    return (((crc >> 15) | (crc << 17)) + 0xA282EAD8) & 0xFFFFFFFF
+
+
+def encode_varint(value: int) -> bytes:
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def encode_length_prefixed(data: bytes) -> bytes:
+    return encode_varint(len(data)) + data
+
+
+def decode_varint(data: bytes, offset: int = 0) -> tuple[int, int]:
+    # Returns the value and the offset behind it
+    value = shift = 0
+    while True:
+        if offset >= len(data):
+            raise ValueError("Truncated varint.")
+        b = data[offset]
+        offset += 1
+        value |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return value, offset
+        shift += 7
+
+
+def decode_length_prefixed(data: bytes, offset: int = 0) -> tuple[bytes, int]:
+    length, offset = decode_varint(data, offset)
+    if offset + length > len(data):
+        raise ValueError("Truncated length prefixed slice.")
+    return data[offset : offset + length], offset + length
+
+
+def internal_key(user_key: bytes, seq: int, value_type: int = TYPE_VALUE) -> bytes:
+    return user_key + struct.pack("<Q", (seq << 8) | value_type)
+
+
+def encode_write_batch(seq: int, entries: list[tuple[bytes, Optional[bytes]]]) -> bytes:
+    # A value of None records a deletion of the key
+    out = bytearray(struct.pack("<QI", seq, len(entries)))
+    for key, value in entries:
+        if value is None:
+            out.append(TYPE_DELETION)
+            out += encode_length_prefixed(key)
+        else:
+            out.append(TYPE_VALUE)
+            out += encode_length_prefixed(key)
+            out += encode_length_prefixed(value)
+    return bytes(out)
+
+
+class LogWriter:
+    """Writes records in the LevelDB log format used by ``.log`` and MANIFEST files."""
+
+    def __init__(self, f: BinaryIO) -> None:
+        self._f = f
+        self._block_offset = 0
+
+    def add_record(self, data: bytes) -> None:
+        first = True
+        while True:
+            leftover = LOG_BLOCK_SIZE - self._block_offset
+            if leftover < LOG_HEADER_SIZE:
+                # Too little room for another header, pad the block with zeros
+                self._f.write(b"\x00" * leftover)
+                self._block_offset = 0
+                leftover = LOG_BLOCK_SIZE
+
+            fragment = data[: leftover - LOG_HEADER_SIZE]
+            data = data[len(fragment) :]
+            if first and not data:
+                record_type = LOG_FULL
+            elif first:
+                record_type = LOG_FIRST
+            elif not data:
+                record_type = LOG_LAST
+            else:
+                record_type = LOG_MIDDLE
+
+            crc = masked_crc32c(bytes([record_type]) + fragment)
+            self._f.write(struct.pack("<IHB", crc, len(fragment), record_type))
+            self._f.write(fragment)
+            self._block_offset += LOG_HEADER_SIZE + len(fragment)
+            first = False
+            if not data:
+                return
+
+
+class _BlockBuilder:
+    def __init__(self, restart_interval: int = RESTART_INTERVAL) -> None:
+        self._restart_interval = restart_interval
+        self._buffer = bytearray()
+        self._restarts = [0]
+        self._counter = 0
+        self._last_key = b""
+        self.entries = 0
+
+    def add(self, key: bytes, value: bytes) -> None:
+        shared = 0
+        if self._counter < self._restart_interval:
+            limit = min(len(key), len(self._last_key))
+            while shared < limit and key[shared] == self._last_key[shared]:
+                shared += 1
+        else:
+            self._restarts.append(len(self._buffer))
+            self._counter = 0
+        self._buffer += encode_varint(shared)
+        self._buffer += encode_varint(len(key) - shared)
+        self._buffer += encode_varint(len(value))
+        self._buffer += key[shared:]
+        self._buffer += value
+        self._last_key = key
+        self._counter += 1
+        self.entries += 1
+
+    def size(self) -> int:
+        return len(self._buffer) + 4 * (len(self._restarts) + 1)
+
+    def finish(self) -> bytes:
+        restarts = b"".join(struct.pack("<I", r) for r in self._restarts)
+        return bytes(self._buffer) + restarts + struct.pack("<I", len(self._restarts))
+
+
+class TableWriter:
+    """Writes a sorted table (``.ldb``) with uncompressed blocks.
+
+    Entries have to be added in comparator order as internal keys, see
+    :func:`internal_key`. Blocks are stored uncompressed, which every reader
+    supports; Chromium itself would usually snappy-compress them.
+    """
+
+    def __init__(self, f: BinaryIO, block_size: int = 4096) -> None:
+        self._f = f
+        self._block_size = block_size
+        self._offset = 0
+        self._data_block = _BlockBuilder()
+        self._index_block = _BlockBuilder(restart_interval=1)
+        self._last_key = b""
+        self.smallest: Optional[bytes] = None
+        self.largest: Optional[bytes] = None
+
+    def add(self, key: bytes, value: bytes) -> None:
+        if self.smallest is None:
+            self.smallest = key
+        self.largest = key
+        self._data_block.add(key, value)
+        self._last_key = key
+        if self._data_block.size() >= self._block_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._data_block.entries:
+            return
+        handle = self._write_block(self._data_block.finish())
+        # The last key of a block is a valid separator towards the next one
+        self._index_block.add(self._last_key, handle)
+        self._data_block = _BlockBuilder()
+
+    def _write_block(self, contents: bytes) -> bytes:
+        handle = encode_varint(self._offset) + encode_varint(len(contents))
+        trailer = b"\x00" + struct.pack("<I", masked_crc32c(contents + b"\x00"))
+        self._f.write(contents)
+        self._f.write(trailer)
+        self._offset += len(contents) + BLOCK_TRAILER_SIZE
+        return handle
+
+    def finish(self) -> int:
+        self._flush()
+        metaindex_handle = self._write_block(_BlockBuilder().finish())
+        index_handle = self._write_block(self._index_block.finish())
+        footer = (metaindex_handle + index_handle).ljust(TABLE_FOOTER_SIZE - 8, b"\x00")
+        self._f.write(footer + struct.pack("<Q", TABLE_MAGIC))
+        self._offset += TABLE_FOOTER_SIZE
+        return self._offset
+
+
+def encode_version_edit(
+    comparator: Optional[str] = None,
+    log_number: Optional[int] = None,
+    prev_log_number: Optional[int] = None,
+    next_file_number: Optional[int] = None,
+    last_sequence: Optional[int] = None,
+    new_files: Iterable[tuple[int, int, int, bytes, bytes]] = (),
+    deleted_files: Iterable[tuple[int, int]] = (),
+) -> bytes:
+    # new_files are (level, number, size, smallest, largest) tuples
+    out = bytearray()
+    if comparator is not None:
+        out += encode_varint(TAG_COMPARATOR)
+        out += encode_length_prefixed(comparator.encode("ascii"))
+    if log_number is not None:
+        out += encode_varint(TAG_LOG_NUMBER) + encode_varint(log_number)
+    if prev_log_number is not None:
+        out += encode_varint(TAG_PREV_LOG_NUMBER) + encode_varint(prev_log_number)
+    if next_file_number is not None:
+        out += encode_varint(TAG_NEXT_FILE_NUMBER) + encode_varint(next_file_number)
+    if last_sequence is not None:
+        out += encode_varint(TAG_LAST_SEQUENCE) + encode_varint(last_sequence)
+    for level, number in deleted_files:
+        out += encode_varint(TAG_DELETED_FILE)
+        out += encode_varint(level) + encode_varint(number)
+    for level, number, size, smallest, largest in new_files:
+        out += encode_varint(TAG_NEW_FILE)
+        out += encode_varint(level) + encode_varint(number) + encode_varint(size)
+        out += encode_length_prefixed(smallest) + encode_length_prefixed(largest)
+    return bytes(out)
+
+
+def read_log_records(f: IO[bytes]) -> Iterator[bytes]:
+    """Reassemble the records of a ``.log`` or MANIFEST file.
+
+    Fragments with a checksum mismatch are dropped together with the record
+    they belong to, like LevelDB does when recovering.
+    """
+    fragments: Optional[list[bytes]] = None
+    while True:
+        block = f.read(LOG_BLOCK_SIZE)
+        if not block:
+            return
+        offset = 0
+        while offset + LOG_HEADER_SIZE <= len(block):
+            checksum, length, record_type = struct.unpack_from("<IHB", block, offset)
+            if record_type == 0 and length == 0:
+                # Zero padding up to the end of the block
+                break
+            data = block[offset + LOG_HEADER_SIZE : offset + LOG_HEADER_SIZE + length]
+            offset += LOG_HEADER_SIZE + length
+            if len(data) < length or masked_crc32c(bytes([record_type]) + data) != (
+                checksum
+            ):
+                fragments = None
+                continue
+            if record_type == LOG_FULL:
+                fragments = None
+                yield data
+            elif record_type == LOG_FIRST:
+                fragments = [data]
+            elif record_type == LOG_MIDDLE and fragments is not None:
+                fragments.append(data)
+            elif record_type == LOG_LAST and fragments is not None:
+                fragments.append(data)
+                yield b"".join(fragments)
+                fragments = None
+
+
+def decode_version_edit(data: bytes) -> dict[str, Any]:
+    edit: dict[str, Any] = {"new_files": [], "deleted_files": []}
+    offset = 0
+    while offset < len(data):
+        tag, offset = decode_varint(data, offset)
+        if tag == TAG_COMPARATOR:
+            comparator, offset = decode_length_prefixed(data, offset)
+            edit["comparator"] = comparator.decode("ascii", errors="replace")
+        elif tag in (
+            TAG_LOG_NUMBER,
+            TAG_PREV_LOG_NUMBER,
+            TAG_NEXT_FILE_NUMBER,
+            TAG_LAST_SEQUENCE,
+        ):
+            value, offset = decode_varint(data, offset)
+            edit[_VERSION_EDIT_FIELDS[tag]] = value
+        elif tag == TAG_COMPACT_POINTER:
+            _, offset = decode_varint(data, offset)
+            _, offset = decode_length_prefixed(data, offset)
+        elif tag == TAG_DELETED_FILE:
+            level, offset = decode_varint(data, offset)
+            number, offset = decode_varint(data, offset)
+            edit["deleted_files"].append((level, number))
+        elif tag == TAG_NEW_FILE:
+            level, offset = decode_varint(data, offset)
+            number, offset = decode_varint(data, offset)
+            size, offset = decode_varint(data, offset)
+            smallest, offset = decode_length_prefixed(data, offset)
+            largest, offset = decode_length_prefixed(data, offset)
+            edit["new_files"].append((level, number, size, smallest, largest))
+        else:
+            raise ValueError(f"Unknown VersionEdit tag {tag}.")
+    return edit
+
+
+_VERSION_EDIT_FIELDS = {
+    TAG_LOG_NUMBER: "log_number",
+    TAG_PREV_LOG_NUMBER: "prev_log_number",
+    TAG_NEXT_FILE_NUMBER: "next_file_number",
+    TAG_LAST_SEQUENCE: "last_sequence",
+}
+
+# Tables and logs, named after their file number
+DATA_FILE = re.compile(r"^([0-9]{6,})\.(ldb|sst|log)$")
+
+
+def live_files(
+    directory: Path, names: Optional[Iterable[str]] = None
+) -> dict[str, Any]:
+    """Work out the files of a LevelDB folder the current version consists of.
+
+    Reads CURRENT and the MANIFEST it names from ``directory`` and replays
+    the VersionEdits. ``names`` is the listing of the original folder and
+    defaults to the content of ``directory``, so only CURRENT and the
+    MANIFEST have to be copied before. Returns the file names needed to
+    open the database in ``files`` and the numbered tables and logs that
+    are no longer part of it in ``obsolete``. Tables the MANIFEST refers to
+    but the listing lacks are reported in ``missing``. Blobs of an IndexedDB
+    are not covered, the MANIFEST does not know them and they are kept in
+    the sibling ``.blob`` folder. Raises ``OSError`` or ``ValueError`` if
+    CURRENT or the MANIFEST are missing or unreadable.
+    """
+    listing = set(os.listdir(directory) if names is None else names)
+    manifest = (directory / "CURRENT").read_text(encoding="ascii").strip()
+    if not manifest.startswith("MANIFEST-") or "/" in manifest or "\\" in manifest:
+        raise ValueError(f"CURRENT names no MANIFEST: {manifest!r}")
+
+    with open(directory / manifest, "rb") as f:
+        version = replay_manifest(f)
+    tables = version["tables"]
+    log_number = version["log_number"]
+    prev_log_number = version["prev_log_number"]
+
+    files = ["CURRENT", manifest]
+    obsolete: list[str] = []
+    for name in sorted(listing):
+        match = DATA_FILE.match(name)
+        if match is None:
+            continue
+        number = int(match.group(1))
+        if match.group(2) == "log":
+            # Logs from the current one on are replayed when opening, a
+            # previous log number of zero means there is none
+            live = number >= log_number or 0 < number == prev_log_number
+        else:
+            live = number in tables
+        (files if live else obsolete).append(name)
+    missing = sorted(
+        n for n in tables if not {table_file_name(n), f"{n:06d}.sst"} & listing
+    )
+    return {
+        "manifest": manifest,
+        "files": files,
+        "obsolete": obsolete,
+        "missing": [table_file_name(n) for n in missing],
+    }
+
+
+def replay_manifest(f: IO[bytes]) -> dict[str, Any]:
+    """Replay the VersionEdits of a MANIFEST into the current version.
+
+    Returns the tables of the current version in ``tables`` as a dict of
+    file number to level, in the order the MANIFEST added them, together
+    with the ``log_number`` and ``prev_log_number``.
+    """
+    tables: dict[int, int] = {}
+    log_number = prev_log_number = 0
+    for record in read_log_records(f):
+        edit = decode_version_edit(record)
+        # Deletions come first, a table moved to the next level is deleted
+        # and added again within the same edit
+        for _, number in edit["deleted_files"]:
+            tables.pop(number, None)
+        for level, number, *_ in edit["new_files"]:
+            tables[number] = level
+        log_number = edit.get("log_number", log_number)
+        prev_log_number = edit.get("prev_log_number", prev_log_number)
+    return {
+        "tables": tables,
+        "log_number": log_number,
+        "prev_log_number": prev_log_number,
+    }
+
+
+def table_file_name(number: int) -> str:
+    return f"{number:06d}.ldb"
+
+
+def log_file_name(number: int) -> str:
+    return f"{number:06d}.log"
+
+
+def manifest_file_name(number: int) -> str:
+    return f"MANIFEST-{number:06d}"
+
+
+def write_current(directory: Path, manifest_number: int) -> None:
+    (directory / "CURRENT").write_text(
+        manifest_file_name(manifest_number) + "\n", encoding="ascii"
+    )
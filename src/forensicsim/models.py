@@ -0,0 +1,140 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Optional
+
+from dataclasses_json import (
+    DataClassJsonMixin,
+    LetterCase,
+    Undefined,
+    config,
+    dataclass_json,
+)
+
+from forensicsim.parser import (
+    decode_dict,
+    decode_timestamp,
+    encode_timestamp,
+    strip_html_tags,
+)
+
+
+@dataclass_json(letter_case=LetterCase.CAMEL, undefined=Undefined.EXCLUDE)
+@dataclass()
+class Meeting(DataClassJsonMixin):
+    client_update_time: Optional[str] = None
+    cached_deduplication_key: Optional[str] = None
+    id: Optional[str] = None
+    members: Optional[list[dict]] = None
+    thread_properties: dict[str, Any] = field(
+        default_factory=dict, metadata=config(decoder=decode_dict)
+    )
+    type: Optional[str] = None
+    version: Optional[float] = None
+
+    record_type: Optional[str] = field(
+        default="meeting", metadata=config(field_name="record_type")
+    )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Meeting):
+            return NotImplemented
+        return self.cached_deduplication_key == other.cached_deduplication_key
+
+    def __hash__(self) -> int:
+        return hash(self.cached_deduplication_key)
+
+    def __lt__(self, other: object) -> bool:
+        if not isinstance(other, Meeting):
+            return NotImplemented
+        return self.cached_deduplication_key < other.cached_deduplication_key
+
+
+@dataclass_json(letter_case=LetterCase.CAMEL, undefined=Undefined.EXCLUDE)
+@dataclass()
+class Message(DataClassJsonMixin):
+    attachments: list[Any] = field(default_factory=list)
+    cached_deduplication_key: Optional[str] = None
+    client_arrival_time: Optional[str] = None
+    clientmessageid: Optional[str] = None
+    composetime: Optional[str] = None
+    conversation_id: Optional[str] = None
+    content: Optional[str] = field(
+        default=None, metadata=config(decoder=strip_html_tags)
+    )
+    contenttype: Optional[str] = None
+    created_time: Optional[datetime] = field(
+        default=None,
+        metadata=config(decoder=decode_timestamp, encoder=encode_timestamp),
+    )
+    creator: Optional[str] = None
+    is_from_me: Optional[bool] = None
+    message_kind: Optional[str] = None
+    messagetype: Optional[str] = None
+    original_arrival_time: Optional[str] = None
+    properties: dict[str, Any] = field(
+        default_factory=dict, metadata=config(decoder=decode_dict)
+    )
+    version: Optional[datetime] = field(
+        default=None,
+        metadata=config(decoder=decode_timestamp, encoder=encode_timestamp),
+    )
+
+    origin_file: Optional[str] = field(
+        default=None, metadata=config(field_name="origin_file")
+    )
+    record_type: str = field(
+        default="message", metadata=config(field_name="record_type")
+    )
+
+    def __post_init__(self) -> None:
+        if self.cached_deduplication_key is None:
+            self.cached_deduplication_key = str(self.creator) + str(
+                self.clientmessageid
+            )
+        # change record type depending on properties
+        if "call-log" in self.properties:
+            self.record_type = "call"
+        if "activity" in self.properties:
+            self.record_type = "reaction"
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Message):
+            return NotImplemented
+        return self.cached_deduplication_key == other.cached_deduplication_key
+
+    def __hash__(self) -> int:
+        return hash(self.cached_deduplication_key)
+
+    def __lt__(self, other: object) -> bool:
+        if not isinstance(other, Message):
+            return NotImplemented
+        return self.cached_deduplication_key < other.cached_deduplication_key
+
+
+@dataclass_json(letter_case=LetterCase.CAMEL, undefined=Undefined.EXCLUDE)
+@dataclass()
+class Contact(DataClassJsonMixin):
+    display_name: Optional[str] = None
+    email: Optional[str] = None
+    mri: Optional[str] = field(default=None, compare=True)
+    user_principal_name: Optional[str] = None
+
+    origin_file: Optional[str] = field(
+        default=None, metadata=config(field_name="origin_file")
+    )
+    record_type: Optional[str] = field(
+        default="contact", metadata=config(field_name="record_type")
+    )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Contact):
+            return NotImplemented
+        return self.mri == other.mri
+
+    def __hash__(self) -> int:
+        return hash(self.mri)
+
+    def __lt__(self, other: object) -> bool:
+        if not isinstance(other, Contact):
+            return NotImplemented
+        return self.mri < other.mri
@@ -1,36 +1,74 @@
+import itertools
 import json
+import sys
 import warnings
-from dataclasses import dataclass, field
+from collections.abc import Iterable, Iterator
 from datetime import datetime
+from functools import cache
 from json import JSONDecodeError
 from pathlib import Path
-from typing import Any, Optional, Union
-
-from bs4 import BeautifulSoup, MarkupResemblesLocatorWarning
-from dataclasses_json import (
-    DataClassJsonMixin,
-    LetterCase,
-    Undefined,
-    config,
-    dataclass_json,
+from typing import TYPE_CHECKING, Any, Callable, Optional, Union
+
+from forensicsim.backend import (
+    ChunkSink,
+    CompressedSink,
+    JsonLinesSink,
+    JsonSink,
+    MemoryBudget,
+    ShardSink,
+    Sink,
+    SpillBuffer,
+    iter_db,
+    parse_db,
+    write_to_sinks,
 )
+from forensicsim.progress import Progress
+from forensicsim.stats import Stats
 
-from forensicsim.backend import parse_db, write_results_to_json
+# Digests of the source files, written into a sharded or chunked output folder
+SOURCES_MANIFEST = "sources.json"
+# Models taken from the merge of a memory budget per measurement of the
+# dedup stage
+MERGE_BATCH_SIZE = 1000
 
-# Suppress Beautiful Soup warnings
-warnings.filterwarnings("ignore", category=MarkupResemblesLocatorWarning)
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+
+    from forensicsim.archive import SourceFolder
+    from forensicsim.models import Contact, Meeting, Message
+
+# The models and Beautiful Soup pull in dataclasses_json, marshmallow and bs4,
+# so they are only imported once records are actually parsed
+_MODELS = ("Contact", "Meeting", "Message")
+
+
+def __getattr__(name: str) -> Any:
+    if name in _MODELS:
+        from forensicsim import models
+
+        return getattr(models, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@cache
+def _beautiful_soup() -> type["BeautifulSoup"]:
+    from bs4 import BeautifulSoup, MarkupResemblesLocatorWarning
+
+    # Suppress Beautiful Soup warnings
+    warnings.filterwarnings("ignore", category=MarkupResemblesLocatorWarning)
+    return BeautifulSoup
 
 
 def strip_html_tags(value: str) -> str:
     # Get the text of any embedded html, such as divs, a href links
-    soup = BeautifulSoup(value, features="html.parser")
+    soup = _beautiful_soup()(value, features="html.parser")
     return soup.get_text()
 
 
 def decode_dict(properties: Union[bytes, str, dict]) -> dict[str, Any]:
     try:
         if isinstance(properties, bytes):
-            soup = BeautifulSoup(properties, features="html.parser")
+            soup = _beautiful_soup()(properties, features="html.parser")
             properties = properties.decode(
                 encoding=soup.original_encoding, errors="ignore"
             )
@@ -58,130 +96,8 @@ def encode_timestamp(timestamp: Optional[datetime]) -> Optional[str]:
     return None
 
 
-@dataclass_json(letter_case=LetterCase.CAMEL, undefined=Undefined.EXCLUDE)
-@dataclass()
-class Meeting(DataClassJsonMixin):
-    client_update_time: Optional[str] = None
-    cached_deduplication_key: Optional[str] = None
-    id: Optional[str] = None
-    members: Optional[list[dict]] = None
-    thread_properties: dict[str, Any] = field(
-        default_factory=dict, metadata=config(decoder=decode_dict)
-    )
-    type: Optional[str] = None
-    version: Optional[float] = None
-
-    record_type: Optional[str] = field(
-        default="meeting", metadata=config(field_name="record_type")
-    )
-
-    def __eq__(self, other: object) -> bool:
-        if not isinstance(other, Meeting):
-            return NotImplemented
-        return self.cached_deduplication_key == other.cached_deduplication_key
-
-    def __hash__(self) -> int:
-        return hash(self.cached_deduplication_key)
-
-    def __lt__(self, other: object) -> bool:
-        if not isinstance(other, Meeting):
-            return NotImplemented
-        return self.cached_deduplication_key < other.cached_deduplication_key
-
-
-@dataclass_json(letter_case=LetterCase.CAMEL, undefined=Undefined.EXCLUDE)
-@dataclass()
-class Message(DataClassJsonMixin):
-    attachments: list[Any] = field(default_factory=list)
-    cached_deduplication_key: Optional[str] = None
-    client_arrival_time: Optional[str] = None
-    clientmessageid: Optional[str] = None
-    composetime: Optional[str] = None
-    conversation_id: Optional[str] = None
-    content: Optional[str] = field(
-        default=None, metadata=config(decoder=strip_html_tags)
-    )
-    contenttype: Optional[str] = None
-    created_time: Optional[datetime] = field(
-        default=None,
-        metadata=config(decoder=decode_timestamp, encoder=encode_timestamp),
-    )
-    creator: Optional[str] = None
-    is_from_me: Optional[bool] = None
-    message_kind: Optional[str] = None
-    messagetype: Optional[str] = None
-    original_arrival_time: Optional[str] = None
-    properties: dict[str, Any] = field(
-        default_factory=dict, metadata=config(decoder=decode_dict)
-    )
-    version: Optional[datetime] = field(
-        default=None,
-        metadata=config(decoder=decode_timestamp, encoder=encode_timestamp),
-    )
-
-    origin_file: Optional[str] = field(
-        default=None, metadata=config(field_name="origin_file")
-    )
-    record_type: str = field(
-        default="message", metadata=config(field_name="record_type")
-    )
-
-    def __post_init__(self) -> None:
-        if self.cached_deduplication_key is None:
-            self.cached_deduplication_key = str(self.creator) + str(
-                self.clientmessageid
-            )
-        # change record type depending on properties
-        if "call-log" in self.properties:
-            self.record_type = "call"
-        if "activity" in self.properties:
-            self.record_type = "reaction"
-
-    def __eq__(self, other: object) -> bool:
-        if not isinstance(other, Message):
-            return NotImplemented
-        return self.cached_deduplication_key == other.cached_deduplication_key
-
-    def __hash__(self) -> int:
-        return hash(self.cached_deduplication_key)
-
-    def __lt__(self, other: object) -> bool:
-        if not isinstance(other, Message):
-            return NotImplemented
-        return self.cached_deduplication_key < other.cached_deduplication_key
-
-
-@dataclass_json(letter_case=LetterCase.CAMEL, undefined=Undefined.EXCLUDE)
-@dataclass()
-class Contact(DataClassJsonMixin):
-    display_name: Optional[str] = None
-    email: Optional[str] = None
-    mri: Optional[str] = field(default=None, compare=True)
-    user_principal_name: Optional[str] = None
-
-    origin_file: Optional[str] = field(
-        default=None, metadata=config(field_name="origin_file")
-    )
-    record_type: Optional[str] = field(
-        default="contact", metadata=config(field_name="record_type")
-    )
-
-    def __eq__(self, other: object) -> bool:
-        if not isinstance(other, Contact):
-            return NotImplemented
-        return self.mri == other.mri
-
-    def __hash__(self) -> int:
-        return hash(self.mri)
-
-    def __lt__(self, other: object) -> bool:
-        if not isinstance(other, Contact):
-            return NotImplemented
-        return self.mri < other.mri
-
-
-def _parse_people(people: list[dict], version: str) -> set[Contact]:
-    parsed_people = set()
+def _parse_people(people: Iterable[dict], version: str) -> Iterator["Contact"]:
+    from forensicsim.models import Contact
 
     for p in people:
         # Skip empty records
@@ -204,12 +120,11 @@ def _parse_people(people: list[dict], version: str) -> set[Contact]:
         else:
             print("Teams Version is unknown. Can not extract records of type people.")
 
-        parsed_people.add(Contact.from_dict(p))
-    return parsed_people
+        yield Contact.from_dict(p)
 
 
-def _parse_buddies(buddies: list[dict], version: str) -> set[Contact]:
-    parsed_buddies = set()
+def _parse_buddies(buddies: Iterable[dict], version: str) -> Iterator["Contact"]:
+    from forensicsim.models import Contact
 
     for b in buddies:
         # Skip empty records
@@ -220,16 +135,18 @@ def _parse_buddies(buddies: list[dict], version: str) -> set[Contact]:
             buddies_of_b = b.get("value", {}).get("buddies", [])
             for b_of_b in buddies_of_b:
                 b_of_b |= {"origin_file": b.get("origin_file")}
-                parsed_buddies.add(Contact.from_dict(b_of_b))
+                yield Contact.from_dict(b_of_b)
         else:
             print("Teams Version is unknown. Can not extract records of type buddies.")
-    return parsed_buddies
 
 
 # Conversations can contain multiple artefacts
 # -> If type:Meeting then its a meeting
-def _parse_conversations(conversations: list[dict], version: str) -> set[Meeting]:
-    cleaned_conversations = set()
+def _parse_conversations(
+    conversations: Iterable[dict], version: str
+) -> Iterator["Meeting"]:
+    from forensicsim.models import Meeting
+
     for c in conversations:
         # Skip empty records
         if c["value"] is None:
@@ -243,14 +160,16 @@ def _parse_conversations(conversations: list[dict], version: str) -> set[Meeting
                 c |= c_value
                 c |= {"thread_properties": c_value.get("threadProperties", {})}
                 c |= {"cached_deduplication_key": c.get("id")}
-                cleaned_conversations.add(Meeting.from_dict(c))
+                yield Meeting.from_dict(c)
         else:
             print("Teams Version is unknown. Can not extract records of type meeting.")
-    return cleaned_conversations
 
 
-def _parse_reply_chains(reply_chains: list[dict], version: str) -> set[Message]:
-    cleaned_reply_chains = set()
+def _parse_reply_chains(
+    reply_chains: Iterable[dict], version: str
+) -> Iterator["Message"]:
+    from forensicsim.models import Message
+
     for rc in reply_chains:
         # Skip empty records
         if rc["value"] is None:
@@ -310,12 +229,10 @@ def _parse_reply_chains(reply_chains: list[dict], version: str) -> set[Message]:
                 rc |= {"version": md.get("version")}
                 rc |= {"properties": md.get("properties")}
 
-                cleaned_reply_chains.add(Message.from_dict(rc))
-
-    return cleaned_reply_chains
+                yield Message.from_dict(rc)
 
 
-def identify_teams_version(reply_chains: list[dict]) -> str:
+def identify_teams_version(reply_chains: Iterable[dict]) -> str:
     # Identify version based on reply chain structure
     fingerprint_teams_version = ""
     for rc in reply_chains:
@@ -331,45 +248,377 @@ def identify_teams_version(reply_chains: list[dict]) -> str:
     return fingerprint_teams_version
 
 
-def parse_records(records: list[dict]) -> list[dict]:
-    people, buddies, reply_chains, conversations = [], [], [], []
+def parse_records(
+    records: Iterable[dict],
+    budget: Optional[MemoryBudget] = None,
+    stats: Optional[Stats] = None,
+    progress: Optional[Progress] = None,
+) -> Iterable[dict]:
+    # Without a budget everything is kept in lists. With a budget the groups
+    # and the sorted output spill to disk and the result is a lazy iterator.
+    # Once cancellation is requested, only the records normalized so far are
+    # kept.
+    stats = stats if stats is not None else Stats(enabled=False)
+    progress = progress if progress is not None else Progress(enabled=False)
+    people: Union[list[dict], SpillBuffer]
+    buddies: Union[list[dict], SpillBuffer]
+    reply_chains: Union[list[dict], SpillBuffer]
+    conversations: Union[list[dict], SpillBuffer]
+    if budget is None:
+        people, buddies, reply_chains, conversations = [], [], [], []
+    else:
+        people, buddies, reply_chains, conversations = (
+            SpillBuffer(budget) for _ in range(4)
+        )
+
+    with stats.stage("normalization"):
+        for r in records:
+            store = r.get("store", "other")
+            if store == "people":
+                people.append(r)
+            elif store == "buddylist":
+                buddies.append(r)
+            elif store == "replychains":
+                reply_chains.append(r)
+            elif store == "conversations":
+                conversations.append(r)
+
+        # identify version
+        version = identify_teams_version(reply_chains)
+
+    # Progress counts the extracted records as they are normalized
+    groups = [
+        ("people", people, _parse_people(progress.track(people, "people"), version)),
+        (
+            "buddylist",
+            buddies,
+            _parse_buddies(progress.track(buddies, "buddylist"), version),
+        ),
+        (
+            "replychains",
+            reply_chains,
+            _parse_reply_chains(progress.track(reply_chains, "replychains"), version),
+        ),
+        (
+            "conversations",
+            conversations,
+            _parse_conversations(
+                progress.track(conversations, "conversations"), version
+            ),
+        ),
+    ]
+
+    if budget is None:
+        # sort within groups i.e., Contacts, Meetings, Conversations
+        parsed_records = []
+        for store_name, _, group in groups:
+            with stats.stage("normalization", store_name) as store_stats:
+                normalized = list(group)
+                store_stats.records += len(normalized)
+            with stats.stage("dedup", store_name) as store_stats:
+                unique = set(normalized)
+                store_stats.records += len(unique)
+            with stats.stage("sort", store_name) as store_stats:
+                parsed_records += sorted(unique)
+                store_stats.records += len(unique)
+        with stats.stage("normalization"):
+            return [r.to_dict() for r in parsed_records]
+    return _merge_groups(groups, budget, stats)
+
+
+def _merge_groups(
+    groups: list[tuple[str, Union[list[dict], SpillBuffer], Iterator[Any]]],
+    budget: MemoryBudget,
+    stats: Stats,
+) -> Iterator[dict]:
+    # Sort and deduplicate each group through an external merge sort. Runs
+    # spilled while normalizing are sorted and deduplicated right away, the
+    # sort stage covers the in-memory rest. The final merge is lazy, so the
+    # dedup stage measures it in batches, which the write stage includes.
+    for store_name, source, group in groups:
+        sorted_group = SpillBuffer(budget, sort=True)
+        with stats.stage("normalization", store_name) as store_stats:
+            for r in group:
+                sorted_group.append(r)
+            store_stats.records += len(sorted_group)
+        if isinstance(source, SpillBuffer):
+            source.close()
+        for r in _merge(sorted_group, store_name, stats):
+            yield r.to_dict()
+        sorted_group.close()
+
+
+def _merge(group: SpillBuffer, store_name: str, stats: Stats) -> Iterator[Any]:
+    # Merge a sorted SpillBuffer under the sort and dedup stages
+    with stats.stage("sort", store_name) as store_stats:
+        merged = iter(group)
+        store_stats.records += len(group)
+    while True:
+        with stats.stage("dedup", store_name) as store_stats:
+            batch = list(itertools.islice(merged, MERGE_BATCH_SIZE))
+            store_stats.records += len(batch)
+        if not batch:
+            return
+        yield from batch
+
+
+def normalize_records(
+    records: Iterable[dict],
+    budget: Optional[MemoryBudget] = None,
+    stats: Optional[Stats] = None,
+) -> Iterator[dict]:
+    # Streaming counterpart of parse_records with the same output. Records are
+    # normalized as they arrive. Only reply chains differ between the Teams
+    # versions, so the others are normalized as v1 until the first reply
+    # chain gave away the version. Should it be unknown, the buddies and
+    # meetings normalized so far are dropped again, like they would have
+    # been. The groups are sorted once the records ran out.
+    stats = stats if stats is not None else Stats(enabled=False)
+    parsers: dict[str, Callable[[Iterable[dict], str], Iterator[Any]]] = {
+        "people": _parse_people,
+        "buddylist": _parse_buddies,
+        "replychains": _parse_reply_chains,
+        "conversations": _parse_conversations,
+    }
+
+    def new_group() -> Union[set[Any], SpillBuffer]:
+        return set() if budget is None else SpillBuffer(budget, sort=True)
+
+    groups = {store: new_group() for store in parsers}
+    version: Optional[str] = None
+    # Per store the records that would have been reported as of an unknown
+    # version and the models normalized as v1
+    unknown = {"people": 0, "buddylist": 0, "conversations": 0}
+    provisional = {"people": 0, "buddylist": 0, "conversations": 0}
+
+    def normalize(r: dict, version: str) -> int:
+        group = groups[r["store"]]
+        add = group.add if isinstance(group, set) else group.append
+        models = 0
+        for models, model in enumerate(parsers[r["store"]]([r], version), start=1):
+            add(model)
+        return models
+
+    def settle(version: str) -> int:
+        # Returns the number of models dropped again
+        if version in ("v1", "v2"):
+            return 0
+        for store, name in (
+            ("people", "people"),
+            ("buddylist", "buddies"),
+            ("conversations", "meeting"),
+        ):
+            for _ in range(unknown[store]):
+                print(
+                    f"Teams Version is unknown. Can not extract records of type {name}."
+                )
+        for store in ("buddylist", "conversations"):
+            group = groups[store]
+            if isinstance(group, SpillBuffer):
+                group.close()
+            groups[store] = new_group()
+        return provisional["buddylist"] + provisional["conversations"]
+
+    with stats.stage("normalization") as stage_stats:
+        normalized = 0
+        for r in records:
+            store = r.get("store", "other")
+            if store not in parsers:
+                continue
+            if version is None and store == "replychains":
+                # identify version
+                version = identify_teams_version([r])
+                normalized -= settle(version)
+            has_value = r["value"] is not None
+            models = normalize(r, "v1" if version is None else version)
+            normalized += models
+            if version is None:
+                unknown[store] += models if store == "people" else has_value
+                provisional[store] += models
+        if version is None:
+            normalized -= settle(identify_teams_version([]))
+        stage_stats.records += normalized
 
+    # sort within groups i.e., Contacts, Meetings, Conversations
+    for store_name, group in groups.items():
+        if isinstance(group, set):
+            with stats.stage("sort", store_name) as store_stats:
+                ordered = sorted(group)
+                store_stats.records += len(ordered)
+            group.clear()
+            for model in ordered:
+                yield model.to_dict()
+        else:
+            for model in _merge(group, store_name, stats):
+                yield model.to_dict()
+            group.close()
+
+
+def _extracted(records: Iterable[dict], progress: Progress) -> Iterator[dict]:
+    # The input of the normalization stage of a pipeline. It keeps up with
+    # extraction, so progress moves on to normalization once all records
+    # were extracted, like it does without a pipeline.
+    extracted = 0
     for r in records:
-        store = r.get("store", "other")
-        if store == "people":
-            people.append(r)
-        elif store == "buddylist":
-            buddies.append(r)
-        elif store == "replychains":
-            reply_chains.append(r)
-        elif store == "conversations":
-            conversations.append(r)
-
-    # identify version
-    version = identify_teams_version(reply_chains)
+        extracted += 1
+        yield r
+    progress.start("normalization", total=extracted)
+    progress.advance(extracted)
 
-    # sort within groups i.e., Contacts, Meetings, Conversations
-    parsed_records = (
-        sorted(_parse_people(people, version))
-        + sorted(_parse_buddies(buddies, version))
-        + sorted(_parse_reply_chains(reply_chains, version))
-        + sorted(_parse_conversations(conversations, version))
-    )
-    return [r.to_dict() for r in parsed_records]
+
+def _normalized(records: Iterable[dict], progress: Progress) -> Iterator[dict]:
+    # The input of the write stage of a pipeline. Writing starts once
+    # normalization sorted its first group, out of about as many records as
+    # were extracted. Whatever was normalized is written even when cancelled.
+    records = iter(records)
+    first = next(records, None)
+    if first is None:
+        progress.start("write", total=0)
+        return
+    progress.start("write", total=progress.total, estimated=True)
+    yield from progress.track(itertools.chain([first], records), cancellable=False)
 
 
 def process_db(
-    input_path: Path,
+    input_path: Union[Path, "SourceFolder"],
     output_path: Path,
     blob_path: Optional[Path] = None,
     filter_db_results: Optional[bool] = True,
+    max_memory: Optional[int] = None,
+    stats: Optional[Stats] = None,
+    shard: bool = False,
+    line_delimited: bool = False,
+    progress: Optional[Progress] = None,
+    hash_sources: bool = False,
+    prefetch: Optional[int] = None,
+    pipeline: bool = False,
+    sinks: Optional[list[Sink]] = None,
+    chunk_records: Optional[int] = None,
+    chunk_bytes: Optional[int] = None,
+    compression: Optional[str] = None,
 ) -> None:
-    if not input_path.parts[-1].endswith(".leveldb"):
+    if not Path(input_path).name.endswith(".leveldb"):
         raise ValueError(f"Expected a leveldb folder. Path: {input_path}")
 
     if blob_path is not None and not blob_path.parts[-1].endswith(".blob"):
         raise ValueError(f"Expected a .blob folder. Path: {blob_path}")
 
-    extracted_values = parse_db(input_path, blob_path, filter_db_results)
-    parsed_records = parse_records(extracted_values)
-    write_results_to_json(parsed_records, output_path)
+    chunked = chunk_records is not None or chunk_bytes is not None
+    if shard and chunked:
+        raise ValueError("The output can either be sharded or chunked.")
+    if compression is not None and (shard or chunked):
+        raise ValueError("Only a single output file can be compressed.")
+
+    # The output in the requested format, along with any further sinks
+    output: Sink
+    if shard:
+        output = ShardSink(output_path, line_delimited)
+    elif chunked:
+        output = ChunkSink(output_path, chunk_records, chunk_bytes, line_delimited)
+    elif compression is not None:
+        output = CompressedSink(output_path, compression, line_delimited)
+    elif line_delimited:
+        output = JsonLinesSink(output_path)
+    else:
+        output = JsonSink(output_path)
+    outputs = [output, *(sinks or [])]
+
+    budget = MemoryBudget(max_memory) if max_memory is not None else None
+    progress = progress if progress is not None else Progress(enabled=False)
+    hashes = None
+    if hash_sources:
+        from forensicsim.hashing import SourceHashes
+
+        hashes = SourceHashes(stats)
+
+    if pipeline:
+        from forensicsim.pipeline import Pipeline
+
+        # Extraction, normalization and writing run on threads of their own
+        written = Pipeline(
+            [
+                (
+                    "extraction",
+                    lambda _, s: iter_db(
+                        input_path,
+                        blob_path,
+                        filter_db_results,
+                        s,
+                        progress,
+                        hashes,
+                        prefetch,
+                    ),
+                ),
+                (
+                    "normalization",
+                    lambda records, s: normalize_records(
+                        _extracted(records, progress), budget, s
+                    ),
+                ),
+                (
+                    "write",
+                    lambda records, s: write_to_sinks(
+                        _normalized(records, progress), outputs, s, progress
+                    ),
+                ),
+            ],
+            stats,
+        ).run()
+        if hashes is not None and blob_path is not None:
+            hashes.hash_folder(blob_path)
+    else:
+        extracted_values = parse_db(
+            input_path,
+            blob_path,
+            filter_db_results,
+            budget,
+            stats,
+            progress,
+            hashes,
+            prefetch,
+        )
+        if hashes is not None and blob_path is not None:
+            hashes.hash_folder(blob_path)
+        extracted = len(extracted_values)
+        progress.start("normalization", total=extracted)
+        parsed_records = parse_records(extracted_values, budget, stats, progress)
+        if isinstance(extracted_values, SpillBuffer):
+            extracted_values.close()
+        if isinstance(parsed_records, list):
+            progress.start("write", total=len(parsed_records))
+        else:
+            progress.start("write", total=extracted, estimated=True)
+        # Whatever was extracted and normalized is written even when cancelled
+        parsed_records = progress.track(parsed_records, cancellable=False)
+        write_to_sinks(parsed_records, outputs, stats, progress)
+        written = progress.done
+
+    if hashes is not None:
+        # Next to the output, keyed like the origin_file of the records
+        hashes.write(
+            output_path / SOURCES_MANIFEST
+            if shard or chunked
+            else output_path.with_suffix(".sources.json")
+        )
+
+    if budget is not None:
+        budget.close()
+        if stats is not None:
+            stats.count("spills", budget.spills)
+            stats.count("spilled_bytes", budget.spilled_bytes)
+        # Spilling costs time, so a budget always tells how much it spilled.
+        # stderr carries nothing but JSON lines while progress is reported.
+        if progress.enabled:
+            progress.emit({
+                "event": "spills",
+                "spills": budget.spills,
+                "spilled_bytes": budget.spilled_bytes,
+            })
+        else:
+            print(
+                f"Spilled {budget.spills} runs of {budget.spilled_bytes} bytes "
+                f"to stay within the memory budget of {budget.limit} bytes.",
+                file=sys.stderr,
+            )
+
+    progress.finish(records=written)
@@ -0,0 +1,182 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+from collections.abc import Iterable, Iterator, Sequence
+from typing import Any, Callable, Optional
+
+from forensicsim.stats import StageStats, Stats
+
+# Batches held by each queue between two stages, and records per batch. The
+# records in flight are bounded by the number of queues times their product.
+PIPELINE_QUEUE_SIZE = 8
+PIPELINE_BATCH_SIZE = 256
+# Interval in seconds at which blocked stages check whether to give up
+_POLL_INTERVAL = 0.1
+
+# A stage is called with the items of the previous stage and its own Stats,
+# whatever it returns is passed on to the next stage
+Stage = tuple[str, Callable[[Iterator[Any], Stats], Optional[Iterable[Any]]]]
+
+
+class _Stopped(Exception):
+    pass
+
+
+class _End:
+    pass
+
+
+class Pipeline:
+    """Runs stages on threads of their own, connected by bounded queues.
+
+    A stage that gets ahead of the next one blocks once the queue between
+    them is full, so no stage runs away with memory. Every stage measures
+    how long it waited for its input and for room in its output. Once a
+    stage fails, the others give up and the first error is raised again by
+    :meth:`run`.
+    """
+
+    def __init__(
+        self,
+        stages: Sequence[Stage],
+        stats: Optional[Stats] = None,
+        queue_size: int = PIPELINE_QUEUE_SIZE,
+        batch_size: int = PIPELINE_BATCH_SIZE,
+    ) -> None:
+        self.stages = stages
+        self.stats = stats if stats is not None else Stats(enabled=False)
+        self.batch_size = batch_size
+        self._queues: list[queue.Queue[Any]] = [
+            queue.Queue(maxsize=queue_size) for _ in stages[1:]
+        ]
+        self._stopped = threading.Event()
+        self._errors: list[BaseException] = []
+        self._results = [StageStats() for _ in stages]
+        # Stats is not thread-safe, every stage gets its own
+        self._stats = [Stats(enabled=self.stats.enabled) for _ in stages]
+
+    def run(self) -> int:
+        """Run all stages, returns the number of items the last one took."""
+        threads = [
+            threading.Thread(
+                target=self._run_stage, args=(i,), name=f"pipeline-{name}", daemon=True
+            )
+            for i, (name, _) in enumerate(self.stages)
+        ]
+        with self.stats.stage("pipeline") as pipeline_stats:
+            for thread in threads:
+                thread.start()
+            try:
+                for thread in threads:
+                    thread.join()
+            except BaseException:
+                # Stages blocked on a queue give up, the others are daemons
+                self._stopped.set()
+                raise
+        for (name, _), result, stage_stats in zip(
+            self.stages, self._results, self._stats
+        ):
+            result.busy = (
+                max(
+                    0.0, 1 - (result.input_wait + result.output_wait) / result.wall_time
+                )
+                if result.wall_time
+                else 0.0
+            )
+            pipeline_stats.stores[name] = result
+            self.stats.merge(stage_stats)
+        pipeline_stats.records += self._results[-1].records
+        if self._errors:
+            raise self._errors[0]
+        return self._results[-1].records
+
+    def _run_stage(self, i: int) -> None:
+        _, function = self.stages[i]
+        result = self._results[i]
+        start = time.perf_counter()
+        output = None
+        try:
+            items = self._iterate(i - 1, result) if i else iter(())
+            output = function(items, self._stats[i])
+            if output is None:
+                output = ()
+            if i == len(self.stages) - 1:
+                deque(output, maxlen=0)
+                return
+            batch = []
+            for item in output:
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    self._put(i, batch, result)
+                    batch = []
+            self._put(i, batch, result)
+            self._put(i, _End, result)
+        except _Stopped:
+            pass
+        except BaseException as e:
+            self._errors.append(e)
+            self._stopped.set()
+        finally:
+            close = getattr(output, "close", None)
+            if close is not None:
+                close()
+            result.wall_time = time.perf_counter() - start
+            # Nothing is taken from the queues once the last stage is done
+            if i == len(self.stages) - 1:
+                self._stopped.set()
+
+    def _iterate(self, i: int, result: StageStats) -> Iterator[Any]:
+        # Items of stage i, as taken from the queue after it
+        while True:
+            start = time.perf_counter()
+            while True:
+                try:
+                    batch = self._queues[i].get(timeout=_POLL_INTERVAL)
+                    break
+                except queue.Empty:
+                    if self._stopped.is_set():
+                        raise _Stopped from None
+            result.input_wait += time.perf_counter() - start
+            if batch is _End:
+                return
+            if i == len(self.stages) - 2:
+                result.records += len(batch)
+            yield from batch
+
+    def _put(self, i: int, batch: Any, result: StageStats) -> None:
+        start = time.perf_counter()
+        while True:
+            try:
+                self._queues[i].put(batch, timeout=_POLL_INTERVAL)
+                break
+            except queue.Full:
+                if self._stopped.is_set():
+                    raise _Stopped from None
+        result.output_wait += time.perf_counter() - start
+        if batch is not _End:
+            result.records += len(batch)
@@ -0,0 +1,148 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import io
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import IO, TYPE_CHECKING, Any, Optional
+
+from forensicsim.stats import Stats
+
+if TYPE_CHECKING:
+    from forensicsim.archive import SourceFolder
+
+# Threads reading ahead at most, slow storage rarely gains from more
+PREFETCH_WORKERS = 4
+PREFETCH_CHUNK_SIZE = 1024 * 1024
+
+
+class Prefetcher:
+    """Reads the data files of a folder ahead of the parser.
+
+    Files are read in :meth:`SourceFolder.read_order` on a thread pool and
+    thrown away, so that the parser finds them in the page cache of the OS
+    rather than waiting for slow storage. Whenever the parser starts reading
+    the data of one of them, up to ``window`` of the files following it are
+    read ahead. Opening a file does not count, ccl_chromium_reader opens
+    every file and reads the index of every table before it parses any.
+    """
+
+    def __init__(
+        self,
+        folder: "SourceFolder",
+        window: int,
+        stats: Optional[Stats] = None,
+        workers: int = PREFETCH_WORKERS,
+    ) -> None:
+        self.folder = folder
+        self.window = window
+        self.stats = stats if stats is not None else Stats(enabled=False)
+        self.order = folder.read_order()
+        self._index = {name: i for i, name in enumerate(self.order)}
+        self._submitted = 0
+        self._read: list[int] = []
+        self._futures: list[Future[None]] = []
+        self._closed = threading.Event()
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(1, min(window, workers)),
+            thread_name_prefix="forensicsim-prefetch",
+        )
+        self._submit_until(window)
+
+    def reader(self, name: str, f: IO[bytes]) -> IO[bytes]:
+        # Data files are read through a _ReadTracker, all others as they are
+        if name not in self._index:
+            return f
+        return io.BufferedReader(_ReadTracker(f, self, name))
+
+    def reading(self, name: str) -> None:
+        # Move the window along, files read out of order leave it alone
+        self._submit_until(self._index[name] + 1 + self.window)
+
+    def close(self) -> None:
+        # Files being read are given up after their current chunk
+        self._closed.set()
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        errors = sum(
+            1
+            for future in self._futures
+            if not future.cancelled() and future.exception() is not None
+        )
+        self.stats.count("prefetched_files", len(self._read))
+        self.stats.count("prefetched_bytes", sum(self._read))
+        if errors:
+            self.stats.count("prefetch_errors", errors)
+
+    def _submit_until(self, end: int) -> None:
+        while self._submitted < min(end, len(self.order)):
+            name = self.order[self._submitted]
+            self._futures.append(self._pool.submit(self._read_ahead, name))
+            self._submitted += 1
+
+    def _read_ahead(self, name: str) -> None:
+        # A failed read is left to the parser, which reports it when it
+        # reads the file itself
+        size = 0
+        with self.folder.open_raw(name) as f:
+            while not self._closed.is_set():
+                chunk = f.read(PREFETCH_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+        self._read.append(size)
+
+
+class _ReadTracker(io.RawIOBase):
+    # Passes reads through and tells the prefetcher once a file is read from
+    # its start. The records of logs and tables are read from there, the
+    # footer and index of a table from its end.
+
+    def __init__(self, f: IO[bytes], prefetcher: Prefetcher, name: str) -> None:
+        self._f = f
+        self._prefetcher = prefetcher
+        self._name: Optional[str] = name
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._f.tell()
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._f.seek(offset, whence)
+
+    def readinto(self, buffer: Any) -> int:
+        if self._name is not None and self._f.tell() == 0:
+            self._prefetcher.reading(self._name)
+            self._name = None
+        data = self._f.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def close(self) -> None:
+        self._f.close()
+        super().close()
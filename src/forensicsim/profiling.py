@@ -0,0 +1,102 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import cProfile
+import io
+import json
+import pstats
+import tracemalloc
+from collections.abc import Generator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+from forensicsim.stats import Stats
+
+
+@contextmanager
+def profile(
+    outputpath: Path,
+    top: int = 20,
+    trace_memory: bool = False,
+    stats: Optional[Stats] = None,
+) -> Generator[None, None, None]:
+    """Profile the enclosed block and write the results next to ``outputpath``.
+
+    Writes ``<output>.prof`` (loadable with :mod:`pstats` or snakeviz) and a
+    ``<output>.prof.txt`` hotspot summary, which is also printed. With
+    ``trace_memory`` tracemalloc runs as well, so that ``stats`` records the
+    traced peak of every stage, and ``<output>.memory.json`` lists those
+    peaks together with the top allocation sites.
+    """
+    profiler = cProfile.Profile()
+    if trace_memory:
+        tracemalloc.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(_sibling(outputpath, ".prof"))
+
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats(
+            pstats.SortKey.CUMULATIVE
+        ).print_stats(top)
+        _write_text(_sibling(outputpath, ".prof.txt"), summary.getvalue())
+        print(summary.getvalue())
+
+        if trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            traced_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            memory = {
+                "traced_peak": traced_peak,
+                "stages": {
+                    name: stage.to_dict()
+                    for name, stage in (stats.stages if stats else {}).items()
+                },
+                "top_allocations": [
+                    {
+                        "location": str(stat.traceback),
+                        "size": stat.size,
+                        "count": stat.count,
+                    }
+                    for stat in snapshot.statistics("lineno")[:top]
+                ],
+            }
+            _write_text(
+                _sibling(outputpath, ".memory.json"), json.dumps(memory, indent=4)
+            )
+
+
+def _sibling(outputpath: Path, suffix: str) -> Path:
+    return outputpath.with_name(outputpath.name + suffix)
+
+
+def _write_text(outputpath: Path, text: str) -> None:
+    try:
+        outputpath.write_text(text, encoding="utf-8")
+    except OSError as e:
+        print(e)
@@ -0,0 +1,189 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import sys
+import time
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Optional, TextIO, TypeVar, Union
+
+if TYPE_CHECKING:
+    from forensicsim.archive import SourceFolder
+
+T = TypeVar("T")
+
+# Share of the overall progress covered by each stage of process_db
+STAGE_RANGES = {
+    "extraction": (0.0, 0.7),
+    "normalization": (0.7, 0.85),
+    "write": (0.85, 1.0),
+}
+
+# Rough size of a record on disk, used to estimate the number of records of a
+# LevelDB folder from the size of its files
+ESTIMATED_RECORD_SIZE = 2048
+
+
+class Progress:
+    """Reports progress as JSON lines and carries cooperative cancellation.
+
+    Every event is a JSON object on its own line of ``stream``, stderr by
+    default. Progress events are sent at most every ``interval`` seconds,
+    stage changes and the final event right away. Creating ``cancel_file``
+    asks the run to stop, which is checked at the same interval. Only the
+    stage running at that time stops early, later stages still process what
+    it delivered, so partial results are written. A disabled instance sends
+    no events, but still honours the cancel file.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        cancel_file: Optional[Path] = None,
+        stream: Optional[TextIO] = None,
+        interval: float = 0.5,
+    ) -> None:
+        self.enabled = enabled
+        self.cancel_file = cancel_file
+        self.stream = stream
+        self.interval = interval
+        self.stage: Optional[str] = None
+        self.store: Optional[str] = None
+        self.done = 0
+        self.total: Optional[int] = None
+        self.estimated = False
+        self._cancelled = False
+        self._cancelled_stage: Optional[str] = None
+        self._next_check = 0.0
+
+    @property
+    def cancelled(self) -> bool:
+        if not self._cancelled and self.cancel_file is not None:
+            now = time.monotonic()
+            if now >= self._next_check:
+                self._next_check = now + self.interval
+                if self.cancel_file.exists():
+                    self.cancel()
+        return self._cancelled
+
+    def cancel(self) -> None:
+        if not self._cancelled:
+            self._cancelled = True
+            self._cancelled_stage = self.stage
+
+    def start(
+        self, stage: str, total: Optional[int] = None, estimated: bool = False
+    ) -> None:
+        self.stage = stage
+        self.store = None
+        self.done = 0
+        self.total = total
+        self.estimated = estimated
+        self._emit_progress()
+
+    def track(
+        self,
+        iterable: Iterable[T],
+        store: Optional[str] = None,
+        cancellable: bool = True,
+    ) -> Iterable[T]:
+        """Count the items of ``iterable`` towards the current stage.
+
+        Unless ``cancellable`` is false, the iteration ends early once
+        cancellation was requested within the current stage, so the caller
+        keeps what it got so far. A disabled instance without a cancel file
+        returns ``iterable`` itself, which costs nothing per item.
+        """
+        self.store = store
+        if cancellable and self._stop():
+            return ()
+        if not self.enabled and self.cancel_file is None:
+            return iterable
+        return self._track(iterable, cancellable)
+
+    def _track(self, iterable: Iterable[T], cancellable: bool) -> Iterator[T]:
+        next_event = time.monotonic() + self.interval
+        for item in iterable:
+            yield item
+            self.done += 1
+            now = time.monotonic()
+            if now >= next_event:
+                next_event = now + self.interval
+                self._emit_progress()
+                if cancellable and self._stop():
+                    return
+
+    def advance(self, count: int) -> None:
+        # Count items processed without track() towards the current stage
+        self.done += count
+        self._emit_progress()
+
+    def _stop(self) -> bool:
+        return self.cancelled and self._cancelled_stage == self.stage
+
+    def finish(self, **fields: Any) -> None:
+        event = "cancelled" if self._cancelled else "finished"
+        self.emit({"event": event, **fields})
+
+    def percent(self) -> Optional[float]:
+        if self.stage not in STAGE_RANGES:
+            return None
+        low, high = STAGE_RANGES[self.stage]
+        if not self.total:
+            return round(low * 100, 1)
+        # Estimated totals may be exceeded, keep some room until the stage ends
+        share = min(self.done / self.total, 0.99 if self.estimated else 1.0)
+        return round((low + (high - low) * share) * 100, 1)
+
+    def emit(self, event: dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        stream = self.stream if self.stream is not None else sys.stderr
+        stream.write(json.dumps(event) + "\n")
+        stream.flush()
+
+    def _emit_progress(self) -> None:
+        self.emit({
+            "event": "progress",
+            "stage": self.stage,
+            "store": self.store,
+            "done": self.done,
+            "total": self.total,
+            "estimated": self.estimated,
+            "percent": self.percent(),
+        })
+
+
+def estimate_records(*paths: Union[Path, "SourceFolder", None]) -> int:
+    # Number of records a LevelDB folder probably holds, from its file sizes
+    size = 0
+    for path in paths:
+        if path is None:
+            continue
+        try:
+            size += sum(f.stat().st_size for f in path.iterdir() if f.is_file())
+        except OSError:
+            continue
+    return max(1, size // ESTIMATED_RECORD_SIZE)
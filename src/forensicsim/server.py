@@ -0,0 +1,234 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import contextlib
+import importlib
+import json
+import socket
+import struct
+import sys
+import time
+import traceback
+from pathlib import Path
+from typing import Any, BinaryIO, Optional
+
+from forensicsim import __version__
+from forensicsim.backend import ParquetSink, Sink, SqliteSink
+from forensicsim.leveldb import live_files
+from forensicsim.parser import process_db
+from forensicsim.progress import Progress
+from forensicsim.stats import Stats
+
+# Every frame is a 4 byte big endian length followed by a UTF-8 JSON object
+FRAME_HEADER = struct.Struct(">I")
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def read_frame(stream: BinaryIO) -> Optional[dict[str, Any]]:
+    """Read one request, returns None once the client closed the stream."""
+    header = _read_exactly(stream, FRAME_HEADER.size)
+    if header is None:
+        return None
+    (size,) = FRAME_HEADER.unpack(header)
+    if size > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame of {size} bytes exceeds {MAX_FRAME_SIZE} bytes.")
+    payload = _read_exactly(stream, size)
+    if payload is None:
+        raise ProtocolError("Stream ended within a frame.")
+    try:
+        message = json.loads(payload.decode("utf-8"))
+    except ValueError as e:
+        raise ProtocolError(f"Frame is not valid JSON: {e}") from e
+    if not isinstance(message, dict):
+        raise ProtocolError("Frame is not a JSON object.")
+    return message
+
+
+def write_frame(stream: BinaryIO, message: dict[str, Any]) -> None:
+    payload = json.dumps(message, default=str).encode("utf-8")
+    stream.write(FRAME_HEADER.pack(len(payload)) + payload)
+    stream.flush()
+
+
+def _read_exactly(stream: BinaryIO, size: int) -> Optional[bytes]:
+    data = b""
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            if data:
+                raise ProtocolError("Stream ended within a frame.")
+            return None
+        data += chunk
+    return data
+
+
+def handle(request: dict[str, Any]) -> dict[str, Any]:
+    """Run a single request and build its response.
+
+    ``parse`` takes the same arguments as ``process_db``: ``filepath``,
+    ``outputpath`` and optionally ``blobpath``, ``max_memory`` in bytes,
+    ``shard``, ``line_delimited``, ``hash_sources``, ``prefetch``,
+    ``pipeline``, ``chunk_records``, ``chunk_bytes`` and ``compression``.
+    ``sqlite`` and ``parquet`` name further outputs the records are written
+    to in the same pass. With ``progress`` set, progress events are written
+    to stderr as JSON lines. A job that was cancelled through its
+    ``cancel_file`` is answered with the status ``cancelled``.
+
+    ``files`` returns the files a LevelDB ``directory`` needs to be parsed,
+    see :func:`forensicsim.leveldb.live_files`. ``names`` is the listing of
+    the original folder, so only CURRENT and the MANIFEST have to be in
+    ``directory`` yet.
+    """
+    command = request.get("command")
+    if command == "ping":
+        return {"status": "ok", "version": __version__}
+    if command == "shutdown":
+        return {"status": "ok"}
+    if command == "files":
+        return _handle_files(request)
+    if command != "parse":
+        return {"status": "error", "error": f"Unknown command: {command!r}"}
+
+    try:
+        filepath = Path(request["filepath"])
+        outputpath = Path(request["outputpath"])
+    except (KeyError, TypeError) as e:
+        return {"status": "error", "error": f"Missing or invalid argument: {e}"}
+    blobpath = request.get("blobpath")
+    cancel_file = request.get("cancel_file")
+    progress = Progress(
+        enabled=bool(request.get("progress")),
+        cancel_file=Path(cancel_file) if cancel_file else None,
+    )
+    stats = Stats()
+    start = time.perf_counter()
+    try:
+        sinks: list[Sink] = []
+        if request.get("sqlite"):
+            sinks.append(SqliteSink(Path(request["sqlite"])))
+        if request.get("parquet"):
+            sinks.append(ParquetSink(Path(request["parquet"])))
+        process_db(
+            filepath,
+            outputpath,
+            Path(blobpath) if blobpath else None,
+            filter_db_results=True,
+            max_memory=request.get("max_memory"),
+            stats=stats,
+            shard=bool(request.get("shard")),
+            line_delimited=bool(request.get("line_delimited")),
+            progress=progress,
+            hash_sources=bool(request.get("hash_sources")),
+            prefetch=request.get("prefetch"),
+            pipeline=bool(request.get("pipeline")),
+            sinks=sinks,
+            chunk_records=request.get("chunk_records"),
+            chunk_bytes=request.get("chunk_bytes"),
+            compression=request.get("compression"),
+        )
+    except Exception as e:
+        # A broken database must not take the server and its warm state down
+        traceback.print_exc(file=sys.stderr)
+        return {"status": "error", "error": f"{type(e).__name__}: {e}"}
+    return {
+        "status": "cancelled" if progress.cancelled else "ok",
+        "seconds": round(time.perf_counter() - start, 6),
+        "stats": stats.to_dict(),
+    }
+
+
+def _handle_files(request: dict[str, Any]) -> dict[str, Any]:
+    try:
+        directory = Path(request["directory"])
+    except (KeyError, TypeError) as e:
+        return {"status": "error", "error": f"Missing or invalid argument: {e}"}
+    try:
+        return {"status": "ok", **live_files(directory, request.get("names"))}
+    except (OSError, ValueError) as e:
+        return {"status": "error", "error": f"{type(e).__name__}: {e}"}
+
+
+def serve(reader: BinaryIO, writer: BinaryIO) -> bool:
+    """Answer requests until the stream ends or a client asks to shut down.
+
+    Returns True if the server was asked to shut down. The ``id`` of each
+    request, if any, is echoed in its response.
+    """
+    while True:
+        try:
+            request = read_frame(reader)
+        except ProtocolError as e:
+            # The stream can not be resynchronised after a broken frame
+            write_frame(writer, {"status": "error", "error": str(e)})
+            return False
+        if request is None:
+            return False
+        # Anything printed while parsing would corrupt the frames on stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            response = handle(request)
+        if "id" in request:
+            response["id"] = request["id"]
+        write_frame(writer, response)
+        if request.get("command") == "shutdown":
+            return True
+
+
+def warm_up() -> None:
+    # The heavy dependencies are imported lazily, load them before the
+    # first job instead of within it
+    for module in (
+        "ccl_chromium_reader.ccl_chromium_indexeddb",
+        "forensicsim.models",
+        "bs4",
+    ):
+        importlib.import_module(module)
+
+
+def serve_stdio() -> None:
+    warm_up()
+    serve(sys.stdin.buffer, sys.stdout.buffer)
+
+
+def serve_socket(port: int, host: str = "127.0.0.1") -> None:
+    """Serve clients one after the other on a local TCP socket."""
+    warm_up()
+    with socket.create_server((host, port)) as server:
+        print(
+            f"Listening on {host}:{server.getsockname()[1]}",
+            file=sys.stderr,
+            flush=True,
+        )
+        while True:
+            connection, _ = server.accept()
+            with (
+                connection,
+                connection.makefile("rb") as reader,
+                connection.makefile("wb") as writer,
+            ):
+                if serve(reader, writer):
+                    return
@@ -0,0 +1,238 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import sys
+import time
+import tracemalloc
+from collections.abc import Generator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+from forensicsim import __version__
+
+
+@dataclass
+class StageStats:
+    wall_time: float = 0.0
+    records: int = 0
+    bytes_read: int = 0
+    peak_rss: int = 0
+    traced_peak: int = 0
+    # Time spent waiting on the neighbouring stages of a pipeline
+    input_wait: float = 0.0
+    output_wait: float = 0.0
+    busy: Optional[float] = None
+    stores: dict[str, "StageStats"] = field(default_factory=dict)
+
+    def to_dict(self) -> dict[str, Any]:
+        result: dict[str, Any] = {
+            "wall_time": round(self.wall_time, 6),
+            "records": self.records,
+            "records_per_second": (
+                round(self.records / self.wall_time, 2) if self.wall_time else None
+            ),
+            "bytes_read": self.bytes_read,
+            "peak_rss": self.peak_rss,
+        }
+        if self.traced_peak:
+            result["traced_peak"] = self.traced_peak
+        if self.busy is not None:
+            result["input_wait"] = round(self.input_wait, 6)
+            result["output_wait"] = round(self.output_wait, 6)
+            result["busy"] = round(self.busy, 4)
+        if self.stores:
+            result["stores"] = {
+                name: store.to_dict() for name, store in self.stores.items()
+            }
+        return result
+
+
+class Stats:
+    """Collects wall time, record counts, bytes read and peak RSS per stage.
+
+    Stages are measured around whole loops, never per record, so the
+    callers only add their record counts once a loop has finished. A
+    disabled instance hands out throwaway :class:`StageStats` objects and
+    takes no measurements at all.
+
+    While :mod:`tracemalloc` is tracing, every stage also records the peak
+    of traced memory reached while it ran.
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.stages: dict[str, StageStats] = {}
+        self.counters: dict[str, int] = {}
+        self._active: set[str] = set()
+        self._traced_peaks: list[int] = []
+
+    @contextmanager
+    def stage(
+        self, name: str, store: Optional[str] = None
+    ) -> Generator[StageStats, None, None]:
+        if not self.enabled:
+            yield StageStats()
+            return
+
+        stage = self.stages.setdefault(name, StageStats())
+        target = (
+            stage if store is None else stage.stores.setdefault(store, StageStats())
+        )
+        # Store level figures roll up into their stage, timings only if the
+        # stage is not measured around them already
+        roll_up = store is not None and name not in self._active
+        if store is None:
+            self._active.add(name)
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            self._enter_traced_stage()
+        records_before = target.records
+        start_read = read_bytes()
+        start_time = time.perf_counter()
+        try:
+            yield target
+        finally:
+            elapsed = time.perf_counter() - start_time
+            bytes_read = read_bytes() - start_read
+            rss = peak_rss()
+            traced_peak = self._exit_traced_stage() if tracing else 0
+            for s in (target, stage) if roll_up else (target,):
+                s.wall_time += elapsed
+                s.bytes_read += bytes_read
+                s.peak_rss = max(s.peak_rss, rss)
+                s.traced_peak = max(s.traced_peak, traced_peak)
+            if store is None:
+                self._active.discard(name)
+            else:
+                stage.records += target.records - records_before
+
+    def _enter_traced_stage(self) -> None:
+        # tracemalloc keeps a single peak, so the enclosing stage's peak so
+        # far is carried on a stack before it is reset for the new stage
+        if self._traced_peaks:
+            self._traced_peaks[-1] = max(
+                self._traced_peaks[-1], tracemalloc.get_traced_memory()[1]
+            )
+        self._traced_peaks.append(0)
+        tracemalloc.reset_peak()
+
+    def _exit_traced_stage(self) -> int:
+        peak = max(tracemalloc.get_traced_memory()[1], self._traced_peaks.pop())
+        if self._traced_peaks:
+            self._traced_peaks[-1] = max(self._traced_peaks[-1], peak)
+        return peak
+
+    def count(self, name: str, value: int = 1) -> None:
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def merge(self, other: "Stats") -> None:
+        # Takes over the figures of an instance used on another thread
+        self.stages.update(other.stages)
+        for name, value in other.counters.items():
+            self.count(name, value)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "version": __version__,
+            "stages": {name: stage.to_dict() for name, stage in self.stages.items()},
+            "counters": self.counters,
+        }
+
+    def write(self, outputpath: Path) -> None:
+        try:
+            with open(outputpath, "w", encoding="utf-8") as f:
+                json.dump(self.to_dict(), f, indent=4)
+        except OSError as e:
+            print(e)
+
+
+def peak_rss() -> int:
+    # Peak resident set size of the current process in bytes
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(
+            ctypes.windll.kernel32.GetCurrentProcess(),
+            ctypes.byref(counters),
+            counters.cb,
+        )
+        return int(counters.PeakWorkingSetSize)
+
+    import resource
+
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in KiB elsewhere
+    return int(maxrss if sys.platform == "darwin" else maxrss * 1024)
+
+
+def read_bytes() -> int:
+    # Bytes read by the current process so far, including page cache hits
+    if sys.platform == "win32":
+        import ctypes
+
+        class IoCounters(ctypes.Structure):
+            _fields_ = [
+                ("ReadOperationCount", ctypes.c_ulonglong),
+                ("WriteOperationCount", ctypes.c_ulonglong),
+                ("OtherOperationCount", ctypes.c_ulonglong),
+                ("ReadTransferCount", ctypes.c_ulonglong),
+                ("WriteTransferCount", ctypes.c_ulonglong),
+                ("OtherTransferCount", ctypes.c_ulonglong),
+            ]
+
+        counters = IoCounters()
+        ctypes.windll.kernel32.GetProcessIoCounters(
+            ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters)
+        )
+        return int(counters.ReadTransferCount)
+
+    try:
+        with open("/proc/self/io", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("rchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
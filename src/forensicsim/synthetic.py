@@ -0,0 +1,352 @@
+"""
+MIT License
+
+Copyright (c) 2021 Alexander Bilz
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import copy
+import html
+import itertools
+import json
+import random
+import uuid
+from calendar import timegm
+from collections.abc import Iterator
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Optional
+
+# The two lab accounts the population scripts were played back with. Account
+# "0" is the owner of the synthetic profile.
+ACCOUNTS = {
+    "0": {
+        "mri": "8:orgid:4d3a5ae0-2a4b-4b8e-9d46-0b1e7e3f0a01",
+        "displayName": "Jane Doe",
+        "email": "jane.doe@forensics.im",
+        "userPrincipalName": "jane.doe@forensics.im",
+    },
+    "1": {
+        "mri": "8:orgid:9b1c2f4e-7d6a-4c1b-8e2f-3a5d6c7b8e02",
+        "displayName": "John Doe",
+        "email": "john.doe@forensics.im",
+        "userPrincipalName": "john.doe@forensics.im",
+    },
+}
+
+CALL_LOG_CONVERSATION = "48:calllogs"
+
+MESSAGE_TYPES = {"message", "comment", "post", "editedmessage", "editedcomment"}
+REACTION_TYPES = {"react", "postreaction", "commentreaction"}
+DELETE_TYPES = {"delete", "deletedcomment"}
+
+
+def load_population(directory: Path) -> list[dict[str, Any]]:
+    # Concatenate populationdata/batch<n>.json in batch order
+    script = []
+    batches = sorted(
+        directory.glob("batch*.json"), key=lambda p: int(p.stem[len("batch") :])
+    )
+    for batch in batches:
+        raw = batch.read_bytes()
+        try:
+            text = raw.decode("utf-8")
+        except UnicodeDecodeError:
+            # Some batches were saved with a Windows code page
+            text = raw.decode("cp1252")
+        script.extend(json.loads(text))
+    if not script:
+        raise ValueError(f"No population batches found. Path: {directory}")
+    return script
+
+
+def generate_records(
+    script: list[dict[str, Any]],
+    messages: int,
+    version: str = "v2",
+    messages_per_chain: int = 20,
+    conversations: int = 10,
+    contacts: int = 50,
+    duplicates: float = 0.1,
+    seed: int = 0,
+) -> Iterator[dict[str, Any]]:
+    """Expand a population script into raw records as returned by ``parse_db``.
+
+    The script is replayed until ``messages`` messages exist, shifting its
+    timestamps on every pass. Messages are spread over ``conversations``
+    chats and grouped into reply chains of ``messages_per_chain``; a share
+    of ``duplicates`` reply chains is emitted a second time from a ``.log``
+    file, like an uncompacted older copy. Reactions, media, deletions,
+    calls and appointments of the script become emotions, files, delete
+    times, call logs and meetings. People, buddy list and conversation
+    records are emitted after the reply chains.
+    """
+    if version not in {"v1", "v2"}:
+        raise ValueError(f"Unknown Teams version: {version}")
+
+    rng = random.Random(seed)
+    chats = [_conversation_id(rng) for _ in range(max(1, conversations))]
+    first = _parse_time(script[0]["Time"])
+    span = _parse_time(script[-1]["Time"]) - first + 86400
+
+    chain: dict[str, dict[str, Any]] = {}
+    chain_conversation = chats[0]
+    chain_no = 0
+    call_start: Optional[int] = None
+    meetings = []
+    last_message: Optional[dict[str, Any]] = None
+    produced = 0
+
+    for replay in itertools.count():
+        for entry in script:
+            if produced >= messages:
+                break
+            timestamp = (_parse_time(entry["Time"]) + replay * span) * 1000
+            sender = ACCOUNTS[entry["Account"]]
+            is_from_me = entry["Account"] == "0"
+            kind = entry["Type"]
+
+            if kind in REACTION_TYPES and last_message is not None:
+                _add_emotion(last_message, sender["mri"], timestamp)
+                continue
+            if kind in DELETE_TYPES and last_message is not None:
+                last_message["properties"]["deletetime"] = str(timestamp)
+                continue
+            if kind == "startcall":
+                call_start = timestamp
+                continue
+            if kind == "appointment":
+                meetings.append(_meeting(rng, entry, timestamp))
+                continue
+
+            properties: dict[str, Any] = {}
+            conversation_id = chain_conversation
+            content = html.escape(entry["Content"])
+            if kind == "media":
+                name = entry["Content"].split("\\")[-1]
+                properties["files"] = json.dumps([
+                    {
+                        "fileName": name,
+                        "objectUrl": f"https://forensicsim-my.sharepoint.com/personal/{name}",
+                    }
+                ])
+                content = name
+            elif kind == "endcall" and call_start is not None:
+                properties["call-log"] = json.dumps({
+                    "startTime": _iso(call_start),
+                    "endTime": _iso(timestamp),
+                    "callDirection": "outgoing" if is_from_me else "incoming",
+                    "callType": "twoParty",
+                    "callState": "accepted",
+                    "originator": sender["mri"],
+                    "target": ACCOUNTS["1" if is_from_me else "0"]["mri"],
+                })
+                conversation_id = CALL_LOG_CONVERSATION
+                content = ""
+                call_start = None
+            elif kind not in MESSAGE_TYPES:
+                continue
+
+            last_message = _message(
+                rng,
+                version,
+                sender["mri"],
+                is_from_me,
+                conversation_id,
+                f"<div>{content}</div>",
+                timestamp,
+                properties,
+            )
+            chain[str(timestamp * 1000 + produced % 1000)] = last_message
+            produced += 1
+
+            if len(chain) >= messages_per_chain:
+                yield from _reply_chains(chain, version, chain_no, rng, duplicates)
+                chain = {}
+                chain_no += 1
+                chain_conversation = chats[chain_no % len(chats)]
+                last_message = None
+        else:
+            continue
+        break
+
+    if chain:
+        yield from _reply_chains(chain, version, chain_no, rng, duplicates)
+
+    yield from _people(contacts, rng)
+    yield _record(
+        "buddylist",
+        "buddylist",
+        {"buddies": [dict(a) for a in ACCOUNTS.values()]},
+        _ldb_file(0),
+    )
+    for n, chat in enumerate(chats):
+        yield _record(
+            "conversations",
+            chat,
+            {"id": chat, "type": "Chat", "threadProperties": {}, "version": n},
+            _ldb_file(n),
+        )
+    for meeting in meetings:
+        yield _record("conversations", meeting["id"], meeting, _ldb_file(0))
+
+
+def _record(store: str, key: str, value: Any, origin_file: str) -> dict[str, Any]:
+    return {
+        "key": key.encode("utf-8"),
+        "value": value,
+        "origin_file": origin_file,
+        "store": store,
+        "state": None,
+        "seq": None,
+    }
+
+
+def _reply_chains(
+    chain: dict[str, dict[str, Any]],
+    version: str,
+    chain_no: int,
+    rng: random.Random,
+    duplicates: float,
+) -> Iterator[dict[str, Any]]:
+    conversation_id = next(iter(chain.values()))["conversationId"]
+    value = {
+        "conversationId": conversation_id,
+        "replyChainId": str(chain_no),
+        "messages" if version == "v1" else "messageMap": chain,
+    }
+    record = _record(
+        "replychains", f"{conversation_id};{chain_no}", value, _ldb_file(chain_no)
+    )
+    yield record
+    if rng.random() < duplicates:
+        older = copy.deepcopy(record)
+        older["origin_file"] = "000003.log"
+        yield older
+
+
+def _message(
+    rng: random.Random,
+    version: str,
+    creator: str,
+    is_from_me: bool,
+    conversation_id: str,
+    content: str,
+    timestamp: int,
+    properties: dict[str, Any],
+) -> dict[str, Any]:
+    client_message_id = str(rng.getrandbits(63))
+    if version == "v1":
+        return {
+            "cachedDeduplicationKey": creator + client_message_id,
+            "clientmessageid": client_message_id,
+            "composetime": _iso(timestamp),
+            "contenttype": "text",
+            "createdTime": timestamp,
+            "isFromMe": is_from_me,
+            "messageKind": "skypeMessageLocal",
+            "messagetype": "RichText/Html",
+            "originalarrivaltime": _iso(timestamp),
+            "clientArrivalTime": _iso(timestamp),
+            "creator": creator,
+            "conversationId": conversation_id,
+            "content": content,
+            "version": timestamp,
+            "properties": properties,
+        }
+    return {
+        "dedupeKey": creator + client_message_id,
+        "clientMessageId": client_message_id,
+        "clientArrivalTime": timestamp,
+        "contentType": "RichText/Html",
+        "isSentByCurrentUser": is_from_me,
+        "messageType": "RichText/Html",
+        "originalArrivalTime": timestamp,
+        "creator": creator,
+        "conversationId": conversation_id,
+        "content": content,
+        "version": timestamp,
+        "properties": properties,
+    }
+
+
+def _add_emotion(message: dict[str, Any], mri: str, timestamp: int) -> None:
+    emotions = json.loads(message["properties"].get("emotions", "[]"))
+    emotions.append({
+        "key": "like",
+        "users": [{"mri": mri, "time": timestamp, "value": str(timestamp)}],
+    })
+    message["properties"]["emotions"] = json.dumps(emotions)
+
+
+def _meeting(
+    rng: random.Random, entry: dict[str, Any], timestamp: int
+) -> dict[str, Any]:
+    meeting_id = f"19:meeting_{uuid.UUID(int=rng.getrandbits(128)).hex}@thread.v2"
+    return {
+        "id": meeting_id,
+        "type": "Meeting",
+        "version": timestamp,
+        "members": [{"id": a["mri"], "role": "Admin"} for a in ACCOUNTS.values()],
+        "threadProperties": {
+            "meeting": json.dumps({
+                "startTime": _iso(timestamp + 3600 * 1000),
+                "endTime": _iso(timestamp + 5400 * 1000),
+                "subject": entry["Content"],
+                "organizerId": ACCOUNTS[entry["Account"]]["mri"].split(":")[-1],
+            })
+        },
+    }
+
+
+def _people(contacts: int, rng: random.Random) -> Iterator[dict[str, Any]]:
+    people = [dict(a) for a in ACCOUNTS.values()]
+    for n in range(contacts):
+        guid = uuid.UUID(int=rng.getrandbits(128))
+        people.append({
+            "mri": f"8:orgid:{guid}",
+            "displayName": f"Contact {n}",
+            "email": f"contact.{n}@forensics.im",
+            "userPrincipalName": f"contact.{n}@forensics.im",
+        })
+    for n, person in enumerate(people):
+        yield _record("people", person["mri"], person, _ldb_file(n))
+
+
+def _conversation_id(rng: random.Random) -> str:
+    return f"19:{uuid.UUID(int=rng.getrandbits(128)).hex}@unq.gbl.spaces"
+
+
+def _ldb_file(n: int) -> str:
+    # Spread records over a handful of table files
+    return f"{5 + n % 4:06d}.ldb"
+
+
+def _parse_time(value: str) -> int:
+    return timegm(datetime.strptime(value, "%Y-%m-%dT%H:%M:%S").timetuple())
+
+
+def _iso(timestamp: int) -> str:
+    return (
+        datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc).strftime(
+            "%Y-%m-%dT%H:%M:%S.%f"
+        )[:-3]
+        + "Z"
+    )
@@ -36,12 +36,25 @@ import calendar
 import inspect
 import json
 import os
+import time
 from datetime import datetime
 
+import jarray
+from java.io import BufferedInputStream
+from java.io import BufferedOutputStream
+from java.io import DataInputStream
+from java.io import BufferedReader
+from java.io import DataOutputStream
 from java.io import File
+from java.io import InputStreamReader
 from java.lang import ProcessBuilder
+from java.lang import String
+from java.lang import Thread
 from java.util import ArrayList
+from java.util.concurrent import TimeUnit
 from java.util.logging import Level
+from javax.swing import BoxLayout
+from javax.swing import JCheckBox
 from org.sleuthkit.autopsy.casemodule import Case
 from org.sleuthkit.autopsy.casemodule import NoCurrentCaseException
 from org.sleuthkit.autopsy.coreutils import ExecUtil
@@ -53,6 +66,8 @@ from org.sleuthkit.autopsy.ingest import DataSourceIngestModuleProcessTerminator
 from org.sleuthkit.autopsy.ingest import IngestMessage
 from org.sleuthkit.autopsy.ingest import IngestModule
 from org.sleuthkit.autopsy.ingest import IngestModuleFactoryAdapter
+from org.sleuthkit.autopsy.ingest import IngestModuleIngestJobSettings
+from org.sleuthkit.autopsy.ingest import IngestModuleIngestJobSettingsPanel
 from org.sleuthkit.autopsy.ingest import IngestServices
 from org.sleuthkit.autopsy.ingest.IngestModule import IngestModuleException
 from org.sleuthkit.datamodel import BlackboardArtifact
@@ -86,6 +101,19 @@ DIRECTORIES = [
     "https_teams.microsoft.com_0.indexeddb.leveldb",
     "https_teams.live.com_0.indexeddb.leveldb",
 ]
+# Part of the path that all of the directories above have in common
+LEVELDB_PATH_SUBSTRING = ".indexeddb.leveldb"
+# Number of records read from the parser output and posted at once
+BATCH_SIZE = 500
+# Seconds a cancelled parse may take to write its partial results
+CANCEL_TIMEOUT = 10
+# Units of the progress bar per database
+PROGRESS_PER_DATABASE = 100
+# Default of the ingest setting to only copy the files of the current LevelDB
+# version to the case temp directory. Obsolete tables and logs that were not yet
+# removed after a compaction can still hold older versions of records, so all
+# files are parsed unless the examiner opts out of them.
+EXTRACT_LIVE_FILES_ONLY = False
 
 
 # Factory that defines the name and details of the module and allows Autopsy
@@ -108,8 +136,56 @@ class ForensicIMIngestModuleFactory(IngestModuleFactoryAdapter):
     def isDataSourceIngestModuleFactory(self):
         return True
 
+    def getDefaultIngestJobSettings(self):
+        return ForensicIMIngestModuleSettings()
+
+    def hasIngestJobSettingsPanel(self):
+        return True
+
+    def getIngestJobSettingsPanel(self, settings):
+        if not isinstance(settings, ForensicIMIngestModuleSettings):
+            settings = ForensicIMIngestModuleSettings()
+        self.settings = settings
+        return ForensicIMIngestModuleSettingsPanel(self.settings)
+
     def createDataSourceIngestModule(self, ingestOptions):
-        return ForensicIMIngestModule(self.settings)
+        return ForensicIMIngestModule(ingestOptions)
+
+
+# Settings of an ingest job, kept by Autopsy between runs
+class ForensicIMIngestModuleSettings(IngestModuleIngestJobSettings):
+    serialVersionUID = 1
+
+    def __init__(self):
+        self.extract_live_files_only = EXTRACT_LIVE_FILES_ONLY
+
+    def getVersionNumber(self):
+        return self.serialVersionUID
+
+    def getExtractLiveFilesOnly(self):
+        return self.extract_live_files_only
+
+    def setExtractLiveFilesOnly(self, extract_live_files_only):
+        self.extract_live_files_only = extract_live_files_only
+
+
+# Panel shown when an ingest job is configured
+class ForensicIMIngestModuleSettingsPanel(IngestModuleIngestJobSettingsPanel):
+    def __init__(self, settings):
+        self.local_settings = settings
+        self.setLayout(BoxLayout(self, BoxLayout.Y_AXIS))
+        self.live_files_only = JCheckBox(
+            "Only parse the files of the current LevelDB version, skip obsolete tables and logs",
+            actionPerformed=self.live_files_only_changed,
+        )
+        self.live_files_only.setSelected(self.local_settings.getExtractLiveFilesOnly())
+        self.add(self.live_files_only)
+
+    def live_files_only_changed(self, event):
+        self.local_settings.setExtractLiveFilesOnly(self.live_files_only.isSelected())
+
+    def getSettings(self):
+        return self.local_settings
 
 
 # Data Source-level ingest module.  One gets created per data source.
@@ -126,6 +202,12 @@ class ForensicIMIngestModule(DataSourceIngestModule):
         self._logger = Logger.getLogger(self.__class__.__name__)
         self._logger.log(Level.SEVERE, "Starting Forensics.im Plugin")
         self.path_to_executable = None
+        self.parser_process = None
+        self.parser_input = None
+        self.parser_output = None
+        self.parser_events = None
+        self.progress = 0
+        self.level_db_files = {}
 
         communication_manager = (
             Case.getCurrentCase().getSleuthkitCase().getCommunicationsManager()
@@ -151,7 +233,14 @@ class ForensicIMIngestModule(DataSourceIngestModule):
                 "This plugin currently only works on Windows based systems."
             )
 
+        # The services blackboard only adds artifact and attribute types, artifacts
+        # are posted through the one of the case database
         blackboard = Case.getCurrentCase().getServices().getBlackboard()
+        # Cached, so that reactions and meetings do not look it up one by one
+        self.blackboard = Case.getCurrentCase().getSleuthkitCase().getBlackboard()
+        self.art_reaction = self.create_artifact_type(
+            "MST_REACTION", "Reactions", blackboard
+        )
 
         # reaction attributes
 
@@ -221,44 +310,141 @@ class ForensicIMIngestModule(DataSourceIngestModule):
             )
 
         # At first extract the desired artefacts to our newly created temp directory
-        self._extract(content, temp_path_to_content)
+        live_only = EXTRACT_LIVE_FILES_ONLY
+        if self.local_settings is not None:
+            live_only = self.local_settings.getExtractLiveFilesOnly()
+        self._extract(content, temp_path_to_content, live_only=live_only)
 
         # Finally we can parse the extracted artefacts
         self._analyze(content, temp_path_to_content, progress_bar)
 
-    def _extract(self, content, path):
+    def _extract(self, content, path, live_only=False):
         # This functions extracts the artefacts from the datasource
         try:
-            children = content.getChildren()
-            for child in children:
+            children = {}
+            for child in content.getChildren():
                 child_name = child.getName()
                 # Skip any unallocated files
                 if child.isMetaFlagSet(
                     TskData.TSK_FS_META_FLAG_ENUM.UNALLOC
                 ) or child.isDirNameFlagSet(TskData.TSK_FS_NAME_FLAG_ENUM.UNALLOC):
                     continue
-                child_path = os.path.join(path, child_name)
                 # ignore relative paths
                 if child_name == "." or child_name == "..":
                     continue
-                elif child.isFile():
+                children[child_name] = child
+            live_files = self._extract_live_files(children, path) if live_only else None
+            skipped = 0
+            for child_name, child in children.items():
+                child_path = os.path.join(path, child_name)
+                if child.isFile():
+                    if live_files is not None:
+                        if child_name not in live_files:
+                            skipped += 1
+                            continue
+                        # CURRENT and the MANIFEST are copied already
+                        if os.path.isfile(child_path):
+                            continue
                     ContentUtils.writeToFile(child, File(child_path))
                 elif child.isDir():
                     os.mkdir(child_path)
-                    self._extract(child, child_path)
-            self.log(Level.INFO, "Successfully extracted to {}".format(path))
+                    self._extract(child, child_path, live_only=False)
+            if live_files is not None:
+                self.log(
+                    Level.INFO,
+                    "Successfully extracted to {}, skipped {} of {} files as obsolete.".format(
+                        path, skipped, len(children)
+                    ),
+                )
+            else:
+                self.log(Level.INFO, "Successfully extracted to {}.".format(path))
         except OSError:
             raise IngestModuleException(
                 "Could not extract files to directory: {}.".format(path)
             )
 
+    def _extract_live_files(self, children, path):
+        # Copy CURRENT and the MANIFEST it names first and let the parser work out
+        # the live tables and logs from them. Returns the names of all files the
+        # database needs, or None if all files have to be copied.
+        current = children.get("CURRENT")
+        if current is None or not current.isFile():
+            return None
+        ContentUtils.writeToFile(current, File(os.path.join(path, "CURRENT")))
+        with open(os.path.join(path, "CURRENT"), "r") as current_file:
+            manifest = children.get(current_file.read().strip())
+        if manifest is None or not manifest.isFile():
+            return None
+        ContentUtils.writeToFile(manifest, File(os.path.join(path, manifest.getName())))
+        response = self._request_parser_server({
+            "command": "files",
+            "directory": path,
+            "names": list(children.keys()),
+        })
+        if response is None or response.get("status") != "ok":
+            self.log(
+                Level.INFO,
+                "Copying all files of {}, the live files are unknown: {}".format(
+                    path, response.get("error") if response else None
+                ),
+            )
+            return None
+        if response.get("missing"):
+            self.log(
+                Level.WARNING,
+                "Tables referenced by {} are missing: {}".format(
+                    response.get("manifest"), ", ".join(response["missing"])
+                ),
+            )
+        return set(response.get("files", []))
+
     def _analyze(self, content, path, progress_bar):
+        # The records are written as one shard per origin file and record type
+        path_to_teams_shards = os.path.join(path, "teams")
+        response = self._request_parser_server({
+            "command": "parse",
+            "filepath": path,
+            "outputpath": path_to_teams_shards,
+            "shard": True,
+            "line_delimited": True,
+            "progress": True,
+            "cancel_file": os.path.join(path, "cancel"),
+        }, progress_bar)
+        if self.context.isJobCancelled():
+            # The parser stopped early, the partial results are not imported
+            return
+        if response is None:
+            # Without a working server fall back to one run per database
+            self._execute_parser(path, path_to_teams_shards)
+        elif response.get("status") != "ok":
+            self.log(
+                Level.SEVERE,
+                "Parser server failed on {}: {}".format(path, response.get("error")),
+            )
+        else:
+            self.log(
+                Level.INFO,
+                "Parsed {} in {} seconds.".format(path, response.get("seconds")),
+            )
+
+        path_to_manifest = os.path.join(path_to_teams_shards, "manifest.json")
+        if not os.path.exists(path_to_manifest):
+            raise IngestModuleException("Unable to find extracted data.")
+
+        with open(path_to_manifest, "rb") as manifest_file:
+            manifest = json.load(manifest_file)
+
+        if manifest is not None:
+            self._process_shards(manifest, path_to_teams_shards, content, progress_bar)
+        else:
+            raise IngestModuleException("Extracted data is None.")
+
+    def _execute_parser(self, path, path_to_teams_shards):
         # Piece together our command for running parse.exe with the appropriate parameters
-        path_to_teams_json = os.path.join(path, "teams.json")
         self.log(
             Level.INFO,
-            "Executing {} with input path {} and output file {}.".format(
-                self.path_to_executable, path, path_to_teams_json
+            "Executing {} with input path {} and output folder {}.".format(
+                self.path_to_executable, path, path_to_teams_shards
             ),
         )
         cmd = ArrayList()
@@ -266,51 +452,137 @@ class ForensicIMIngestModule(DataSourceIngestModule):
         cmd.add("--filepath")
         cmd.add(path)
         cmd.add("--outputpath")
-        cmd.add(path_to_teams_json)
+        cmd.add(path_to_teams_shards)
+        cmd.add("--shard")
+        cmd.add("--jsonl")
         process_builder = ProcessBuilder(cmd)
         ExecUtil.execute(
             process_builder, DataSourceIngestModuleProcessTerminator(self.context)
         )
 
-        if not os.path.exists(path_to_teams_json):
-            raise IngestModuleException("Unable to find extracted data.")
+    def _start_parser_server(self):
+        # A single parser process is kept warm for all databases of the data source,
+        # so the executable is unpacked and its imports are loaded only once
+        cmd = ArrayList()
+        cmd.add(self.path_to_executable)
+        cmd.add("--serve")
+        process_builder = ProcessBuilder(cmd)
+        try:
+            self.parser_process = process_builder.start()
+        except Exception as e:
+            self.log(Level.WARNING, "Could not start parser server: {}".format(str(e)))
+            return False
+        self.parser_input = DataOutputStream(
+            BufferedOutputStream(self.parser_process.getOutputStream())
+        )
+        self.parser_output = DataInputStream(
+            BufferedInputStream(self.parser_process.getInputStream())
+        )
+        # Progress events and errors arrive on stderr, one per line
+        self.parser_events = BufferedReader(
+            InputStreamReader(self.parser_process.getErrorStream(), "UTF-8")
+        )
+        self.log(
+            Level.INFO, "Started parser server {}.".format(self.path_to_executable)
+        )
+        return True
 
-        imported_records = []
-        with open(path_to_teams_json, "rb") as json_file:
-            imported_records = json.load(json_file)
+    def _request_parser_server(self, request, progress_bar=None):
+        if self.parser_process is None and not self._start_parser_server():
+            return None
+        try:
+            self._write_parser_frame(request)
+            # Poll rather than block, so progress is reported while parsing and
+            # a cancelled job can ask the parser to stop early
+            cancelled_at = None
+            while self.parser_output.available() < 4:
+                self._read_parser_events(progress_bar)
+                if not self.parser_process.isAlive():
+                    self._stop_parser_server()
+                    return None
+                if self.context.isJobCancelled():
+                    if cancelled_at is None:
+                        cancelled_at = time.time()
+                        if request.get("cancel_file") is not None:
+                            open(request["cancel_file"], "w").close()
+                    elif time.time() - cancelled_at > CANCEL_TIMEOUT:
+                        self._stop_parser_server()
+                        return None
+                Thread.sleep(100)
+            self._read_parser_events(progress_bar)
+            payload = jarray.zeros(self.parser_output.readInt(), "b")
+            self.parser_output.readFully(payload)
+            return json.loads(String(payload, "UTF-8"))
+        except Exception as e:
+            self.log(Level.WARNING, "Parser server request failed: {}".format(str(e)))
+            self._stop_parser_server()
+            return None
+
+    def _write_parser_frame(self, request):
+        # Frames are a 4 byte big endian length followed by UTF-8 encoded JSON
+        payload = String(json.dumps(request)).getBytes("UTF-8")
+        self.parser_input.writeInt(len(payload))
+        self.parser_input.write(payload)
+        self.parser_input.flush()
+
+    def _read_parser_events(self, progress_bar):
+        while self.parser_events.ready():
+            line = self.parser_events.readLine()
+            if line is None:
+                return
+            try:
+                event = json.loads(line)
+            except ValueError:
+                event = None
+            if not isinstance(event, dict):
+                # Anything else on stderr are messages of the parser itself
+                self.log(Level.INFO, "ms_teams_parser: {}".format(line))
+            elif progress_bar is not None:
+                self.update_progress(progress_bar, event)
+
+    def _stop_parser_server(self):
+        if self.parser_process is None:
+            return
+        process = self.parser_process
+        self.parser_process = None
+        try:
+            if process.isAlive() and not self.context.isJobCancelled():
+                self._write_parser_frame({"command": "shutdown"})
+                self.parser_input.close()
+                process.waitFor(10, TimeUnit.SECONDS)
+        except Exception as e:
+            self.log(Level.INFO, "Could not shut down parser server: {}".format(str(e)))
+        finally:
+            process.destroy()
 
-        if imported_records is not None:
-            self._process_imported_records(imported_records, content, progress_bar)
-        else:
-            raise IngestModuleException("Extracted data is None.")
+    def shutDown(self):
+        self._stop_parser_server()
 
-    def _process_imported_records(self, imported_records, content, progress_bar):
+    def _process_shards(self, manifest, path_to_teams_shards, content, progress_bar):
         # Lets attribute the messages to their respective source files
-        database_sub_files = [
-            i
-            for n, i in enumerate(imported_records)
-            if "origin_file" in i and i.get("origin_file")
-            not in [y.get("origin_file") for y in imported_records[n + 1 :]]
-        ]
-        try:
-            for file in database_sub_files:
-                # Skip empty files as these are invalid records
-                if file["origin_file"] is None:
-                    continue
+        shards_per_file = {}
+        for shard in manifest["shards"]:
+            # Skip records without a file as these are invalid records
+            if shard["origin_file"] is None:
+                continue
+            shards_per_file.setdefault(shard["origin_file"], {})[
+                shard["record_type"]
+            ] = shard["file"]
 
+        try:
+            for origin_file, shards in shards_per_file.items():
                 user_account_instance = None
-                teams_leveldb_file_path = self.get_level_db_file(
-                    content, file["origin_file"]
-                )
+                teams_leveldb_file_path = self.get_level_db_file(content, origin_file)
 
-                # Get only the records per file
-                records = [
-                    d
-                    for d in imported_records
-                    if 'origin_file' in d and d["origin_file"] == file["origin_file"]
-                ]
                 try:
-                    user_account_instance = self.get_user_account(records)
+                    user_account_instance = self.get_user_account(
+                        next(
+                            self._read_batches(
+                                path_to_teams_shards, shards.get("contact")
+                            ),
+                            [],
+                        )
+                    )
                 except:
                     self._logger.log(
                         Level.WARNING,
@@ -334,26 +606,48 @@ class ForensicIMIngestModule(DataSourceIngestModule):
                         self.account,
                         user_account_instance,
                     )
-                # parse the remaining artefacts
+                # parse the remaining artefacts, one batch of records at a time
                 # contacts
-                contacts = [d for d in records if d["record_type"] == "contact"]
-                self.parse_contacts(contacts, helper)
+                for contacts in self._read_batches(
+                    path_to_teams_shards, shards.get("contact")
+                ):
+                    self.parse_contacts(contacts, helper)
 
                 # calllogs
-                calllogs = [d for d in records if d["record_type"] == "call"]
-                self.parse_calllogs(calllogs, helper)
+                for calls in self._read_batches(path_to_teams_shards, shards.get("call")):
+                    self.parse_calllogs(calls, helper)
 
                 # messages
-                messages = [d for d in records if d["record_type"] == "message"]
-                self.parse_messages(messages, helper, teams_leveldb_file_path)
+                for messages in self._read_batches(
+                    path_to_teams_shards, shards.get("message")
+                ):
+                    self.parse_messages(messages, helper, teams_leveldb_file_path)
 
                 # meetings does not have a convenient helper so we pass the file
-                meetings = [d for d in records if d["record_type"] == "meeting"]
-                self.parse_meetings(meetings, teams_leveldb_file_path)
+                for meetings in self._read_batches(
+                    path_to_teams_shards, shards.get("meeting")
+                ):
+                    self.parse_meetings(meetings, teams_leveldb_file_path)
 
         except NoCurrentCaseException as ex:
             self._logger.log(Level.WARNING, "No case currently open.", ex)
 
+    def _read_batches(self, path_to_teams_shards, shard_file):
+        # Shards hold one JSON record per line, read them in bounded batches
+        if shard_file is None:
+            return
+        batch = []
+        with open(os.path.join(path_to_teams_shards, shard_file), "rb") as json_file:
+            for line in json_file:
+                if not line.strip():
+                    continue
+                batch.append(json.loads(line))
+                if len(batch) >= BATCH_SIZE:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
     def parse_reaction(
         self,
         message_id,
@@ -364,14 +658,11 @@ class ForensicIMIngestModule(DataSourceIngestModule):
         activity,
         timestamp,
         database_file,
+        artifacts,
     ):
-        blackboard = Case.getCurrentCase().getServices().getBlackboard()
+        # The artifact is only created here, the caller posts the whole batch
         try:
-            self.art_meeting = self.create_artifact_type(
-                "MST_REACTION", "Reactions", blackboard
-            )
-
-            art = database_file.newArtifact(self.art_meeting.getTypeID())
+            art = database_file.newArtifact(self.art_reaction.getTypeID())
             # Add the subject as a test attribute to the artefact
             art.addAttribute(
                 BlackboardAttribute(
@@ -423,7 +714,7 @@ class ForensicIMIngestModule(DataSourceIngestModule):
                     timestamp,
                 )
             )
-            self.index_artifact(art)
+            artifacts.add(art)
         except TskCoreException as ex:
             # Severe error trying to add to case database.. case is not complete.
             # These exceptions are thrown by the CommunicationArtifactsHelper.
@@ -432,11 +723,6 @@ class ForensicIMIngestModule(DataSourceIngestModule):
                 "Failed to add message artifacts to the case database.",
                 ex,
             )
-        except BlackboardException as ex:
-            # Failed to post notification to blackboard
-            self._logger.log(
-                Level.WARNING, "Failed to post message artifact to the blackboard", ex
-            )
 
     def parse_contacts(self, contacts, helper):
         # Todo possibly write a owner parser overriding the TskContactsParser, problem is that it expects a resultset
@@ -519,6 +805,7 @@ class ForensicIMIngestModule(DataSourceIngestModule):
     def parse_messages(self, messages, helper, teams_leveldb_file_path):
         # Query for messages and iterate row by row adding
         # each message artifact
+        reactions = ArrayList()
         try:
             for message in messages:
 
@@ -588,6 +875,7 @@ class ForensicIMIngestModule(DataSourceIngestModule):
                                     emotion["key"],
                                     int(user["time"] / 1000),
                                     teams_leveldb_file_path,
+                                    reactions,
                                 )
                     # process the attachments
                     if "files" in message["properties"]:
@@ -598,7 +886,8 @@ class ForensicIMIngestModule(DataSourceIngestModule):
                     file_attachments, url_attachments
                 )
                 helper.addAttachments(artifact, message_attachments)
-          
+
+            self.post_artifacts(reactions)
         except TskCoreException as ex:
             # Severe error trying to add to case database.. case is not complete.
             # These exceptions are thrown by the CommunicationArtifactsHelper.
@@ -614,6 +903,7 @@ class ForensicIMIngestModule(DataSourceIngestModule):
             )
 
     def parse_meetings(self, meetings, database_file):
+        artifacts = ArrayList()
         try:
             for meeting in meetings:
                 # TSK_CALENDAR_ENTRY http://sleuthkit.org/sleuthkit/docs/jni-docs/4.6/artifact_catalog_page.html
@@ -671,7 +961,9 @@ class ForensicIMIngestModule(DataSourceIngestModule):
                         calendar_entry_organizer,
                     )
                 )
-                self.index_artifact(art)
+                artifacts.add(art)
+
+            self.post_artifacts(artifacts)
 
         except TskCoreException as ex:
             # Severe error trying to add to case database.. case is not complete.
@@ -687,37 +979,58 @@ class ForensicIMIngestModule(DataSourceIngestModule):
                 Level.WARNING, "Failed to post message artifact to the blackboard", ex
             )
 
-    def index_artifact(self, artifact):
-        # Index the artifact for keyword search
+    def post_artifacts(self, artifacts):
+        # Post and index a whole batch of artifacts for keyword search at once
+        if artifacts.isEmpty():
+            return
         try:
-            blackboard = Case.getCurrentCase().getServices().getBlackboard()
-            blackboard.indexArtifact(artifact)
+            self.blackboard.postArtifacts(
+                artifacts, ForensicIMIngestModuleFactory.moduleName
+            )
         except BlackboardException as ex:
-            self._logger.log(Level.SEVERE, "Failed to index artifact.", ex)
+            self._logger.log(
+                Level.WARNING,
+                "Failed to post {} artifacts to the blackboard".format(artifacts.size()),
+                ex,
+            )
 
     def get_user_account(self, records):
         # TODO Fix lookup mechanism
         return None
 
-    def update_progress(self, progress_bar, items_processed):
-        self.progress += items_processed
-        progress_bar.progress(self.progress)
+    def update_progress(self, progress_bar, event):
+        # The parser reports the progress of the current database in percent
+        if event.get("event") != "progress" or event.get("percent") is None:
+            return
+        progress_bar.progress(
+            "Parsing {} {}".format(event["stage"], event.get("store") or "").strip(),
+            self.progress + int(event["percent"] * PROGRESS_PER_DATABASE / 100),
+        )
 
     def get_level_db_file(self, content, filepath):
         # Get the file name
         filename = str(filepath).split("\\")[-1:][0]
-        file_manager = Case.getCurrentCase().getServices().getFileManager()
-        data_source = content.getDataSource()
         dir_name = os.path.join(content.getParentPath(), content.getName())
-        results = file_manager.findFiles(data_source, filename, dir_name)
-        if results.isEmpty():
+        db_file = self.level_db_files.get((dir_name, filename))
+        if db_file is None:
             self.log(Level.INFO, "Unable to locate {}".format(filename))
-            return
-        db_file = results.get(
-            0
-        )  # Expect a single match so retrieve the first (and only) file
         return db_file
 
+    def _list_level_db_files(self, file_manager, data_source):
+        # Look up every file below the LevelDB directories with a single query and
+        # index them by their directory and name
+        level_db_files = {}
+        for level_db_file in file_manager.findFiles(
+            data_source, "%", LEVELDB_PATH_SUBSTRING
+        ):
+            name = level_db_file.getName()
+            if name == "." or name == "..":
+                continue
+            parent_path = level_db_file.getParentPath().rstrip("/")
+            # Keep the first match, like the former per file lookup did
+            level_db_files.setdefault((parent_path, name), level_db_file)
+        return level_db_files
+
     def date_to_long(self, passed_date):
         try:
             # Newer versions store the dates as unix timestamps
@@ -779,7 +1092,7 @@ class ForensicIMIngestModule(DataSourceIngestModule):
         return attribute
 
     def process(self, data_source, progress_bar):
-        # we don't know how long it takes
+        # we don't know how long it takes until the databases are found
         progress_bar.switchToIndeterminate()
 
         # Locate the leveldb database. The full path on Windows systems is something like
@@ -788,9 +1101,21 @@ class ForensicIMIngestModule(DataSourceIngestModule):
         file_manager = Case.getCurrentCase().getServices().getFileManager()
 
         # There could be both personal and organisational clients on the matchine
-        for directory in DIRECTORIES:
-            all_ms_teams_leveldbs = file_manager.findFiles(data_source, directory)
+        leveldbs_per_directory = [
+            (directory, file_manager.findFiles(data_source, directory))
+            for directory in DIRECTORIES
+        ]
+        # The origin files of all databases are resolved from this listing
+        self.level_db_files = self._list_level_db_files(file_manager, data_source)
+        # Every database gets an equal share of the progress bar, which the
+        # progress events of the parser fill
+        databases_to_process = sum(len(found) for _, found in leveldbs_per_directory)
+        progress_bar.switchToDeterminate(
+            max(1, databases_to_process) * PROGRESS_PER_DATABASE
+        )
+        self.progress = 0
 
+        for directory, all_ms_teams_leveldbs in leveldbs_per_directory:
             # Loop over all the files. On a multi user account these could be multiple one.
             directories_to_process = len(all_ms_teams_leveldbs)
 
@@ -820,9 +1145,12 @@ class ForensicIMIngestModule(DataSourceIngestModule):
                 )
                 # Ignore false positives
                 if not content.isDir():
+                    self.progress += PROGRESS_PER_DATABASE
                     continue
                 # Where the REAL extraction and analysis happens
                 self._parse_databases(content, progress_bar)
+                self.progress += PROGRESS_PER_DATABASE
+                progress_bar.progress(self.progress)
 
         # Once we are done, post a message to the ingest messages box
         # Message type DATA seems most appropriate
@@ -22,35 +22,48 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+from contextlib import nullcontext
 from pathlib import Path
 from typing import Optional
 
 import click
 
-from forensicsim.backend import write_results_to_json
+from forensicsim.backend import (
+    COMPRESSIONS,
+    CompressedSink,
+    existing_source,
+    write_results_to_json,
+)
 from forensicsim.consts import DUMP_HEADER
 from forensicsim.parser import parse_db
+from forensicsim.profiling import profile
+from forensicsim.stats import Stats
 
 
 def process_level_db(
-    input_path: Path, output_path: Path, blob_path: Optional[Path] = None
+    input_path: Path,
+    output_path: Path,
+    blob_path: Optional[Path] = None,
+    stats: Optional[Stats] = None,
+    compression: Optional[str] = None,
 ) -> None:
     # convert the database to a python list with nested dictionaries
-    extracted_values = parse_db(input_path, blob_path, filter_db_results=False)
+    extracted_values = parse_db(
+        input_path, blob_path, filter_db_results=False, stats=stats
+    )
 
     # write the output to a json file
-    write_results_to_json(extracted_values, output_path)
+    write_results_to_json(extracted_values, output_path, stats, compression)
 
 
 @click.command()
 @click.option(
     "-f",
     "--filepath",
-    type=click.Path(
-        exists=True, readable=True, writable=False, dir_okay=True, path_type=Path
-    ),
+    type=click.Path(readable=True, writable=False, dir_okay=True, path_type=Path),
     required=True,
-    help="File path to the .leveldb folder of the IndexedDB.",
+    callback=existing_source,
+    help="File path to the .leveldb folder of the IndexedDB, also within a .zip or .tar archive.",
 )
 @click.option(
     "-o",
@@ -68,11 +81,65 @@ def process_level_db(
     required=False,
     help="File path to the .blob folder of the IndexedDB.",
 )
+@click.option(
+    "--compress",
+    "compression",
+    type=click.Choice(COMPRESSIONS),
+    required=False,
+    help="Compress the output in frames on a background thread and list them in an .index.json file next to it. zstd needs zstandard.",
+)
+@click.option(
+    "--stats",
+    "statspath",
+    type=click.Path(writable=True, path_type=Path),
+    required=False,
+    help="File path to a JSON report with per-stage timings and throughput.",
+)
+@click.option(
+    "--profile",
+    "profiling",
+    is_flag=True,
+    default=False,
+    help="Write cProfile stats and a hotspot summary next to the output file.",
+)
+@click.option(
+    "--profile-memory",
+    is_flag=True,
+    default=False,
+    help="With --profile, also record tracemalloc peak allocations per stage.",
+)
+@click.option(
+    "--profile-top",
+    type=click.IntRange(min=1),
+    default=20,
+    show_default=True,
+    help="Number of hotspots listed in the profile summary.",
+)
 def process_cmd(
-    filepath: Path, outputpath: Path, blobpath: Optional[Path] = None
+    filepath: Path,
+    outputpath: Path,
+    blobpath: Optional[Path] = None,
+    compression: Optional[str] = None,
+    statspath: Optional[Path] = None,
+    profiling: bool = False,
+    profile_memory: bool = False,
+    profile_top: int = 20,
 ) -> None:
     click.echo(DUMP_HEADER)
-    process_level_db(filepath, outputpath, blobpath)
+    if compression == "zstd":
+        try:
+            CompressedSink(outputpath, compression)
+        except ImportError as e:
+            raise click.BadParameter(str(e), param_hint="--compress") from e
+    stats = Stats(enabled=statspath is not None or profile_memory)
+    with (
+        profile(outputpath, profile_top, profile_memory, stats)
+        if profiling
+        else nullcontext()
+    ):
+        process_level_db(filepath, outputpath, blobpath, stats, compression)
+    if statspath is not None:
+        stats.write(statspath)
 
 
 if __name__ == "__main__":
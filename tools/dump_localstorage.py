@@ -22,28 +22,46 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+from contextlib import nullcontext
 from pathlib import Path
+from typing import Optional
 
 import click
 
-from forensicsim.backend import parse_localstorage, write_results_to_json
+from forensicsim.backend import (
+    existing_source,
+    parse_localstorage,
+    write_results_to_json,
+)
 from forensicsim.consts import DUMP_HEADER
+from forensicsim.profiling import profile
+from forensicsim.stats import Stats
 
 
-def process_db(filepath: Path, output_path: Path):
-    extracted_values = parse_localstorage(filepath)
-    write_results_to_json(extracted_values, output_path)
+def process_db(
+    filepath: Path,
+    output_path: Path,
+    stats: Optional[Stats] = None,
+    origins: tuple[str, ...] = (),
+    key_prefixes: tuple[str, ...] = (),
+    workers: int = 1,
+    large_value_size: Optional[int] = None,
+    paths: tuple[str, ...] = (),
+):
+    extracted_values = parse_localstorage(
+        filepath, stats, origins, key_prefixes, workers, large_value_size, paths
+    )
+    write_results_to_json(extracted_values, output_path, stats)
 
 
 @click.command()
 @click.option(
     "-f",
     "--filepath",
-    type=click.Path(
-        exists=True, readable=True, writable=False, dir_okay=True, path_type=Path
-    ),
+    type=click.Path(readable=True, writable=False, dir_okay=True, path_type=Path),
     required=True,
-    help="File path to the IndexedDB.",
+    callback=existing_source,
+    help="File path to the IndexedDB, also within a .zip or .tar archive.",
 )
 @click.option(
     "-o",
@@ -52,9 +70,96 @@ def process_db(filepath: Path, output_path: Path):
     required=True,
     help="File path to the processed output.",
 )
-def process_cmd(filepath: Path, outputpath: Path):
+@click.option(
+    "--origin",
+    "origins",
+    multiple=True,
+    help="Only dump records of this origin, e.g. https://teams.microsoft.com. Repeatable.",
+)
+@click.option(
+    "--key-prefix",
+    "key_prefixes",
+    multiple=True,
+    help="Only dump records whose key starts with this prefix. Repeatable.",
+)
+@click.option(
+    "--workers",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of processes decoding large values.",
+)
+@click.option(
+    "--large-value-size",
+    type=click.IntRange(min=1),
+    required=False,
+    help="Size in MiB from which values are passed through unchanged or only searched for --path.",
+)
+@click.option(
+    "--path",
+    "paths",
+    multiple=True,
+    help="JSON path to extract from large values, e.g. user.tenants.item.tenantId. Repeatable.",
+)
+@click.option(
+    "--stats",
+    "statspath",
+    type=click.Path(writable=True, path_type=Path),
+    required=False,
+    help="File path to a JSON report with per-stage timings and throughput.",
+)
+@click.option(
+    "--profile",
+    "profiling",
+    is_flag=True,
+    default=False,
+    help="Write cProfile stats and a hotspot summary next to the output file.",
+)
+@click.option(
+    "--profile-memory",
+    is_flag=True,
+    default=False,
+    help="With --profile, also record tracemalloc peak allocations per stage.",
+)
+@click.option(
+    "--profile-top",
+    type=click.IntRange(min=1),
+    default=20,
+    show_default=True,
+    help="Number of hotspots listed in the profile summary.",
+)
+def process_cmd(
+    filepath: Path,
+    outputpath: Path,
+    origins: tuple[str, ...],
+    key_prefixes: tuple[str, ...],
+    workers: int,
+    large_value_size: Optional[int],
+    paths: tuple[str, ...],
+    statspath: Optional[Path],
+    profiling: bool,
+    profile_memory: bool,
+    profile_top: int,
+):
     click.echo(DUMP_HEADER)
-    process_db(filepath, outputpath)
+    stats = Stats(enabled=statspath is not None or profile_memory)
+    with (
+        profile(outputpath, profile_top, profile_memory, stats)
+        if profiling
+        else nullcontext()
+    ):
+        process_db(
+            filepath,
+            outputpath,
+            stats,
+            origins,
+            key_prefixes,
+            workers,
+            large_value_size * 1024 * 1024 if large_value_size is not None else None,
+            paths,
+        )
+    if statspath is not None:
+        stats.write(statspath)
 
 
 if __name__ == "__main__":
@@ -22,28 +22,46 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+from contextlib import nullcontext
 from pathlib import Path
+from typing import Optional
 
 import click
 
-from forensicsim.backend import parse_sessionstorage, write_results_to_json
+from forensicsim.backend import (
+    existing_source,
+    parse_sessionstorage,
+    write_results_to_json,
+    write_results_to_jsonl,
+)
 from forensicsim.consts import DUMP_HEADER
+from forensicsim.profiling import profile
+from forensicsim.stats import Stats
 
 
-def process_db(input_path: Path, output_path: Path):
-    extracted_values = parse_sessionstorage(input_path)
-    write_results_to_json(extracted_values, output_path)
+def process_db(
+    input_path: Path,
+    output_path: Path,
+    stats: Optional[Stats] = None,
+    hosts: tuple[str, ...] = (),
+    namespaces: tuple[str, ...] = (),
+    line_delimited: bool = False,
+):
+    extracted_values = parse_sessionstorage(input_path, stats, hosts, namespaces)
+    if line_delimited:
+        write_results_to_jsonl(extracted_values, output_path, stats)
+    else:
+        write_results_to_json(extracted_values, output_path, stats)
 
 
 @click.command()
 @click.option(
     "-f",
     "--filepath",
-    type=click.Path(
-        exists=True, readable=True, writable=False, dir_okay=True, path_type=Path
-    ),
+    type=click.Path(readable=True, writable=False, dir_okay=True, path_type=Path),
     required=True,
-    help="File path to the IndexedDB.",
+    callback=existing_source,
+    help="File path to the IndexedDB, also within a .zip or .tar archive.",
 )
 @click.option(
     "-o",
@@ -52,9 +70,73 @@ def process_db(input_path: Path, output_path: Path):
     required=True,
     help="File path to the processed output.",
 )
-def process_cmd(filepath, outputpath):
+@click.option(
+    "--host",
+    "hosts",
+    multiple=True,
+    help="Only dump values of this host, e.g. https://teams.microsoft.com. Repeatable.",
+)
+@click.option(
+    "--namespace",
+    "namespaces",
+    multiple=True,
+    help="Only dump values of the session with this namespace GUID. Repeatable.",
+)
+@click.option(
+    "--jsonl",
+    "line_delimited",
+    is_flag=True,
+    default=False,
+    help="Write JSON Lines, one record per line, instead of a JSON array.",
+)
+@click.option(
+    "--stats",
+    "statspath",
+    type=click.Path(writable=True, path_type=Path),
+    required=False,
+    help="File path to a JSON report with per-stage timings and throughput.",
+)
+@click.option(
+    "--profile",
+    "profiling",
+    is_flag=True,
+    default=False,
+    help="Write cProfile stats and a hotspot summary next to the output file.",
+)
+@click.option(
+    "--profile-memory",
+    is_flag=True,
+    default=False,
+    help="With --profile, also record tracemalloc peak allocations per stage.",
+)
+@click.option(
+    "--profile-top",
+    type=click.IntRange(min=1),
+    default=20,
+    show_default=True,
+    help="Number of hotspots listed in the profile summary.",
+)
+def process_cmd(
+    filepath,
+    outputpath,
+    hosts,
+    namespaces,
+    line_delimited,
+    statspath,
+    profiling,
+    profile_memory,
+    profile_top,
+):
     click.echo(DUMP_HEADER)
-    process_db(filepath, outputpath)
+    stats = Stats(enabled=statspath is not None or profile_memory)
+    with (
+        profile(outputpath, profile_top, profile_memory, stats)
+        if profiling
+        else nullcontext()
+    ):
+        process_db(filepath, outputpath, stats, hosts, namespaces, line_delimited)
+    if statspath is not None:
+        stats.write(statspath)
 
 
 if __name__ == "__main__":
@@ -22,23 +22,47 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+from contextlib import nullcontext
 from pathlib import Path
+from typing import Optional
 
 import click
 
+from forensicsim.backend import (
+    COMPRESSIONS,
+    CompressedSink,
+    ParquetSink,
+    Sink,
+    SqliteSink,
+    existing_source,
+)
 from forensicsim.consts import XTRACT_HEADER
 from forensicsim.parser import process_db
+from forensicsim.profiling import profile
+from forensicsim.progress import Progress
+from forensicsim.server import serve_socket, serve_stdio
+from forensicsim.stats import Stats
+
+
+def _serve(ctx: click.Context, param: click.Parameter, value: Optional[int]) -> None:
+    # Runs before the required options are checked, like --help does
+    if value is None or ctx.resilient_parsing:
+        return
+    if param.name == "serve":
+        serve_stdio()
+    else:
+        serve_socket(value)
+    ctx.exit()
 
 
 @click.command()
 @click.option(
     "-f",
     "--filepath",
-    type=click.Path(
-        exists=True, readable=True, writable=False, dir_okay=True, path_type=Path
-    ),
+    type=click.Path(readable=True, writable=False, dir_okay=True, path_type=Path),
     required=True,
-    help="File path to the .leveldb folder of the IndexedDB.",
+    callback=existing_source,
+    help="File path to the .leveldb folder of the IndexedDB, also within a .zip or .tar archive.",
 )
 @click.option(
     "-o",
@@ -56,9 +80,202 @@ from forensicsim.parser import process_db
     required=False,
     help="File path to the .blob folder of the IndexedDB.",
 )
-def process_cmd(filepath: Path, outputpath: Path, blobpath: Path) -> None:
+@click.option(
+    "--max-memory",
+    type=click.IntRange(min=1),
+    required=False,
+    help="Memory budget in MiB for buffered records. Records beyond it are spilled to temporary files.",
+)
+@click.option(
+    "--shard",
+    is_flag=True,
+    default=False,
+    help="Treat the output path as a folder and write one JSON file per origin file and record type plus a manifest.json.",
+)
+@click.option(
+    "--jsonl",
+    "line_delimited",
+    is_flag=True,
+    default=False,
+    help="Write JSON Lines, one record per line, instead of a JSON array.",
+)
+@click.option(
+    "--compress",
+    "compression",
+    type=click.Choice(COMPRESSIONS),
+    required=False,
+    help="Compress the output in frames on a background thread and list them in an .index.json file next to it. zstd needs zstandard.",
+)
+@click.option(
+    "--chunk-records",
+    type=click.IntRange(min=1),
+    required=False,
+    help="Treat the output path as a folder and start a new numbered chunk file after this many records, listed in a manifest.json.",
+)
+@click.option(
+    "--chunk-size",
+    type=click.IntRange(min=1),
+    required=False,
+    help="Like --chunk-records, but start a new chunk before one would exceed this many MiB.",
+)
+@click.option(
+    "--sqlite",
+    "sqlitepath",
+    type=click.Path(dir_okay=False, writable=True, path_type=Path),
+    required=False,
+    help="Also write the records to this SQLite database, one table per record type.",
+)
+@click.option(
+    "--parquet",
+    "parquetpath",
+    type=click.Path(file_okay=False, writable=True, path_type=Path),
+    required=False,
+    help="Also write the records to this folder, one Parquet file per record type. Needs pyarrow.",
+)
+@click.option(
+    "--hash-sources",
+    is_flag=True,
+    default=False,
+    help="Hash every source file with SHA-256 while it is parsed and write the digests, keyed like origin_file, to a .sources.json file next to the output (sources.json with --shard).",
+)
+@click.option(
+    "--prefetch",
+    type=click.IntRange(min=1),
+    required=False,
+    help="Read up to this many LevelDB files ahead of the parser on background threads, for evidence on slow storage.",
+)
+@click.option(
+    "--pipeline",
+    is_flag=True,
+    default=False,
+    help="Run extraction, normalization and writing concurrently on threads connected by bounded queues.",
+)
+@click.option(
+    "--progress",
+    "report_progress",
+    is_flag=True,
+    default=False,
+    help="Report progress events as JSON lines on stderr.",
+)
+@click.option(
+    "--cancel-file",
+    type=click.Path(dir_okay=False, path_type=Path),
+    required=False,
+    help="Stop early and write the records parsed so far once this file exists.",
+)
+@click.option(
+    "--stats",
+    "statspath",
+    type=click.Path(writable=True, path_type=Path),
+    required=False,
+    help="File path to a JSON report with per-stage timings and throughput.",
+)
+@click.option(
+    "--serve",
+    is_flag=True,
+    flag_value=0,
+    default=None,
+    is_eager=True,
+    expose_value=False,
+    callback=_serve,
+    help="Keep running and take parse jobs as length-prefixed JSON frames on stdin, answering on stdout.",
+)
+@click.option(
+    "--serve-port",
+    type=click.IntRange(min=0, max=65535),
+    is_eager=True,
+    expose_value=False,
+    callback=_serve,
+    help="Like --serve, but take jobs on a socket bound to this port on 127.0.0.1.",
+)
+@click.option(
+    "--profile",
+    "profiling",
+    is_flag=True,
+    default=False,
+    help="Write cProfile stats and a hotspot summary next to the output file.",
+)
+@click.option(
+    "--profile-memory",
+    is_flag=True,
+    default=False,
+    help="With --profile, also record tracemalloc peak allocations per stage.",
+)
+@click.option(
+    "--profile-top",
+    type=click.IntRange(min=1),
+    default=20,
+    show_default=True,
+    help="Number of hotspots listed in the profile summary.",
+)
+def process_cmd(
+    filepath: Path,
+    outputpath: Path,
+    blobpath: Path,
+    max_memory: Optional[int],
+    shard: bool,
+    line_delimited: bool,
+    compression: Optional[str],
+    chunk_records: Optional[int],
+    chunk_size: Optional[int],
+    sqlitepath: Optional[Path],
+    parquetpath: Optional[Path],
+    hash_sources: bool,
+    prefetch: Optional[int],
+    pipeline: bool,
+    report_progress: bool,
+    cancel_file: Optional[Path],
+    statspath: Optional[Path],
+    profiling: bool,
+    profile_memory: bool,
+    profile_top: int,
+) -> None:
     click.echo(XTRACT_HEADER)
-    process_db(filepath, outputpath, blobpath, filter_db_results=True)
+    if shard and (chunk_records is not None or chunk_size is not None):
+        raise click.UsageError("--shard can not be combined with chunks.")
+    if compression is not None and (
+        shard or chunk_records is not None or chunk_size is not None
+    ):
+        raise click.UsageError("--compress only applies to a single output file.")
+    if compression == "zstd":
+        try:
+            CompressedSink(outputpath, compression)
+        except ImportError as e:
+            raise click.BadParameter(str(e), param_hint="--compress") from e
+    sinks: list[Sink] = []
+    if sqlitepath is not None:
+        sinks.append(SqliteSink(sqlitepath))
+    if parquetpath is not None:
+        try:
+            sinks.append(ParquetSink(parquetpath))
+        except ImportError as e:
+            raise click.BadParameter(str(e), param_hint="--parquet") from e
+    stats = Stats(enabled=statspath is not None or profile_memory)
+    with (
+        profile(outputpath, profile_top, profile_memory, stats)
+        if profiling
+        else nullcontext()
+    ):
+        process_db(
+            filepath,
+            outputpath,
+            blobpath,
+            filter_db_results=True,
+            max_memory=max_memory * 1024 * 1024 if max_memory is not None else None,
+            stats=stats,
+            shard=shard,
+            line_delimited=line_delimited,
+            progress=Progress(enabled=report_progress, cancel_file=cancel_file),
+            hash_sources=hash_sources,
+            prefetch=prefetch,
+            pipeline=pipeline,
+            sinks=sinks,
+            chunk_records=chunk_records,
+            chunk_bytes=chunk_size * 1024 * 1024 if chunk_size is not None else None,
+            compression=compression,
+        )
+    if statspath is not None:
+        stats.write(statspath)
 
 
 if __name__ == "__main__":